@@ -0,0 +1,241 @@
+"""
+HTTP API расчета неустойки для внутренних систем (CRM, подготовка документов)
+
+    python api.py --port 8080
+
+POST /v1/penalty        один расчет
+POST /v1/penalty/batch  {"items": [...]} - до API_BATCH_LIMIT расчетов за запрос
+GET  /v1/rates          таблица ставок с ETag (хеш снимка ставок)
+GET  /health
+
+Параметры расчета - JSON-объект:
+    {"contract_amount": 3500000, "deadline_date": "2024-03-01",
+     "calculation_date": "2024-06-01", "is_individual": true,
+     "is_unique_object": false, "rate_mode": "fixed"}
+Даты - в формате ГГГГ-ММ-ДД или ДД.ММ.ГГГГ; calculation_date по умолчанию -
+сегодня, is_individual - true, is_unique_object - false, rate_mode - fixed.
+Результат - тот же словарь, что у PenaltyCalculator.calculate_penalty().
+
+Ставки берутся из того же источника и того же кеша результатов, что и у
+бота (RATES_SOURCE), таблица обновляется в фоне не чаще раза в
+API_RATES_MAX_AGE секунд. Если задан API_TOKEN, запросы должны содержать
+заголовок "Authorization: Bearer <API_TOKEN>".
+"""
+import argparse
+import hmac
+import json
+import math
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+from config import (
+    API_HOST, API_PORT, API_TOKEN, API_BATCH_LIMIT, API_MAX_BODY_SIZE, API_RATES_MAX_AGE, API_LOG_FILE
+)
+from services.penalty_cache import penalty_cache
+from services.rates import rates_provider, RatesProvider, RatesUnavailableError
+from utils.log import setup_logging
+from utils.validators import MAX_CONTRACT_AMOUNT
+
+RATE_MODES = ("fixed", "variable")
+
+
+class RequestError(Exception):
+    """Invalid calculation parameters; the message is returned to the client"""
+
+
+def _json_default(value):
+    # Даты в разбивке по периодам ставки (rate_mode=variable)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def json_response(data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    return web.Response(
+        body=json.dumps(data, ensure_ascii=False, default=_json_default).encode("utf-8"),
+        status=status,
+        headers=headers,
+        content_type="application/json"
+    )
+
+
+def _reject_constant(name: str):
+    # json.loads() по умолчанию принимает NaN и Infinity, которых нет в JSON
+    raise ValueError(f"{name} is not valid JSON")
+
+
+def error_response(status: int, message: str) -> web.Response:
+    return json_response({"error": message}, status=status)
+
+
+def parse_date(value: Any, field: str) -> date:
+    if not isinstance(value, str):
+        raise RequestError(f"{field}: expected a date string")
+    try:
+        if "-" in value:
+            return date.fromisoformat(value)
+        return datetime.strptime(value, "%d.%m.%Y").date()
+    except ValueError:
+        raise RequestError(f"{field}: invalid date {value!r}, expected YYYY-MM-DD or DD.MM.YYYY")
+
+
+def parse_item(item: Any, today: date) -> Dict[str, Any]:
+    """Аргументы calculate_penalty() из JSON-объекта запроса"""
+    if not isinstance(item, dict):
+        raise RequestError("expected a JSON object")
+
+    amount = item.get("contract_amount")
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not math.isfinite(amount) or amount <= 0:
+        raise RequestError("contract_amount: expected a positive number")
+    if amount > MAX_CONTRACT_AMOUNT:
+        raise RequestError(f"contract_amount: must not exceed {MAX_CONTRACT_AMOUNT}")
+
+    deadline_date = parse_date(item.get("deadline_date"), "deadline_date")
+    calculation = item.get("calculation_date")
+    calculation_date = today if calculation is None else parse_date(calculation, "calculation_date")
+
+    is_individual = item.get("is_individual", True)
+    is_unique_object = item.get("is_unique_object", False)
+    if not isinstance(is_individual, bool) or not isinstance(is_unique_object, bool):
+        raise RequestError("is_individual and is_unique_object must be booleans")
+
+    rate_mode = item.get("rate_mode", "fixed")
+    if rate_mode not in RATE_MODES:
+        raise RequestError(f"rate_mode: expected one of {', '.join(RATE_MODES)}")
+
+    return {
+        "contract_amount": amount,
+        "deadline_date": deadline_date,
+        "calculation_date": calculation_date,
+        "is_individual": is_individual,
+        "is_unique_object": is_unique_object,
+        "rate_mode": rate_mode
+    }
+
+
+class PenaltyApi:
+    """Обработчики HTTP API поверх общего провайдера ставок и кеша результатов"""
+
+    def __init__(
+        self,
+        provider: RatesProvider = rates_provider,
+        batch_limit: int = API_BATCH_LIMIT,
+        rates_max_age: float = API_RATES_MAX_AGE,
+        token: Optional[str] = API_TOKEN
+    ):
+        self.provider = provider
+        self.batch_limit = batch_limit
+        self.rates_max_age = rates_max_age
+        self.token = token
+        # Тело ответа /v1/rates для последнего снимка: (хеш, JSON)
+        self._rates_body = (None, b"")
+
+    async def _rates(self):
+        table = await self.provider.get_cached_rates(self.rates_max_age)
+        return table, self.provider.snapshot_for(table)
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        if self.token and request.path != "/health" and not self._authorized(request):
+            return error_response(401, "unauthorized")
+        try:
+            return await handler(request)
+        except RequestError as e:
+            return error_response(400, str(e))
+        except RatesUnavailableError:
+            return error_response(503, "rates are temporarily unavailable")
+
+    def _authorized(self, request: web.Request) -> bool:
+        # Сравнение за постоянное время: по времени ответа токен не подобрать
+        given = request.headers.get("Authorization", "").encode("utf-8")
+        return hmac.compare_digest(given, f"Bearer {self.token}".encode("utf-8"))
+
+    async def _read_json(self, request: web.Request) -> Any:
+        try:
+            return json.loads(await request.read(), parse_constant=_reject_constant)
+        except ValueError:
+            raise RequestError("request body is not valid JSON")
+
+    async def penalty(self, request: web.Request) -> web.Response:
+        params = parse_item(await self._read_json(request), date.today())
+        table, snapshot = await self._rates()
+
+        rate_mode = params.pop("rate_mode")
+        if rate_mode == "fixed":
+            result = penalty_cache.calculate(table, snapshot.hash, **params)
+        else:
+            result = penalty_cache.calculator_for(table, snapshot.hash).calculate_penalty(**params, rate_mode=rate_mode)
+        return json_response(result, headers={"X-Rates-Snapshot": snapshot.hash})
+
+    async def penalty_batch(self, request: web.Request) -> web.Response:
+        body = await self._read_json(request)
+        items = body.get("items") if isinstance(body, dict) else None
+        if not isinstance(items, list):
+            raise RequestError('expected {"items": [...]}')
+        if len(items) > self.batch_limit:
+            return error_response(413, f"too many items: {len(items)}, the limit is {self.batch_limit}")
+
+        today = date.today()
+        parsed = []
+        for index, item in enumerate(items):
+            try:
+                parsed.append(parse_item(item, today))
+            except RequestError as e:
+                raise RequestError(f"items[{index}]: {e}")
+
+        table, snapshot = await self._rates()
+        modes = [params.pop("rate_mode") for params in parsed]
+        # fixed - одним пакетом через кеш результатов, variable - по одному, порядок сохраняется
+        fixed_results = iter(penalty_cache.calculate_many(
+            table, snapshot.hash, (params for params, mode in zip(parsed, modes) if mode == "fixed")
+        ))
+        calculator = penalty_cache.calculator_for(table, snapshot.hash)
+        results = [
+            next(fixed_results) if mode == "fixed" else calculator.calculate_penalty(**params, rate_mode=mode)
+            for params, mode in zip(parsed, modes)
+        ]
+        return json_response({"results": results}, headers={"X-Rates-Snapshot": snapshot.hash})
+
+    async def rates(self, request: web.Request) -> web.Response:
+        table, snapshot = await self._rates()
+        etag = f'"{snapshot.hash}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+
+        rates_hash, body = self._rates_body
+        if rates_hash != snapshot.hash:
+            rows = sorted(table, key=lambda item: item["date"])
+            body = json.dumps({
+                "snapshot": snapshot.hash,
+                "rates": [
+                    {"date": item["date"].isoformat(), "rate": item["rate"], "moratorium": item["moratorium"]}
+                    for item in rows
+                ]
+            }, ensure_ascii=False).encode("utf-8")
+            self._rates_body = (snapshot.hash, body)
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    async def health(self, request: web.Request) -> web.Response:
+        return json_response({"status": "ok", "rates_loaded": self.provider.last_good is not None})
+
+
+def create_app(api: Optional[PenaltyApi] = None) -> web.Application:
+    api = api or PenaltyApi()
+    app = web.Application(middlewares=[api.middleware], client_max_size=API_MAX_BODY_SIZE)
+    app.router.add_post("/v1/penalty", api.penalty)
+    app.router.add_post("/v1/penalty/batch", api.penalty_batch)
+    app.router.add_get("/v1/rates", api.rates)
+    app.router.add_get("/health", api.health)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP API for penalty calculations")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    setup_logging(log_file=API_LOG_FILE)
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
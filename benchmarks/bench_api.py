@@ -0,0 +1,157 @@
+"""
+Нагрузочный замер HTTP API (api.py) на локальной машине.
+
+    python -m benchmarks.bench_api --requests 20000 --concurrency 64
+
+Сервер запускается отдельным процессом (одно ядро, ставки из CSV - по
+умолчанию data/example_data.csv), клиент в этом процессе отправляет
+запросы с заданным числом одновременных соединений. Сценарии:
+single - POST /v1/penalty со случайными параметрами из небольшого набора
+(как повторяющиеся запросы CRM), batch - POST /v1/penalty/batch по
+--batch-size расчетов, rates_304 - GET /v1/rates с актуальным ETag.
+
+Результат - JSON с запросами в секунду, расчетами в секунду и
+перцентилями задержки в миллисекундах.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+import aiohttp
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def random_item(rng: random.Random) -> Dict[str, Any]:
+    deadline = date(2023, 1, 1) + timedelta(days=rng.randint(0, 365))
+    return {
+        "contract_amount": rng.choice([1_000_000, 2_500_000, 3_500_000, rng.randint(10 ** 6, 10 ** 7)]),
+        "deadline_date": deadline.isoformat(),
+        "calculation_date": (deadline + timedelta(days=rng.randint(1, 700))).isoformat(),
+        "is_individual": rng.random() < 0.7,
+        "is_unique_object": rng.random() < 0.1,
+    }
+
+
+async def _load(session: aiohttp.ClientSession, requests: int, concurrency: int, send: Callable) -> Dict[str, float]:
+    latencies: List[float] = []
+    counter = iter(range(requests))
+
+    async def client():
+        for _ in counter:
+            started = time.perf_counter()
+            async with send(session) as response:
+                await response.read()
+                if response.status not in (200, 304):
+                    raise RuntimeError(f"HTTP {response.status}: {await response.text()}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "rps": round(requests / elapsed),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+async def run(base_url: str, requests: int, concurrency: int, batch_size: int) -> Dict[str, Any]:
+    rng = random.Random(1)
+    items = [random_item(rng) for _ in range(200)]
+    batch = {"items": [rng.choice(items) for _ in range(batch_size)]}
+
+    results = {}
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async with session.get(f"{base_url}/v1/rates") as response:
+            etag = response.headers["ETag"]
+
+        # Прогрев кеша результатов
+        await _load(session, 1, 1, lambda s: s.post(f"{base_url}/v1/penalty/batch", json={"items": items}))
+
+        results["single"] = await _load(
+            session, requests, concurrency,
+            lambda s: s.post(f"{base_url}/v1/penalty", json=rng.choice(items))
+        )
+        results["batch"] = await _load(
+            session, max(requests // batch_size, 1), concurrency,
+            lambda s: s.post(f"{base_url}/v1/penalty/batch", json=batch)
+        )
+        results["batch"]["calculations_per_second"] = results["batch"]["rps"] * batch_size
+        results["rates_304"] = await _load(
+            session, requests, concurrency,
+            lambda s: s.get(f"{base_url}/v1/rates", headers={"If-None-Match": etag})
+        )
+    return results
+
+
+async def _wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError("API server exited during startup")
+            try:
+                async with session.get(f"{base_url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("API server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the HTTP calculation API")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--rates-file", default="data/example_data.csv")
+    parser.add_argument("--output", help="Write results JSON to this file (stdout by default)")
+    args = parser.parse_args()
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "RATES_SOURCE": "csv", "RATES_FILE": args.rates_file, "API_TOKEN": ""}
+    server = subprocess.Popen(
+        [sys.executable, "api.py", "--host", "127.0.0.1", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        asyncio.run(_wait_ready(base_url, server))
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "concurrency": args.concurrency,
+            "results": asyncio.run(run(base_url, args.requests, args.concurrency, args.batch_size)),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Микробенчмарк PenaltyCalculator на длинных синтетических таблицах ставок.
+
+    python -m benchmarks.bench_calculator --output bench_calculator.json
+    python -m benchmarks.bench_calculator --baseline benchmarks/baseline_calculator.json
+
+Таблицы: редкий лист с пропусками (строка раз в несколько недель), 25 лет
+ежедневных строк и ежедневная таблица с длинными периодами моратория.
+Замеряются построение калькулятора, _get_rate_for_date (на дату со строкой
+и на дату в пропуске) и calculate_penalty для просрочки от 1 дня до 10 лет.
+
+Результат - JSON с лучшим временем одного вызова в микросекундах. С
+--baseline каждое значение сравнивается с сохраненным; если какое-то
+медленнее базового больше чем в --tolerance раз, код выхода 1. Базовый
+файл зависит от машины: обновляйте его (--save-baseline) на той же машине,
+где проверяете.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+from services.calculator import PenaltyCalculator
+
+START = date(2000, 1, 1)
+YEARS = 25
+DELAYS = {"1d": 1, "30d": 30, "1y": 365, "3y": 3 * 365, "10y": 3652}
+
+
+def _rate(day_index: int) -> float:
+    # Ключевая ставка меняется примерно раз в полтора месяца
+    return round(0.04 + (day_index // 45) % 17 * 0.005, 4)
+
+
+def sparse_table(seed: int = 1) -> List[Dict[str, Any]]:
+    """Строка раз в 1-8 недель: между строками действует предыдущая ставка"""
+    rng = random.Random(seed)
+    table, day = [], 0
+    while day < YEARS * 365:
+        table.append({"date": START + timedelta(days=day), "rate": _rate(day), "moratorium": False})
+        day += rng.randint(7, 56)
+    return table
+
+
+def daily_table() -> List[Dict[str, Any]]:
+    """Строка на каждый день 25 лет"""
+    return [
+        {"date": START + timedelta(days=day), "rate": _rate(day), "moratorium": False}
+        for day in range(YEARS * 365)
+    ]
+
+
+def moratorium_table() -> List[Dict[str, Any]]:
+    """Ежедневная таблица, где каждые 4 года - 9 месяцев моратория"""
+    return [
+        {"date": START + timedelta(days=day), "rate": _rate(day), "moratorium": day % (4 * 365) < 270}
+        for day in range(YEARS * 365)
+    ]
+
+
+TABLES = {"sparse": sparse_table, "daily": daily_table, "moratorium": moratorium_table}
+
+
+def _best_us(func: Callable[[], Any], repeat: int) -> float:
+    """Лучшее время одного вызова в микросекундах (как timeit: autorange + repeat)"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return round(min(timer.repeat(repeat=repeat, number=number)) / number * 1e6, 3)
+
+
+def run(repeat: int = 5) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for name, build in TABLES.items():
+        table = build()
+        calculator = PenaltyCalculator(table)
+        last_day = table[-1]["date"]
+
+        results[f"{name}/construct"] = _best_us(lambda: PenaltyCalculator(table), repeat)
+
+        on_row = table[len(table) // 2]["date"]
+        in_gap = table[len(table) // 2 + 1]["date"] - timedelta(days=1)
+        results[f"{name}/get_rate_on_row"] = _best_us(lambda: calculator._get_rate_for_date(on_row), repeat)
+        results[f"{name}/get_rate_in_gap"] = _best_us(lambda: calculator._get_rate_for_date(in_gap), repeat)
+
+        for label, days in DELAYS.items():
+            deadline = last_day - timedelta(days=days + 30)
+            calculation = deadline + timedelta(days=days)
+            results[f"{name}/calculate_penalty/{label}"] = _best_us(
+                lambda: calculator.calculate_penalty(2_500_000, deadline, calculation, True, False),
+                repeat
+            )
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Случаи, ставшие медленнее базовых больше чем в tolerance раз"""
+    regressions = []
+    for case, value in results.items():
+        base = baseline.get(case)
+        if base and value / base > tolerance:
+            regressions.append(f"{case}: {base} -> {value} us (x{value / base:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PenaltyCalculator on synthetic rate histories")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results JSON to this file (stdout by default)")
+    parser.add_argument("--baseline", help="Baseline JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown factor against the baseline")
+    parser.add_argument("--save-baseline", help="Write results as the new baseline to this file")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "us per call",
+        "results": run(args.repeat),
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(report["results"], baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:", *regressions, sep="\n  ", file=sys.stderr)
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance x{args.tolerance})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Поведение планировщика квоты Sheets против локального mock с квотой.
+
+    python -m benchmarks.bench_quota --burst 30 --quota 10 --window 2
+
+Mock отвечает 429 сверх квоты за окно и несколькими 5xx подряд. Скрипт
+прогоняет всплеск запросов дважды: без клиентского бюджета (только
+повторы с backoff) и с бюджетом, равным квоте. Во втором случае клиент
+сам разносит запросы по времени, и 429 от сервера не возникает.
+"""
+import argparse
+import json
+import time
+
+from google.auth.credentials import AnonymousCredentials
+
+from benchmarks.mock_sheets import MockSheetsServer, generate_rows
+from services.metrics import metrics
+from services.sheets import GoogleSheetsService, QuotaScheduler
+
+
+def _run(burst: int, quota: int, window: float, client_budget: int) -> dict:
+    server = MockSheetsServer(generate_rows(100), quota=quota, quota_window=window).start()
+    server.inject_errors(503, 500)
+    scheduler = QuotaScheduler(max_requests=client_budget, window=window, max_retries=8, backoff_base=0.05, backoff_max=window)
+    client = GoogleSheetsService(AnonymousCredentials(), server.endpoint, "bench", scheduler=scheduler)
+
+    retries_before = metrics.get("sheets_retries")
+    started = time.perf_counter()
+    succeeded = failed = 0
+    try:
+        for _ in range(burst):
+            try:
+                client.get_values("Лист1!A2:C")
+                succeeded += 1
+            except Exception:
+                failed += 1
+    finally:
+        server.stop()
+
+    return {
+        "client_budget": client_budget,
+        "succeeded": succeeded,
+        "failed": failed,
+        "server_rejections": server.rejected,
+        "client_retries": metrics.get("sheets_retries") - retries_before,
+        "seconds": round(time.perf_counter() - started, 3),
+        "remaining_budget": scheduler.remaining(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise the Sheets quota scheduler against a mock with quota errors")
+    parser.add_argument("--burst", type=int, default=30)
+    parser.add_argument("--quota", type=int, default=10)
+    parser.add_argument("--window", type=float, default=2.0)
+    args = parser.parse_args()
+
+    results = [
+        _run(args.burst, args.quota, args.window, client_budget=args.burst * 10),
+        _run(args.burst, args.quota, args.window, client_budget=args.quota),
+    ]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
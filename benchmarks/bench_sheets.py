@@ -0,0 +1,58 @@
+"""
+Стоимость загрузки курсов: новый клиент на каждый запрос против общего.
+
+    python -m benchmarks.bench_sheets --fetches 200 --rows 9000
+
+Оба варианта ходят в локальный mock (benchmarks/mock_sheets.py) с анонимными
+учетными данными, поэтому замер показывает построение клиента и установку
+соединений, но не выпуск токенов.
+"""
+import argparse
+import json
+import time
+
+from google.auth.credentials import AnonymousCredentials
+
+from benchmarks.mock_sheets import MockSheetsServer, generate_rows
+from services.sheets import GoogleSheetsService
+
+SPREADSHEET = "bench"
+RANGE = "Лист1!A2:C"
+
+
+def _measure(server: MockSheetsServer, fetches: int, reuse_client: bool) -> dict:
+    connections_before = server.connections
+    started = time.perf_counter()
+
+    shared = GoogleSheetsService(AnonymousCredentials(), server.endpoint, SPREADSHEET) if reuse_client else None
+    for _ in range(fetches):
+        client = shared or GoogleSheetsService(AnonymousCredentials(), server.endpoint, SPREADSHEET)
+        client.get_values(RANGE)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": "shared client" if reuse_client else "client per fetch",
+        "fetches": fetches,
+        "seconds": round(elapsed, 4),
+        "ms_per_fetch": round(elapsed / fetches * 1000, 3),
+        "tcp_connections": server.connections - connections_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Sheets client reuse against a local mock")
+    parser.add_argument("--fetches", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=9000)
+    args = parser.parse_args()
+
+    server = MockSheetsServer(generate_rows(args.rows)).start()
+    try:
+        results = [_measure(server, args.fetches, reuse_client=False), _measure(server, args.fetches, reuse_client=True)]
+    finally:
+        server.stop()
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Проверка эквивалентности движков расчета эталонному поденному алгоритму.
+
+    python -m benchmarks.check_equivalence --cases 2000 --seed 1
+    python -m benchmarks.check_equivalence --only 1234   # повторить один случай
+
+Эталон - services/reference_calculator.py (исходный алгоритм, не меняется).
+Каждый случай - случайная таблица ставок (редкие строки с пропусками,
+ежедневные отрезки, повторяющиеся ставки, строки до 2000 года, отдельные
+дни и длинные периоды моратория), случайные даты (в том числе до начала
+таблицы и без просрочки), сумма и признаки ФЛ/ЮЛ и уникальности.
+
+Движки из ENGINES должны совпадать с эталоном до копейки: scalar - весь
+результат calculate_penalty, batch - точки penalty_curve, cached - результат
+PenaltyCache (промах и попадание с другой суммой). При
+расхождении печатается seed случая (для --only) и его параметры, код
+выхода 1. Для каждого движка выводится ускорение относительно эталона
+по группам длины просрочки.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+from services.calculator import PenaltyCalculator
+from services.penalty_cache import PenaltyCache
+from services.reference_calculator import ReferencePenaltyCalculator
+
+# Точек кривой, сверяемых с эталоном в одном случае (эталон на точку - O(дней))
+BATCH_SAMPLE_POINTS = 5
+DELAY_BUCKETS = [(30, "<=30d"), (365, "<=1y"), (3 * 365, "<=3y"), (None, ">3y")]
+
+
+def random_table(rng: random.Random) -> List[Dict[str, Any]]:
+    rates = [round(rng.uniform(0.01, 0.25), 4) for _ in range(rng.randint(1, 6))]
+    moratorium_mode = rng.choice(["none", "random", "stretches"])
+    # Эталон ищет ставку назад по дням вплоть до 2000 года, поэтому таблицы
+    # начинаются недалеко от этой границы, иначе эталон работает минутами
+    day = date(2000, 1, 1) + timedelta(days=rng.randint(-400, 1500))
+    table = []
+    in_stretch = False
+    for _ in range(rng.randint(1, 300)):
+        if moratorium_mode == "random":
+            moratorium = rng.random() < 0.2
+        elif moratorium_mode == "stretches":
+            if rng.random() < 0.05:
+                in_stretch = not in_stretch
+            moratorium = in_stretch
+        else:
+            moratorium = False
+        table.append({"date": day, "rate": rng.choice(rates), "moratorium": moratorium})
+        # Ежедневные отрезки вперемешку с пропусками до нескольких месяцев
+        day += timedelta(days=1 if rng.random() < 0.6 else rng.randint(2, 120))
+    rng.shuffle(table)
+    return table
+
+
+def random_case(seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    table = random_table(rng)
+    first = min(item["date"] for item in table)
+    last = max(item["date"] for item in table)
+    deadline = first + timedelta(days=rng.randint(-60, (last - first).days + 60))
+    delay = rng.choices([rng.randint(-5, 40), rng.randint(1, 365), rng.randint(1, 4000)], weights=[4, 4, 1])[0]
+    calculation = deadline + timedelta(days=delay)
+    return {
+        "seed": seed,
+        "table": table,
+        "contract_amount": rng.choice([
+            rng.randint(1, 10 ** 8),
+            round(rng.uniform(1, 10 ** 7), 2),
+            rng.choice([1_000_000, 2_500_000, 3_500_000])
+        ]),
+        "deadline_date": deadline,
+        "calculation_date": calculation,
+        "is_individual": rng.random() < 0.5,
+        "is_unique_object": rng.random() < 0.3,
+    }
+
+
+def _params(case: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: case[key] for key in ("contract_amount", "deadline_date", "calculation_date", "is_individual", "is_unique_object")}
+
+
+def scalar_engine(calculator: PenaltyCalculator, case: Dict[str, Any], reference) -> List[str]:
+    result = calculator.calculate_penalty(**_params(case))
+    expected = reference.calculate_penalty(**_params(case))
+    return [] if result == expected else [f"scalar: {result} != reference {expected}"]
+
+
+def batch_engine(calculator: PenaltyCalculator, case: Dict[str, Any], reference) -> List[str]:
+    params = _params(case)
+    try:
+        curve = calculator.penalty_curve(
+            params["contract_amount"], params["deadline_date"], params["calculation_date"],
+            params["is_individual"], params["is_unique_object"]
+        )
+    except ValueError:
+        curve = None
+
+    expected = reference.calculate_penalty(**params)
+    if curve is None:
+        return [] if "message" in expected and expected["penalty_amount"] == 0 else [f"batch: no rate, reference {expected}"]
+    if not curve:
+        return [] if expected["penalty_amount"] == 0 else [f"batch: empty curve, reference {expected}"]
+
+    rng = random.Random(case["seed"])
+    points = {len(curve) - 1, *(rng.randrange(len(curve)) for _ in range(BATCH_SAMPLE_POINTS - 1))}
+    errors = []
+    for index in sorted(points):
+        day, amount = curve[index]
+        expected_amount = reference.calculate_penalty(**{**params, "calculation_date": day})["penalty_amount"]
+        if amount != expected_amount:
+            errors.append(f"batch: {day} {amount} != reference {expected_amount}")
+    return errors
+
+
+def cached_engine(calculator: PenaltyCalculator, case: Dict[str, Any], reference) -> List[str]:
+    # Второй вызов с другой суммой приходится на ту же запись кеша
+    cache = PenaltyCache(maxsize=4)
+    errors = []
+    for amount in (case["contract_amount"], case["contract_amount"] * 3 + 0.5):
+        params = {**_params(case), "contract_amount": amount}
+        result = cache.calculate(case["table"], str(case["seed"]), **params)
+        expected = reference.calculate_penalty(**params)
+        if result != expected:
+            errors.append(f"cached: {result} != reference {expected}")
+    return errors
+
+
+ENGINES: Dict[str, Callable] = {"scalar": scalar_engine, "batch": batch_engine, "cached": cached_engine}
+
+
+def _bucket(case: Dict[str, Any]) -> str:
+    delay = (case["calculation_date"] - case["deadline_date"]).days
+    for limit, label in DELAY_BUCKETS:
+        if limit is None or delay <= limit:
+            return label
+    return DELAY_BUCKETS[-1][1]
+
+
+def _time_engines(calculator: PenaltyCalculator, reference: ReferencePenaltyCalculator, case: Dict[str, Any]) -> Dict[str, float]:
+    params = _params(case)
+    timings = {}
+
+    started = time.perf_counter()
+    reference.calculate_penalty(**params)
+    timings["reference"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    calculator.calculate_penalty(**params)
+    timings["scalar"] = time.perf_counter() - started
+
+    # Кривая дает все точки до даты расчета; эталону на то же понадобилось бы
+    # по вызову на точку, поэтому сравниваем с оценкой delay_days × вызов эталона
+    delay = max((params["calculation_date"] - params["deadline_date"]).days, 1)
+    started = time.perf_counter()
+    try:
+        calculator.penalty_curve(
+            params["contract_amount"], params["deadline_date"], params["calculation_date"],
+            params["is_individual"], params["is_unique_object"]
+        )
+    except ValueError:
+        pass
+    timings["batch"] = (time.perf_counter() - started) / delay
+
+    # Попадание в кеш: запись уже создана вызовом с другой суммой
+    cache = PenaltyCache(maxsize=4)
+    cache.calculate(case["table"], "timing", **{**params, "contract_amount": 1})
+    started = time.perf_counter()
+    cache.calculate(case["table"], "timing", **params)
+    timings["cached"] = time.perf_counter() - started
+    return timings
+
+
+def check(seeds: List[int]) -> Dict[str, Any]:
+    failures = []
+    totals: Dict[str, Dict[str, float]] = {}
+    for seed in seeds:
+        case = random_case(seed)
+        calculator = PenaltyCalculator(case["table"])
+        reference = ReferencePenaltyCalculator(case["table"])
+
+        errors = [error for engine in ENGINES.values() for error in engine(calculator, case, reference)]
+        if errors:
+            failures.append({"seed": seed, "params": {k: str(v) for k, v in _params(case).items()}, "errors": errors})
+
+        bucket = totals.setdefault(_bucket(case), {})
+        for name, seconds in _time_engines(calculator, reference, case).items():
+            bucket[name] = bucket.get(name, 0.0) + seconds
+        bucket["cases"] = bucket.get("cases", 0) + 1
+
+    speedups = {
+        label: {
+            "cases": int(totals[label]["cases"]),
+            **{name: round(totals[label]["reference"] / totals[label][name], 1) for name in ENGINES if totals[label][name]},
+        }
+        for _, label in DELAY_BUCKETS if label in totals
+    }
+    return {"cases": len(seeds), "failures": failures, "speedup_vs_reference": speedups}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check calculation engines against the frozen reference")
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first case")
+    parser.add_argument("--only", type=int, help="Run the single case with this seed")
+    args = parser.parse_args()
+
+    seeds = [args.only] if args.only is not None else list(range(args.seed, args.seed + args.cases))
+    report = check(seeds)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Локальный mock Google Sheets API (values.get, values.batchGet) для замеров без сети.
+
+    python -m benchmarks.mock_sheets --port 8765 --rows 9000
+
+Отдает строки в формате листа с курсами (дата, ставка, мораторий) и
+считает принятые TCP-соединения и запросы, чтобы было видно, переиспользует
+ли клиент соединения. С --quota сервер, как настоящий API, отвечает 429 на
+запросы сверх квоты за окно; inject_errors() подкладывает ответы 5xx.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+VALUES_PATH = re.compile(r"^/v4/spreadsheets/(?P<spreadsheet>[^/]+)/values/(?P<range>[^/?]+)$")
+BATCH_GET_PATH = re.compile(r"^/v4/spreadsheets/(?P<spreadsheet>[^/]+)/values:batchGet$")
+RANGE_START_ROW = re.compile(r"!A(?P<row>\d+)")
+
+
+def generate_rows(count: int, start: date = date(2000, 1, 1)) -> List[List[str]]:
+    """Строки листа: одна на день, ставка меняется раз в ~полгода"""
+    rows = []
+    for i in range(count):
+        day = start + timedelta(days=i)
+        rate = 5 + (i // 180) % 12 * 0.75
+        rows.append([day.strftime("%d.%m.%Y"), f"{rate:.2f}%".replace(".", ","), "1" if i % 97 == 0 else "0"])
+    return rows
+
+
+class MockSheetsServer:
+    """Mock values.get / values.batchGet в фоновом потоке"""
+
+    def __init__(
+        self,
+        rows: List[List[str]],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        quota: Optional[int] = None,
+        quota_window: float = 60.0
+    ):
+        self.rows = rows
+        self.quota = quota
+        self.quota_window = quota_window
+        self.connections = 0
+        self.requests = 0
+        self.rejected = 0
+        self._accepted = deque()
+        self._injected_errors = deque()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def inject_errors(self, *statuses: int):
+        """Ответить на следующие запросы указанными статусами"""
+        with self._lock:
+            self._injected_errors.extend(statuses)
+
+    def _reject_status(self) -> Optional[int]:
+        with self._lock:
+            if self._injected_errors:
+                self.rejected += 1
+                return self._injected_errors.popleft()
+            if self.quota is None:
+                return None
+            now = time.monotonic()
+            while self._accepted and now - self._accepted[0] >= self.quota_window:
+                self._accepted.popleft()
+            if len(self._accepted) >= self.quota:
+                self.rejected += 1
+                return 429
+            self._accepted.append(now)
+            return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+
+                status = server._reject_status()
+                if status is not None:
+                    message = "Quota exceeded for quota metric 'Read requests'" if status == 429 else "Backend Error"
+                    self._send_json(status, {"error": {"code": status, "message": message}})
+                    return
+
+                url = urlparse(self.path)
+                match = VALUES_PATH.match(url.path)
+                if match:
+                    self._send_json(200, self._value_range(unquote(match.group("range"))))
+                    return
+
+                if BATCH_GET_PATH.match(url.path):
+                    ranges = parse_qs(url.query).get("ranges", [])
+                    self._send_json(200, {"valueRanges": [self._value_range(cell_range) for cell_range in ranges]})
+                    return
+
+                self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+
+            def _value_range(self, cell_range: str) -> dict:
+                start = RANGE_START_ROW.search(cell_range)
+                first_row = int(start.group("row")) if start else 1
+                # Строка 1 листа - заголовок
+                values = server.rows[max(0, first_row - 2):]
+                return {"range": cell_range, "majorDimension": "ROWS", "values": values}
+
+        return Handler
+
+    def start(self) -> "MockSheetsServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Google Sheets values API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows", type=int, default=9000)
+    parser.add_argument("--quota", type=int, help="requests allowed per --quota-window seconds")
+    parser.add_argument("--quota-window", type=float, default=60.0)
+    args = parser.parse_args()
+
+    server = MockSheetsServer(generate_rows(args.rows), args.host, args.port, args.quota, args.quota_window)
+    print(f"Mock Sheets API on {server.endpoint} ({args.rows} rows)")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
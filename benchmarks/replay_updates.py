@@ -0,0 +1,152 @@
+"""
+Проверка пропуска повторно доставленных обновлений (middlewares/idempotency.py).
+
+    python -m benchmarks.replay_updates --updates recorded.jsonl
+    python -m benchmarks.replay_updates --synthetic 5000
+
+Обновления (JSON из getUpdates или тела вебхуков, по одному в строке, либо
+синтетические сообщения) подаются в Dispatcher с IdempotencyMiddleware
+и обработчиком-счетчиком так, как их доставил бы Telegram при сбоях:
+1) около половины обновлений приходит повторно одновременно с оригиналом
+   (ретрай вебхука во время обработки), затем повторяются последние
+   window обновлений;
+2) «перезапуск»: новая middleware на той же базе (временный SQLite) и
+   повторная доставка последних обновлений до перезапуска;
+3) новые обновления после перезапуска, тоже с повторами.
+
+Каждое уникальное обновление должно быть обработано ровно один раз; при
+расхождении код выхода 1. Выводится также время доставки одного
+обновления через Dispatcher на шаге 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message, Update
+
+from middlewares.idempotency import IdempotencyMiddleware
+from services.database import SQLiteDatabase
+
+
+def synthetic_updates(count: int, first_id: int = 500_000_000) -> List[Dict[str, Any]]:
+    return [
+        {
+            "update_id": first_id + i,
+            "message": {
+                "message_id": i + 1,
+                "date": 1_700_000_000 + i,
+                "chat": {"id": 1000 + i % 50, "type": "private"},
+                "from": {"id": 1000 + i % 50, "is_bot": False, "first_name": "User"},
+                "text": "/calc 2500000 01.03.2024",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def load_updates(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_dispatcher(middleware: IdempotencyMiddleware, processed: Counter) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def count(message: Message, event_update: Update):
+        # Имитация работы обработчика, чтобы повторы успевали прийти во время обработки
+        await asyncio.sleep(0)
+        processed[event_update.update_id] += 1
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(middleware)
+    dp.include_router(router)
+    return dp
+
+
+async def feed(dp: Dispatcher, bot: Bot, raw_updates: List[Dict[str, Any]], concurrent: bool):
+    updates = [Update.model_validate(raw, context={"bot": bot}) for raw in raw_updates]
+    if concurrent:
+        await asyncio.gather(*(dp.feed_update(bot, update) for update in updates))
+    else:
+        for update in updates:
+            await dp.feed_update(bot, update)
+
+
+async def deliver_with_retries(dp: Dispatcher, bot: Bot, raw_updates: List[Dict[str, Any]], rng: random.Random):
+    """Пачками по 20; около половины обновлений повторяется в той же пачке, одновременно с оригиналом"""
+    for start in range(0, len(raw_updates), 20):
+        chunk = raw_updates[start:start + 20]
+        stream = chunk + [update for update in chunk if rng.random() < 0.5]
+        rng.shuffle(stream)
+        await feed(dp, bot, stream, concurrent=True)
+
+
+async def replay(raw_updates: List[Dict[str, Any]], window: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    processed: Counter = Counter()
+    bot = Bot(token="42:REPLAY")
+    split = len(raw_updates) * 2 // 3
+    before, after = raw_updates[:split], raw_updates[split:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = SQLiteDatabase(os.path.join(tmp, "replay.sqlite"))
+        database.create_tables()
+
+        # 1. Доставка с повторами
+        middleware = IdempotencyMiddleware(database, window=window, persist_interval=0)
+        dp = make_dispatcher(middleware, processed)
+        started = time.perf_counter()
+        await deliver_with_retries(dp, bot, before, rng)
+        # Повторы старше окна window по определению не распознаются, поэтому повторяем только последние
+        await feed(dp, bot, before[-window:], concurrent=False)
+        elapsed = time.perf_counter() - started
+        middleware.flush()
+
+        # 2. Перезапуск: состояние в памяти потеряно, Telegram повторяет хвост
+        middleware = IdempotencyMiddleware(database, window=window, persist_interval=0)
+        dp = make_dispatcher(middleware, processed)
+        await feed(dp, bot, before[-window:], concurrent=False)
+
+        # 3. Новые обновления после перезапуска, тоже с повторами
+        await deliver_with_retries(dp, bot, after, rng)
+        database.close()
+    await bot.session.close()
+
+    unique_ids = {raw["update_id"] for raw in raw_updates}
+    missing = sorted(unique_ids - set(processed))
+    duplicated = sorted(update_id for update_id, count in processed.items() if count > 1)
+    return {
+        "updates": len(unique_ids),
+        "processed": sum(processed.values()),
+        "missing": missing[:20],
+        "duplicated": duplicated[:20],
+        "us_per_delivery": round(elapsed / (len(before) * 1.5 + min(window, len(before))) * 1e6, 2) if before else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay updates with redeliveries through IdempotencyMiddleware")
+    parser.add_argument("--updates", help="JSONL file with recorded updates")
+    parser.add_argument("--synthetic", type=int, default=3000, help="Number of synthetic updates without --updates")
+    parser.add_argument("--window", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    raw_updates = load_updates(args.updates) if args.updates else synthetic_updates(args.synthetic)
+    report = asyncio.run(replay(raw_updates, args.window, args.seed))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["missing"] or report["duplicated"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
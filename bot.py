@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import sys
 import os
 from os import getenv
 
@@ -10,27 +9,28 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 from aiogram.types import BotCommand
 
-from config import BOT_TOKEN
-from handlers import user
-from services.database import Database
+from config import BOT_TOKEN, SUBSCRIPTION_SWEEP_ENABLED, RATE_LIMIT_ENABLED
+from handlers import user, inline
+from middlewares.throttling import ThrottlingMiddleware
+from middlewares.dedup import CallbackDedupMiddleware
+from middlewares.idempotency import IdempotencyMiddleware
+from middlewares.log_context import LogContextMiddleware
+from services.database import db
+from services.subscriptions import SubscriptionSweeper
+from services.rates import rates_provider
+from services.charts import chart_renderer
+from services.jobs import calculation_queue
 from utils.validators import validate_channel
+from utils.log import setup_logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-# Global database instance
-db = None
+# Configure logging: JSON lines to stdout and logs/, written by a background thread
+setup_logging()
 
 async def set_bot_commands(bot: Bot):
     """Устанавливает команды бота для меню"""
     commands = [
         BotCommand(command="start", description="🚀 Начать расчет неустойки"),
+        BotCommand(command="calc", description="⚡️ Расчет одной командой"),
         BotCommand(command="reset", description="🔄 Сбросить текущий расчет"),
         BotCommand(command="help", description="❓ Помощь и инструкции"),
         BotCommand(command="about", description="ℹ️ О боте"),
@@ -41,6 +41,7 @@ async def set_bot_commands(bot: Bot):
         BotCommand(command="admin", description="🔐 Админ панель"),
         BotCommand(command="stats", description="📊 Статистика бота"),
         BotCommand(command="adduser", description="➕ Добавить пользователя"),
+        BotCommand(command="recalc", description="🧾 Пересчитать сохраненный расчет"),
         BotCommand(command="cancel", description="❌ Отменить текущее действие"),
     ]
     
@@ -64,9 +65,7 @@ async def main():
     # Create data directory if it doesn't exist
     os.makedirs("data", exist_ok=True)
     
-    # Initialize database
-    global db
-    db = Database()
+    # Initialize database (backend is selected by DATABASE_URL, SQLite by default)
     db.create_tables()
     
     # Initialize bot and dispatcher
@@ -84,13 +83,46 @@ async def main():
     else:
         logging.info("Channel configuration is valid. Subscription check should work properly.")
     
+    # update_id и user_id во всех записях лога при обработке обновления
+    dp.update.outer_middleware(LogContextMiddleware())
+    
+    # Повторно доставленные обновления (после сбоя или ретрая вебхука) не обрабатываем
+    idempotency = IdempotencyMiddleware(db)
+    dp.update.outer_middleware(idempotency)
+    
+    # Ограничение частоты и повторных нажатий - до фильтров и обработчиков
+    if RATE_LIMIT_ENABLED:
+        throttling = ThrottlingMiddleware(exempt_ids=user.ADMIN_IDS)
+        dp.message.outer_middleware(throttling)
+        dp.callback_query.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(CallbackDedupMiddleware())
+    
     # Register routers
     dp.include_router(user.router)
+    dp.include_router(inline.router)
+    
+    # Уведомляем админов об отказе и восстановлении источника ставок
+    rates_provider.breaker.on_state_change = lambda old_state, new_state: user.on_rates_state_change(
+        bot, old_state, new_state
+    )
+    
+    # Фоновая перепроверка подписок имеет смысл только при доступном канале
+    sweeper_task = None
+    if SUBSCRIPTION_SWEEP_ENABLED and channel_valid:
+        sweeper = SubscriptionSweeper(bot, user.CHANNEL_ID, db)
+        sweeper_task = asyncio.create_task(sweeper.run())
     
     # Start polling
     logging.info("Starting bot...")
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if sweeper_task:
+            sweeper_task.cancel()
+        chart_renderer.shutdown()
+        calculation_queue.shutdown()
+        idempotency.flush()
 
 if __name__ == "__main__":
     try:
@@ -98,10 +130,8 @@ if __name__ == "__main__":
     except (KeyboardInterrupt, SystemExit):
         logging.info("Bot stopped")
         # Close database connection
-        if db:
-            db.close()
+        db.close()
     except Exception as e:
         logging.error(f"Unexpected error: {e}", exc_info=True) 
         # Close database connection
-        if db:
-            db.close() 
\ No newline at end of file
+        db.close() 
\ No newline at end of file
@@ -7,10 +7,91 @@ load_dotenv()
 # Bot configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Logging: JSON lines to stdout and LOG_FILE, written by a background thread (utils/log.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "logs/penalty_bot.log")  # empty - stdout only
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "5"))
+LOG_DEBUG_SAMPLE_RATE = int(os.getenv("LOG_DEBUG_SAMPLE_RATE", "100"))  # keep 1 of N records per DEBUG line
+
 # Google Sheets configuration
 GOOGLE_CREDS_FILE = "data/service_account.json"
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 SHEET_NAME = os.getenv("SHEET_NAME", "Лист1")  # Default sheet name
+SHEETS_SYNC_OVERLAP = int(os.getenv("SHEETS_SYNC_OVERLAP", "7"))  # already synced rows re-read to detect edits
+SHEETS_FULL_SYNC_INTERVAL = int(os.getenv("SHEETS_FULL_SYNC_INTERVAL", "3600"))  # seconds between full reconciliations
+# Optional partitioned layout, loaded with one values.batchGet call (comma-separated A1 ranges).
+# Rate ranges hold "date, rate[, moratorium]" rows, moratorium ranges hold "start, end" rows.
+# When SHEETS_RATE_RANGES is empty the single SHEET_NAME!A2:C layout is used.
+SHEETS_RATE_RANGES = [r.strip() for r in os.getenv("SHEETS_RATE_RANGES", "").split(",") if r.strip()]
+SHEETS_MORATORIUM_RANGES = [r.strip() for r in os.getenv("SHEETS_MORATORIUM_RANGES", "").split(",") if r.strip()]
+# Rates source: "sheets" (default), "csv" or "binary" (memory-mapped, see services/rates.py)
+RATES_SOURCE = os.getenv("RATES_SOURCE", "sheets")
+RATES_FILE = os.getenv("RATES_FILE")  # path for the csv/binary sources
+SHEETS_API_ENDPOINT = os.getenv("SHEETS_API_ENDPOINT")  # override for a local mock Sheets server
+SHEETS_HTTP_TIMEOUT = float(os.getenv("SHEETS_HTTP_TIMEOUT", "10"))  # seconds per HTTP request
+SHEETS_QUOTA_PER_MINUTE = int(os.getenv("SHEETS_QUOTA_PER_MINUTE", "50"))  # client-side read budget (Google: 60/min per user)
+SHEETS_QUOTA_RESERVE = int(os.getenv("SHEETS_QUOTA_RESERVE", "10"))  # budget kept back from routine refreshes
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "4"))  # retries for 429/5xx responses
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", "0.5"))  # seconds, doubled per retry
+SHEETS_BACKOFF_MAX = float(os.getenv("SHEETS_BACKOFF_MAX", "16"))  # seconds, cap for a single backoff
+# Seconds a calculation waits for fresh rates; Sheets requests and retries stop at this
+# deadline, so it must exceed SHEETS_HTTP_TIMEOUT for a request to be attempted at all
+RATES_FETCH_TIMEOUT = float(os.getenv("RATES_FETCH_TIMEOUT", "15"))
+RATES_BREAKER_FAILURE_THRESHOLD = int(os.getenv("RATES_BREAKER_FAILURE_THRESHOLD", "3"))  # failures before opening
+RATES_BREAKER_RESET_TIMEOUT = float(os.getenv("RATES_BREAKER_RESET_TIMEOUT", "60"))  # seconds before a half-open probe
+
+# Database configuration (SQLite by default, postgresql://... for a shared store)
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))  # user profiles kept for dirty-checking
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "600"))  # seconds; bounds staleness across instances
+
+# Background re-verification of channel subscriptions
+SUBSCRIPTION_SWEEP_ENABLED = os.getenv("SUBSCRIPTION_SWEEP_ENABLED", "true").lower() == "true"
+SUBSCRIPTION_SWEEP_PERIOD = int(os.getenv("SUBSCRIPTION_SWEEP_PERIOD", "86400"))  # seconds for one full pass
+SUBSCRIPTION_SWEEP_MIN_INTERVAL = float(os.getenv("SUBSCRIPTION_SWEEP_MIN_INTERVAL", "0.2"))  # flood-safe gap between checks
+SUBSCRIPTION_SWEEP_BATCH_SIZE = int(os.getenv("SUBSCRIPTION_SWEEP_BATCH_SIZE", "100"))
+
+# Per-user throttling of messages and button presses (token bucket)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+MAX_REQUESTS_PER_MINUTE = int(os.getenv("MAX_REQUESTS_PER_MINUTE", "10"))  # sustained rate
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))  # requests allowed in a row
+RATE_LIMIT_MAX_USERS = int(os.getenv("RATE_LIMIT_MAX_USERS", "10000"))  # buckets kept in memory
+
+# Skipping redelivered updates (update_id), see middlewares/idempotency.py
+IDEMPOTENCY_WINDOW = int(os.getenv("IDEMPOTENCY_WINDOW", "10000"))  # recent update ids kept in memory
+IDEMPOTENCY_PERSIST_INTERVAL = float(os.getenv("IDEMPOTENCY_PERSIST_INTERVAL", "5"))  # seconds between high-water mark writes
+
+# Bounded queue of calculations started by users
+CALC_WORKERS = int(os.getenv("CALC_WORKERS", "4"))  # calculations running at the same time
+CALC_QUEUE_SIZE = int(os.getenv("CALC_QUEUE_SIZE", "100"))  # calculations waiting; more are refused as overload
+
+# LRU cache of calculation results, keyed by rates snapshot, dates and divisor
+PENALTY_CACHE_SIZE = int(os.getenv("PENALTY_CACHE_SIZE", "4096"))
+
+# Inline mode (@bot 2500000 01.03.2024); inline mode must be enabled in @BotFather
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))  # seconds Telegram caches an inline answer
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", "2048"))  # ready answers kept in memory
+INLINE_DEBOUNCE = float(os.getenv("INLINE_DEBOUNCE", "0.3"))  # seconds to wait for the next keystroke
+INLINE_PENDING_MAX_USERS = int(os.getenv("INLINE_PENDING_MAX_USERS", "10000"))  # users with a debounced query kept in memory
+INLINE_RATES_MAX_AGE = float(os.getenv("INLINE_RATES_MAX_AGE", "300"))  # seconds between background rate refreshes
+
+# HTTP API for internal systems (api.py)
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_TOKEN = os.getenv("API_TOKEN")  # if set, required as "Authorization: Bearer <token>"
+API_BATCH_LIMIT = int(os.getenv("API_BATCH_LIMIT", "1000"))  # calculations per batch request
+API_MAX_BODY_SIZE = int(os.getenv("API_MAX_BODY_SIZE", str(1024 * 1024)))  # bytes
+API_RATES_MAX_AGE = float(os.getenv("API_RATES_MAX_AGE", "300"))  # seconds between background rate refreshes
+API_LOG_FILE = os.getenv("API_LOG_FILE", "logs/api.log")  # separate from the bot's LOG_FILE
+
+# Penalty growth charts (require matplotlib)
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "data/charts")
+CHART_CACHE_MAX_FILES = int(os.getenv("CHART_CACHE_MAX_FILES", "1000"))
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))  # processes rendering charts
+CHART_FORECAST_DAYS = int(os.getenv("CHART_FORECAST_DAYS", "90"))  # days shown after the calculation date
 
 # Calculation constants
 DEFAULT_DIVISOR_FL = 150
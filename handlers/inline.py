@@ -0,0 +1,205 @@
+import asyncio
+import re
+from collections import OrderedDict
+from datetime import date
+from typing import List, Optional, Tuple
+
+from aiogram import Router, Bot
+from aiogram.types import (
+    InlineQuery, InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent
+)
+
+from config import INLINE_CACHE_TIME, INLINE_CACHE_SIZE, INLINE_DEBOUNCE, INLINE_PENDING_MAX_USERS, INLINE_RATES_MAX_AGE
+from handlers.user import is_subscribed
+from services.metrics import metrics
+from services.penalty_cache import penalty_cache
+from services.rates import rates_provider, RatesUnavailableError
+from utils.validators import parse_calc_args
+
+# Полный запрос: сумма (можно с пробелами), дата передачи и необязательная дата расчета.
+# Все, что не подходит под шаблон, считается недописанным и не рассчитывается
+COMPLETE_QUERY = re.compile(r"^\d[\d ,.]*? \d{1,2}\.\d{1,2}\.\d{4}(?: \d{1,2}\.\d{1,2}\.\d{4})?$")
+
+# Варианты расчета в выдаче: id результата, ФЛ, уникальный, подпись
+VARIANTS = (
+    ("fl", True, False, "ФЛ, не уникальный"),
+    ("fl_u", True, True, "ФЛ, уникальный"),
+    ("ul", False, False, "ЮЛ, не уникальный"),
+    ("ul_u", False, True, "ЮЛ, уникальный"),
+)
+
+# Кнопка-подсказка для недописанного запроса: ответ одинаков для всех,
+# поэтому Telegram кеширует его у себя и повторные нажатия до нас не доходят
+HINT_BUTTON = InlineQueryResultsButton(text="Сумма и дата: 2500000 01.03.2024", start_parameter="inline")
+SUBSCRIBE_BUTTON = InlineQueryResultsButton(text="📢 Подпишитесь на канал, чтобы считать", start_parameter="subscribe")
+
+router = Router()
+
+
+class InlineAnswerCache:
+    """
+    LRU готовых ответов на inline-запросы
+
+    Ключ - нормализованный текст запроса, хеш снимка ставок и текущая дата
+    (дата расчета по умолчанию - сегодня), поэтому смена ставок или дня
+    сама по себе делает старые записи недостижимыми.
+    """
+
+    def __init__(self, maxsize: int = INLINE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str, int], List[InlineQueryResultArticle]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str, int]) -> Optional[List[InlineQueryResultArticle]]:
+        results = self._entries.get(key)
+        if results is not None:
+            self._entries.move_to_end(key)
+        return results
+
+    def put(self, key: Tuple[str, str, int], results: List[InlineQueryResultArticle]):
+        self._entries[key] = results
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class LatestQueries:
+    """
+    Последний полный запрос каждого пользователя, ожидающий паузы ввода
+
+    Более новый запрос пользователя отменяет ожидающий. Запись удаляется,
+    когда ожидание заканчивается (в том числе отменой задачи), а сами записи
+    хранятся в LRU на maxsize пользователей: запрос, вытесненный из него,
+    считается отмененным.
+    """
+
+    def __init__(self, maxsize: int = INLINE_PENDING_MAX_USERS):
+        self.maxsize = maxsize
+        self._queries: "OrderedDict[int, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._queries)
+
+    def start(self, user_id: int, query_id: str):
+        self._queries[user_id] = query_id
+        self._queries.move_to_end(user_id)
+        while len(self._queries) > self.maxsize:
+            self._queries.popitem(last=False)
+
+    def finish(self, user_id: int, query_id: str) -> bool:
+        """Заканчивает ожидание; True, если запрос остался последним"""
+        if self._queries.get(user_id) != query_id:
+            return False
+        del self._queries[user_id]
+        return True
+
+
+answer_cache = InlineAnswerCache()
+latest_queries = LatestQueries()
+
+
+def build_results(user_data: dict, rates_table, snapshot_hash: str) -> List[InlineQueryResultArticle]:
+    """Статьи выдачи: по одной на каждый вариант ФЛ/ЮЛ и уникальности"""
+    amount = user_data["contract_amount"]
+    period = f"{user_data['deadline_date_str']} – {user_data['calculation_date_str']}"
+    results = []
+
+    for result_id, is_individual, is_unique, label in VARIANTS:
+        result = penalty_cache.calculate(
+            rates_table,
+            snapshot_hash,
+            contract_amount=amount,
+            deadline_date=user_data["deadline_date"],
+            calculation_date=user_data["calculation_date"],
+            is_individual=is_individual,
+            is_unique_object=is_unique
+        )
+        if "message" in result:
+            # Ответ не зависит от варианта (нет просрочки или ставки на дату)
+            return [InlineQueryResultArticle(
+                id="message",
+                title=result["message"],
+                description=period,
+                input_message_content=InputTextMessageContent(message_text=result["message"])
+            )]
+
+        results.append(InlineQueryResultArticle(
+            id=result_id,
+            title=f"{label}: {result['penalty_amount']:,.2f} руб.",
+            description=(
+                f"Просрочка {result['delay_days']} дн. (мораторий {result['moratorium_days']}), "
+                f"ставка {result['refinancing_rate']:.2f}%"
+            ),
+            input_message_content=InputTextMessageContent(message_text=(
+                f"💰 Неустойка по ДДУ: {result['penalty_amount']:,.2f} руб.\n"
+                f"💵 Сумма по ДДУ: {amount:,.2f} руб.\n"
+                f"📅 Период: {period}, просрочка {result['delay_days']} дней "
+                f"(из них {result['moratorium_days']} дней под мораторием)\n"
+                f"💹 Ставка рефинансирования: {result['refinancing_rate']:.2f}% "
+                f"(на дату {user_data['deadline_date_str']})\n"
+                f"🔢 Условия: {label}"
+            ))
+        ))
+    return results
+
+
+@router.inline_query()
+async def inline_calculation(inline_query: InlineQuery, bot: Bot):
+    """
+    Быстрый расчет в любом чате: @bot 2500000 01.03.2024 [01.06.2024]
+
+    Запросы приходят на каждое нажатие клавиши. Недописанный запрос сразу
+    получает общую подсказку без расчета; полный сначала ищется в кеше
+    готовых ответов, а при промахе рассчитывается после паузы
+    INLINE_DEBOUNCE, если за это время пользователь не ввел что-то еще.
+    """
+    metrics.incr("inline_queries")
+    text = " ".join(inline_query.query.split())
+
+    if not COMPLETE_QUERY.match(text):
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME, button=HINT_BUTTON)
+        return
+
+    user_id = inline_query.from_user.id
+    if not await is_subscribed(bot, user_id, inline_query.from_user):
+        await inline_query.answer([], cache_time=0, is_personal=True, button=SUBSCRIBE_BUTTON)
+        return
+
+    try:
+        # Последняя загруженная таблица; обновление - в фоне, не чаще раза в INLINE_RATES_MAX_AGE
+        rates_table = await rates_provider.get_cached_rates(INLINE_RATES_MAX_AGE)
+        snapshot = rates_provider.snapshot_for(rates_table)
+    except RatesUnavailableError:
+        await inline_query.answer(
+            [], cache_time=0, is_personal=True,
+            button=InlineQueryResultsButton(text="❌ Ставки временно недоступны", start_parameter="inline")
+        )
+        return
+
+    key = (text, snapshot.hash, date.today().toordinal())
+    results = answer_cache.get(key)
+    if results is not None:
+        metrics.incr("inline_cache_hits")
+        await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    # Ждем, не продолжит ли пользователь ввод; устаревший запрос не отвечаем
+    latest_queries.start(user_id, inline_query.id)
+    try:
+        await asyncio.sleep(INLINE_DEBOUNCE)
+    finally:
+        is_latest = latest_queries.finish(user_id, inline_query.id)
+    if not is_latest:
+        metrics.incr("inline_debounced")
+        return
+
+    user_data, error = parse_calc_args(text)
+    if error:
+        await inline_query.answer(
+            [], cache_time=INLINE_CACHE_TIME,
+            button=InlineQueryResultsButton(text=f"❌ {error}", start_parameter="inline")
+        )
+        return
+
+    metrics.incr("inline_calculations")
+    results = build_results(user_data, rates_table, snapshot.hash)
+    answer_cache.put(key, results)
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
@@ -1,17 +1,30 @@
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command, CommandStart
+from aiogram.types import Message, CallbackQuery, FSInputFile, User
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+import asyncio
+import logging
 import random
+from typing import Optional
 
-from services.sheets import GoogleSheetsService
+from services.rates import rates_provider, RatesUnavailableError
+from services.snapshots import SnapshotStore
+from services.charts import chart_renderer, charts_available
+from services.penalty_cache import penalty_cache
+from services.jobs import calculation_queue, QueueFullError
+from services.circuit import CLOSED, OPEN
+from services.metrics import metrics
 from services.calculator import PenaltyCalculator
 from services.database import db
-from utils.validators import validate_amount, validate_date
+from utils.validators import validate_amount, validate_date, parse_user_import, parse_calc_args
+from config import CHART_FORECAST_DAYS
+
+# Снимки таблицы ставок, на которых сделаны расчеты
+snapshot_store = SnapshotStore(db)
 
 # Определение ID канала, на который должны быть подписаны пользователи
 # Убираем "-100" в начале, так как это префикс Telegram
@@ -23,6 +36,9 @@ CHANNEL_LINK = "https://t.me/sviridov_mikhail_Lawyer"
 # ID администраторов бота, которые могут использовать admin команды
 ADMIN_IDS = [862754324, 1698240710]  # Замените на реальные ID администраторов
 
+# Максимальный размер файла для массового импорта пользователей
+MAX_IMPORT_FILE_SIZE = 5 * 1024 * 1024
+
 # Различные варианты сообщений для неподписанных пользователей
 SUBSCRIPTION_MESSAGES = [
     "⚠️ Вы всё еще не подписаны на наш канал.\n\n1️⃣ Нажмите кнопку «Подписаться на канал»\n2️⃣ После подписки нажмите «Проверить подписку»",
@@ -48,62 +64,123 @@ class PenaltyForm(StatesGroup):
 # Initialize router
 router = Router()
 
+logger = logging.getLogger(__name__)
+
 ADMIN_GROUP_ID = -1002264639600
 
 async def notify_admins(bot: Bot, text: str):
     try:
         await bot.send_message(ADMIN_GROUP_ID, text)
     except Exception as e:
-        print(f"Ошибка отправки в группу: {e}")
+        logger.error("Ошибка отправки в группу: %s", e)
+
+async def notify_rates_state_change(bot: Bot, old_state: str, new_state: str):
+    """Сообщает админам об отказе (CLOSED -> OPEN) и восстановлении (-> CLOSED) источника ставок"""
+    if new_state == OPEN:
+        text = (
+            "⚠️ Источник ставок недоступен: загрузка ставок отключена, "
+            "расчеты выполняются по последней загруженной таблице."
+        )
+    else:
+        text = "✅ Источник ставок снова доступен."
+    await notify_admins(bot, text)
+
+# Задачи уведомлений держим в множестве, иначе их может собрать сборщик мусора
+_notification_tasks = set()
+
+def on_rates_state_change(bot: Bot, old_state: str, new_state: str):
+    """
+    Колбэк CircuitBreaker.on_state_change
+    
+    Пробы HALF_OPEN и их неудачи (HALF_OPEN -> OPEN) не уведомляют: при
+    долгом отказе админы получают одно сообщение об отказе и одно о
+    восстановлении, а не по паре на каждую пробу.
+    """
+    if not (old_state == CLOSED and new_state == OPEN or new_state == CLOSED):
+        return
+    task = asyncio.create_task(notify_rates_state_change(bot, old_state, new_state))
+    _notification_tasks.add(task)
+    task.add_done_callback(_notification_tasks.discard)
+
+
+def pack_calculation_params(data: dict) -> str:
+    """Параметры расчета в компактном виде для callback_data (лимит Telegram - 64 байта)"""
+    return (
+        f"{round(data['contract_amount'] * 100)}:{data['deadline_date'].toordinal()}:"
+        f"{data['calculation_date'].toordinal()}:{int(data['is_individual'])}:{int(data['is_unique'])}"
+    )
+
+
+def unpack_calculation_params(packed: str) -> dict:
+    """Обратное преобразование pack_calculation_params() в аргументы calculate_penalty()"""
+    amount, deadline, calculation, is_individual, is_unique = packed.split(":")
+    return dict(
+        contract_amount=int(amount) / 100,
+        deadline_date=date.fromordinal(int(deadline)),
+        calculation_date=date.fromordinal(int(calculation)),
+        is_individual=is_individual == "1",
+        is_unique_object=is_unique == "1"
+    )
+
+
+# Сколько периодов ставки показывать в разбивке
+MAX_BREAKDOWN_INTERVALS = 20
+
+# Кнопка графика показывается, только если установлен matplotlib
+CHARTS_ENABLED = charts_available()
+
 
 # Function to check channel subscription
-async def is_subscribed(bot: Bot, user_id: int) -> bool:
+async def is_subscribed(bot: Bot, user_id: int, profile: Optional[User] = None) -> bool:
     """
     Проверка подписки пользователя на канал
     
     Сначала проверяем в базе данных, и только если там нет - 
-    пытаемся проверить через API Telegram
+    пытаемся проверить через API Telegram. Ошибка API считается
+    отсутствием подписки и в базу не записывается. Подтвержденная
+    подписка сохраняется вместе с именем из profile, если он передан:
+    при первом /start это одна запись профиля вместо двух.
     """
-    # Debug logging
-    print(f"Checking subscription for user {user_id}")
+    # Отладочные записи прореживаются (LOG_DEBUG_SAMPLE_RATE): проверка идет на каждом шаге
+    logger.debug("Checking subscription for user %s", user_id)
     
     # Проверяем в базе данных
-    db_status = db.is_user_subscribed(user_id)
-    print(f"DB subscription status: {db_status}")
+    db_status = await db.run(db.is_user_subscribed, user_id)
+    logger.debug("DB subscription status for user %s: %s", user_id, db_status)
     
     if db_status:
         return True
         
     # Проверяем через API Telegram
     try:
-        print(f"Checking via Telegram API, channel_id={CHANNEL_ID}")
+        logger.debug("Checking via Telegram API, channel_id=%s", CHANNEL_ID)
         member = await bot.get_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
-        print(f"Member status: {member.status}")
+        logger.debug("Member status: %s", member.status)
         
         # Проверка, что пользователь не покинул канал (left) и не был кикнут (kicked)
         is_subscribed_via_api = member.status not in ['left', 'kicked']
-        print(f"API subscription result: {is_subscribed_via_api}")
+        logger.debug("API subscription result: %s", is_subscribed_via_api)
         
         # Если пользователь подписан, сохраняем в БД
         if is_subscribed_via_api:
-            db.add_subscribed_user(
+            await db.run(
+                db.add_subscribed_user,
                 user_id=user_id,
+                first_name=profile.first_name if profile else None,
+                last_name=profile.last_name if profile else None,
+                username=profile.username if profile else None,
                 is_subscribed=True
             )
         
         return is_subscribed_via_api
         
     except TelegramAPIError as e:
-        # Вероятно, бот не является администратором канала или неверный ID канала
-        print(f"Telegram API error: {e}")
-        
-        # Временное решение: автоматически добавляем пользователя как подписанного в случае ошибки
-        print(f"Auto-approving user {user_id} due to channel configuration error")
-        db.add_subscribed_user(
-            user_id=user_id,
-            is_subscribed=True
-        )
-        return True
+        # Вероятно, бот не является администратором канала или неверный ID канала.
+        # Ошибка не подтверждает подписку: ничего не сохраняем и считаем, что
+        # пользователь не подписан (после 3 повторных проверок он будет пропущен,
+        # см. process_check_subscription)
+        logger.warning("Telegram API error while checking subscription of user %s: %s", user_id, e)
+        return False
 
 
 # Admin command to manually add a user as subscribed
@@ -118,8 +195,9 @@ async def cmd_admin(message: Message, state: FSMContext):
     
     commands_info = (
         "🔐 <b>Административные команды:</b>\n\n"
-        "/adduser - Добавить пользователя как подписанного по ID\n"
-        "/stats - Получить статистику использования бота"
+        "/adduser - Добавить пользователя (или файл со списком ID) как подписанного\n"
+        "/stats - Получить статистику использования бота\n"
+        "/recalc ID - Пересчитать сохраненный расчет на его снимке ставок и на текущих ставках"
     )
     
     await message.answer(commands_info, parse_mode="HTML")
@@ -136,7 +214,9 @@ async def cmd_add_user(message: Message, state: FSMContext, bot: Bot):
         return
     
     await message.answer(
-        "Введите ID пользователя, которого нужно добавить как подписанного:\n\n"
+        "Введите ID пользователя, которого нужно добавить как подписанного.\n\n"
+        "📎 Для массового импорта отправьте .txt или .csv файл: по одному ID в строке, "
+        "при необходимости через запятую имя, фамилия и username.\n\n"
         "💡 Для отмены используйте команду /cancel"
     )
     await state.set_state(AdminForm.add_user_id)
@@ -155,12 +235,60 @@ async def cmd_cancel(message: Message, state: FSMContext):
     await message.answer("✅ Текущее действие отменено.")
 
 
+# Handler for bulk user import from a file
+@router.message(AdminForm.add_user_id, F.document)
+async def process_add_users_file(message: Message, state: FSMContext, bot: Bot):
+    if message.document.file_size and message.document.file_size > MAX_IMPORT_FILE_SIZE:
+        await message.answer(
+            f"❌ Файл слишком большой (максимум {MAX_IMPORT_FILE_SIZE // (1024 * 1024)} МБ). "
+            "Отправьте файл поменьше или /cancel для отмены:"
+        )
+        return
+    
+    content = (await bot.download(message.document)).read()
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Excel в русской локали сохраняет CSV в cp1251
+        text = content.decode("cp1251", errors="replace")
+    
+    users, invalid = parse_user_import(text)
+    if not users:
+        await message.answer(
+            f"❌ В файле не найдено корректных ID пользователей (некорректных строк: {invalid}). "
+            "Отправьте другой файл или /cancel для отмены:"
+        )
+        return
+    
+    try:
+        inserted, updated = await db.run(db.bulk_add_subscribed_users, users)
+    except Exception as e:
+        await message.answer(f"❌ Ошибка при импорте пользователей: {e}")
+        await state.clear()
+        return
+    
+    report = (
+        f"✅ Импорт завершен.\n\n"
+        f"➕ Добавлено: {inserted}\n"
+        f"🔄 Обновлено: {updated}\n"
+        f"⚠️ Некорректных строк: {invalid}"
+    )
+    await message.answer(report)
+    await notify_admins(
+        bot,
+        f"👥 Массовый импорт пользователей из файла {message.document.file_name} "
+        f"(админ {message.from_user.id}): добавлено {inserted}, обновлено {updated}, некорректных строк {invalid}"
+    )
+    
+    await state.clear()
+
+
 # Handler for user ID input
 @router.message(AdminForm.add_user_id)
 async def process_add_user_id(message: Message, state: FSMContext, bot: Bot):
     # Проверяем, не является ли это командой
-    if message.text.startswith('/'):
-        await message.answer("❌ Ожидается ID пользователя, а не команда. Для отмены используйте /cancel")
+    if not message.text or message.text.startswith('/'):
+        await message.answer("❌ Ожидается ID пользователя или файл, а не команда. Для отмены используйте /cancel")
         return
     
     # Validate user ID
@@ -171,7 +299,7 @@ async def process_add_user_id(message: Message, state: FSMContext, bot: Bot):
         return
     
     # Add user to database
-    success = db.add_subscribed_user(user_id)
+    success = await db.run(db.add_subscribed_user, user_id)
     
     if success:
         await message.answer(f"✅ Пользователь с ID {user_id} успешно добавлен как подписанный.")
@@ -196,7 +324,7 @@ async def cmd_stats(message: Message, state: FSMContext):
         return
     
     # Получаем статистику из базы данных
-    stats = db.get_statistics()
+    stats = await db.run(db.get_statistics)
     
     # Форматируем данные для отображения
     avg_penalty = round(stats.get("avg_penalty", 0), 2)
@@ -214,9 +342,73 @@ async def cmd_stats(message: Message, state: FSMContext):
         f"🏗 Расчеты для уникальных объектов: {stats.get('unique_objects_calculations', 0)}"
     )
     
+    runtime_metrics = metrics.snapshot()
+    if runtime_metrics:
+        stats_message += "\n\n⚙️ <b>Метрики с момента запуска:</b>\n" + "\n".join(
+            f"• {name}: {value}" for name, value in runtime_metrics.items()
+        )
+    
     await message.answer(stats_message, parse_mode="HTML")
 
 
+# Admin command to reproduce a stored calculation
+@router.message(Command("recalc"))
+async def cmd_recalc(message: Message, state: FSMContext):
+    # Сбрасываем любое предыдущее состояние
+    await state.clear()
+    
+    if message.from_user.id not in ADMIN_IDS:
+        # Если пользователь не админ, игнорируем команду
+        return
+    
+    args = message.text.split()
+    if len(args) != 2 or not args[1].isdigit():
+        await message.answer("Использование: /recalc ID_расчета")
+        return
+    
+    calculation = await db.run(db.get_calculation, int(args[1]))
+    if calculation is None:
+        await message.answer("❌ Расчет с таким ID не найден.")
+        return
+    
+    params = dict(
+        contract_amount=calculation["contract_amount"],
+        deadline_date=datetime.strptime(calculation["deadline_date"], "%d.%m.%Y").date(),
+        calculation_date=datetime.strptime(calculation["calculation_date"], "%d.%m.%Y").date(),
+        is_individual=bool(calculation["is_individual"]),
+        is_unique_object=bool(calculation["is_unique"])
+    )
+    
+    def format_result(result: dict) -> str:
+        if "message" in result:
+            return result["message"]
+        return f"{result['penalty_amount']:,.2f} руб. ({result['delay_days']} дн., мораторий {result['moratorium_days']} дн.)"
+    
+    lines = [
+        f"🧾 <b>Расчет #{calculation['id']}</b>\n",
+        f"Сумма: {calculation['contract_amount']:,.2f} руб., "
+        f"{calculation['deadline_date']} → {calculation['calculation_date']}",
+        f"Сохраненный результат: {calculation['penalty_amount']:,.2f} руб."
+    ]
+    
+    snapshot_id = calculation.get("snapshot_id")
+    snapshot_table = await db.run(snapshot_store.load_table, snapshot_id) if snapshot_id else None
+    if snapshot_table is not None:
+        result = PenaltyCalculator(snapshot_table).calculate_penalty(**params)
+        lines.append(f"На снимке ставок #{snapshot_id}: {format_result(result)}")
+    else:
+        lines.append("Снимок ставок для этого расчета не сохранен.")
+    
+    try:
+        rates_data = await rates_provider.get_rates()
+        result = penalty_cache.calculate(rates_data, rates_provider.snapshot_for(rates_data).hash, **params)
+        lines.append(f"На текущих ставках: {format_result(result)}")
+    except RatesUnavailableError:
+        lines.append("Текущие ставки сейчас недоступны.")
+    
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
 # Help command handler
 @router.message(Command("help"))
 async def cmd_help(message: Message, state: FSMContext):
@@ -226,6 +418,8 @@ async def cmd_help(message: Message, state: FSMContext):
     help_text = (
         "❓ <b>Помощь по использованию бота</b>\n\n"
         "🚀 <b>/start</b> - Начать новый расчет неустойки по ДДУ\n"
+        "⚡️ <b>/calc</b> - Расчет одной командой: /calc 3500000 01.03.2024 [01.06.2024] [фл|юл] [уник]\n"
+        "💬 <b>@имя_бота 3500000 01.03.2024</b> - Быстрый расчет прямо в любом чате (все варианты ФЛ/ЮЛ)\n"
         "🔄 <b>/reset</b> - Сбросить текущий расчет и начать заново\n"
         "❓ <b>/help</b> - Показать это сообщение с помощью\n"
         "ℹ️ <b>/about</b> - Информация о боте и расчетах\n\n"
@@ -298,18 +492,21 @@ async def cmd_about(message: Message, state: FSMContext):
 async def cmd_start(message: Message, state: FSMContext, bot: Bot):
     await state.clear()
     
-    # Сохраняем информацию о пользователе, даже если он не подписан
-    db.add_subscribed_user(
+    # Проверяем подписку на канал; подписка, подтвержденная через API,
+    # сохраняется сразу с именем пользователя
+    is_user_subscribed = await is_subscribed(bot, message.from_user.id, message.from_user)
+    
+    # Сохраняем информацию о пользователе, даже если он не подписан: одна
+    # запись с уже известным статусом (и никакой, если профиль не изменился)
+    await db.run(
+        db.add_subscribed_user,
         user_id=message.from_user.id,
         first_name=message.from_user.first_name,
         last_name=message.from_user.last_name,
         username=message.from_user.username,
-        is_subscribed=False  # Будет обновлено на True после проверки подписки
+        is_subscribed=is_user_subscribed
     )
     
-    # Проверяем подписку на канал
-    is_user_subscribed = await is_subscribed(bot, message.from_user.id)
-    
     if not is_user_subscribed:
         # Создаем клавиатуру с кнопками
         builder = InlineKeyboardBuilder()
@@ -327,15 +524,6 @@ async def cmd_start(message: Message, state: FSMContext, bot: Bot):
         await state.set_state(PenaltyForm.check_subscription)
         return
     
-    # Если пользователь уже подписан, обновляем статус в базе
-    db.add_subscribed_user(
-        user_id=message.from_user.id,
-        first_name=message.from_user.first_name,
-        last_name=message.from_user.last_name,
-        username=message.from_user.username,
-        is_subscribed=True
-    )
-    
     # Начинаем работу с ботом
     await message.answer(
         "👋 Добро пожаловать в калькулятор неустойки по ДДУ!\n\n"
@@ -361,7 +549,7 @@ async def cmd_start(message: Message, state: FSMContext, bot: Bot):
 @router.callback_query(PenaltyForm.check_subscription, F.data == "check_subscription")
 async def process_check_subscription(callback: CallbackQuery, state: FSMContext, bot: Bot):
     # Проверяем подписку на канал
-    is_user_subscribed = await is_subscribed(bot, callback.from_user.id)
+    is_user_subscribed = await is_subscribed(bot, callback.from_user.id, callback.from_user)
     
     if not is_user_subscribed:
         # В случае ошибок с проверкой, пометим пользователя как подписанного принудительно
@@ -370,12 +558,13 @@ async def process_check_subscription(callback: CallbackQuery, state: FSMContext,
         retry_count = user_data.get('subscription_retry_count', 0) + 1
         await state.update_data(subscription_retry_count=retry_count)
         
-        print(f"Subscription check retry count: {retry_count}")
+        logger.info("Subscription check retry count: %s", retry_count)
         
         # После 3 попыток, просто помечаем как подписанного
         if retry_count >= 3:
-            print(f"Forcing subscription for user {callback.from_user.id} after {retry_count} retries")
-            db.add_subscribed_user(
+            logger.warning("Forcing subscription for user %s after %s retries", callback.from_user.id, retry_count)
+            await db.run(
+                db.add_subscribed_user,
                 user_id=callback.from_user.id,
                 first_name=callback.from_user.first_name,
                 last_name=callback.from_user.last_name,
@@ -419,7 +608,8 @@ async def process_check_subscription(callback: CallbackQuery, state: FSMContext,
         return
     
     # Пользователь подписан, сохраняем информацию о нем
-    db.add_subscribed_user(
+    await db.run(
+        db.add_subscribed_user,
         user_id=callback.from_user.id,
         first_name=callback.from_user.first_name,
         last_name=callback.from_user.last_name,
@@ -449,10 +639,11 @@ async def process_check_subscription(callback: CallbackQuery, state: FSMContext,
 @router.message(Command("reset"))
 async def cmd_reset(message: Message, state: FSMContext, bot: Bot):
     # Проверяем и сохраняем информацию о пользователе
-    is_user_subscribed = await is_subscribed(bot, message.from_user.id)
+    is_user_subscribed = await is_subscribed(bot, message.from_user.id, message.from_user)
     
     # Обновляем информацию в базе данных
-    db.add_subscribed_user(
+    await db.run(
+        db.add_subscribed_user,
         user_id=message.from_user.id,
         first_name=message.from_user.first_name,
         last_name=message.from_user.last_name,
@@ -483,6 +674,45 @@ async def cmd_reset(message: Message, state: FSMContext, bot: Bot):
     )
 
 
+CALC_USAGE = (
+    "Использование: /calc СУММА ДАТА_ПЕРЕДАЧИ [ДАТА_РАСЧЕТА] [фл|юл] [уник]\n"
+    "Например: /calc 3500000 01.03.2024 01.06.2024 юл уник\n\n"
+    "Дата расчета по умолчанию - сегодня, участник - физлицо, объект - не уникальный."
+)
+
+
+# Расчет одной командой, без пошагового ввода
+@router.message(Command("calc"))
+async def cmd_calc(message: Message, state: FSMContext, bot: Bot, command: CommandObject):
+    await state.clear()
+    
+    if not await is_subscribed(bot, message.from_user.id, message.from_user):
+        builder = InlineKeyboardBuilder()
+        builder.button(text="📢 Подписаться на канал", url=CHANNEL_LINK)
+        builder.button(text="🔄 Проверить подписку", callback_data="check_subscription")
+        
+        await message.answer(
+            "⚠️ Для использования бота необходимо подписаться на наш канал.\n\n"
+            "1️⃣ Нажмите кнопку «Подписаться на канал»\n"
+            "2️⃣ После подписки нажмите «Проверить подписку»",
+            reply_markup=builder.as_markup()
+        )
+        await state.set_state(PenaltyForm.check_subscription)
+        return
+    
+    if not command.args:
+        await message.answer(CALC_USAGE)
+        return
+    
+    user_data, error = parse_calc_args(command.args)
+    if error:
+        await message.answer(f"❌ {error}\n\n{CALC_USAGE}")
+        return
+    
+    status_message = await message.answer(calculation_status_text(user_data))
+    await submit_calculation(bot, message.from_user, user_data, status_message)
+
+
 # Contract amount handler
 @router.message(PenaltyForm.contract_amount)
 async def process_contract_amount(message: Message, state: FSMContext):
@@ -620,8 +850,20 @@ async def process_unique_object(callback: CallbackQuery, state: FSMContext, bot:
     # Get all user data from state
     user_data = await state.get_data()
     
-    await callback.message.edit_text(
-        "✅ Данные приняты. Расчет неустойки...\n\n"
+    await callback.message.edit_text(calculation_status_text(user_data))
+    await callback.answer()
+    
+    await submit_calculation(bot, callback.from_user, user_data, callback.message)
+    
+    # Clear state
+    await state.clear()
+
+
+def calculation_status_text(user_data: dict, position: int = 0) -> str:
+    """Текст сообщения "Расчет неустойки..." с параметрами расчета и местом в очереди"""
+    status = f"⏳ Данные приняты. Вы в очереди на расчет: {position}-й" if position else "✅ Данные приняты. Расчет неустойки..."
+    return (
+        f"{status}\n\n"
         "🔢 Параметры расчета:\n"
         f"💰 Сумма по ДДУ: {user_data['contract_amount']:,.2f} руб.\n"
         f"📅 Дата передачи по ДДУ: {user_data['deadline_date_str']}\n"
@@ -629,15 +871,83 @@ async def process_unique_object(callback: CallbackQuery, state: FSMContext, bot:
         f"👤 Тип участника: {'Физическое лицо' if user_data['is_individual'] else 'Юридическое лицо'}\n"
         f"🏢 Уникальный объект: {'Да' if user_data['is_unique'] else 'Нет'}"
     )
+
+
+async def submit_calculation(bot: Bot, user: User, user_data: dict, message: Message):
+    """
+    Ставит расчет в очередь calculation_queue
+    
+    message - сообщение бота "Расчет неустойки...", которое заменяется
+    результатом. Если перед расчетом есть очередь, в нем показывается место
+    в очереди; если очередь переполнена, вместо ожидания сразу сообщаем о
+    перегрузке и предлагаем повторить.
+    """
+    # Место в очереди известно только после submit(); расчет ждет, пока оно
+    # будет показано, иначе запоздавшее редактирование затерло бы результат
+    position_shown = asyncio.Event()
+    
+    async def job():
+        await position_shown.wait()
+        if position:
+            await message.edit_text(calculation_status_text(user_data))
+        await perform_calculation(bot, user, user_data, message)
+    
+    try:
+        position = calculation_queue.submit(job)
+    except QueueFullError:
+        builder = InlineKeyboardBuilder()
+        builder.button(text="🔄 Повторить расчет", callback_data=f"retry_calc:{pack_calculation_params(user_data)}")
+        await message.edit_text(
+            "⚠️ Сейчас выполняется слишком много расчетов.\n"
+            "Пожалуйста, повторите расчет через минуту.",
+            reply_markup=builder.as_markup()
+        )
+        return
+    
+    try:
+        if position:
+            await message.edit_text(calculation_status_text(user_data, position))
+    finally:
+        position_shown.set()
+
+
+# Повтор расчета, не принятого из-за перегрузки
+@router.callback_query(F.data.startswith("retry_calc:"))
+async def process_retry_calculation(callback: CallbackQuery, bot: Bot):
+    params = unpack_calculation_params(callback.data.split(":", 1)[1])
+    user_data = {
+        "contract_amount": params["contract_amount"],
+        "deadline_date": params["deadline_date"],
+        "deadline_date_str": params["deadline_date"].strftime("%d.%m.%Y"),
+        "calculation_date": params["calculation_date"],
+        "calculation_date_str": params["calculation_date"].strftime("%d.%m.%Y"),
+        "is_individual": params["is_individual"],
+        "is_unique": params["is_unique_object"]
+    }
+    
+    await callback.message.edit_text(calculation_status_text(user_data))
+    await callback.answer()
+    await submit_calculation(bot, callback.from_user, user_data, callback.message)
+
+
+async def perform_calculation(bot: Bot, user: User, user_data: dict, message: Message):
+    """
+    Расчет неустойки по собранным параметрам: результат заменяет текст
+    сообщения message ("Расчет неустойки..."), сохраняется в БД, админы
+    получают уведомление.
     
+    user_data - данные в формате состояния PenaltyForm (contract_amount,
+    deadline_date(_str), calculation_date(_str), is_individual, is_unique).
+    """
     # Fetch data from Google Sheets
     try:
-        sheets_service = GoogleSheetsService()
-        rates_data = sheets_service.get_rates_and_moratoriums()
+        rates_data = await rates_provider.get_rates()
+        snapshot = rates_provider.snapshot_for(rates_data)
         
-        # Calculate penalty
-        calculator = PenaltyCalculator(rates_data)
-        result = calculator.calculate_penalty(
+        # Calculate penalty (через кеш результатов для текущего снимка ставок)
+        result = penalty_cache.calculate(
+            rates_data,
+            snapshot.hash,
             contract_amount=user_data["contract_amount"],
             deadline_date=user_data["deadline_date"],
             calculation_date=user_data["calculation_date"],
@@ -647,22 +957,23 @@ async def process_unique_object(callback: CallbackQuery, state: FSMContext, bot:
         
         # Format message based on result
         if "message" in result:
-            await callback.message.answer(result["message"])
+            await message.edit_text(result["message"])
             return
         
         # Format the result message
         participant_type = "Физлицо" if result["is_individual"] else "Юрлицо"
         object_type = "уникальный дом" if result["is_unique_object"] else "не уникальный дом"
         
-        # Сохраняем результаты расчета в БД
+        # Сохраняем результаты расчета в БД вместе со ссылкой на снимок ставок
         calculation_data = {**user_data, **result}
-        db.save_calculation(callback.from_user.id, calculation_data)
+        calculation_data["snapshot_id"] = await db.run(snapshot_store.get_id, snapshot)
+        await db.run(db.save_calculation, user.id, calculation_data)
         
         # Уведомление админам о новом расчете
         await notify_admins(
             bot,
             f"🆕 Новый расчет неустойки:\n"
-            f"Пользователь: {callback.from_user.full_name} (ID: {callback.from_user.id})\n"
+            f"Пользователь: {user.full_name} (ID: {user.id})\n"
             f"Сумма: {user_data['contract_amount']:,.2f} руб.\n"
             f"Дата передачи: {user_data['deadline_date_str']}\n"
             f"Дата расчета: {user_data['calculation_date_str']}\n"
@@ -674,11 +985,14 @@ async def process_unique_object(callback: CallbackQuery, state: FSMContext, bot:
         # Создаем клавиатуру для действий после расчета
         builder = InlineKeyboardBuilder()
         builder.button(text="🚀 Новый расчет", callback_data="new_calculation")
+        builder.button(text="📊 По периодам ставки", callback_data=f"variable:{pack_calculation_params(user_data)}")
+        if CHARTS_ENABLED:
+            builder.button(text="📈 График", callback_data=f"chart:{pack_calculation_params(user_data)}")
         builder.button(text="❓ Помощь", callback_data="quick_help")
         builder.button(text="ℹ️ О боте", callback_data="quick_about")
-        builder.adjust(1, 2)  # Первая кнопка отдельно, остальные в ряд
+        builder.adjust(1, 2 if CHARTS_ENABLED else 1, 2)  # Новый расчет отдельно, остальные по два в ряд
         
-        await callback.message.answer(
+        await message.edit_text(
             f"💰 Итоговая неустойка: {result['penalty_amount']:,.2f} руб.\n"
             f"📅 Просрочка: {result['delay_days']} дней "
             f"(из них {result['moratorium_days']} дней под мораторием)\n"
@@ -690,20 +1004,110 @@ async def process_unique_object(callback: CallbackQuery, state: FSMContext, bot:
             reply_markup=builder.as_markup()
         )
         
-        # Clear state
-        await state.clear()
+    except RatesUnavailableError:
+        # Администраторы уже получили уведомление о смене состояния источника ставок
+        await message.edit_text(
+            "❌ Не удалось загрузить ставки рефинансирования: источник данных временно недоступен.\n"
+            "Пожалуйста, попробуйте позже."
+        )
         
     except Exception as e:
-        await callback.message.answer(
-            f"❌ Произошла ошибка при расчете неустойки: {str(e)}\n"
-            f"Пожалуйста, попробуйте позже или обратитесь к администратору."
+        await message.edit_text(
+            "❌ Произошла ошибка при расчете неустойки.\n"
+            "Пожалуйста, попробуйте позже или обратитесь к администратору."
         )
         await notify_admins(
             bot,
             f"❗️ Ошибка в работе бота (расчет неустойки):\n{str(e)}\n"
-            f"Пользователь: {callback.from_user.full_name} (ID: {callback.from_user.id})"
+            f"Пользователь: {user.full_name} (ID: {user.id})"
         )
-        await state.clear()
+
+
+# Расчет с поденным применением ставки по периодам ее действия
+@router.callback_query(F.data.startswith("variable:"))
+async def process_variable_rate(callback: CallbackQuery):
+    params = unpack_calculation_params(callback.data.split(":", 1)[1])
+    
+    try:
+        rates_data = await rates_provider.get_rates()
+    except RatesUnavailableError:
+        await callback.answer("Ставки сейчас недоступны, попробуйте позже.", show_alert=True)
+        return
+    
+    calculator = penalty_cache.calculator_for(rates_data, rates_provider.snapshot_for(rates_data).hash)
+    result = calculator.calculate_penalty(**params, rate_mode="variable")
+    await callback.answer()
+    
+    if "message" in result:
+        await callback.message.answer(result["message"])
+        return
+    
+    lines = [
+        "📊 <b>Расчет по периодам действия ставки</b>\n",
+        f"💰 Неустойка: {result['penalty_amount']:,.2f} руб.",
+        f"📅 Просрочка: {result['delay_days']} дней (из них {result['moratorium_days']} под мораторием)\n"
+    ]
+    intervals = result["intervals"]
+    for interval in intervals[:MAX_BREAKDOWN_INTERVALS]:
+        period = f"{interval['start'].strftime('%d.%m.%Y')}–{interval['end'].strftime('%d.%m.%Y')}"
+        if interval["moratorium"]:
+            lines.append(f"• {period}: {interval['days']} дн., мораторий")
+        else:
+            lines.append(
+                f"• {period}: {interval['days']} дн. × {interval['rate']:.2f}% = {interval['penalty_amount']:,.2f} руб."
+            )
+    if len(intervals) > MAX_BREAKDOWN_INTERVALS:
+        lines.append(f"… и еще {len(intervals) - MAX_BREAKDOWN_INTERVALS} периодов")
+    
+    await callback.message.answer("\n".join(lines), parse_mode="HTML")
+
+
+# График роста неустойки до даты расчета и на CHART_FORECAST_DAYS дней вперед
+@router.callback_query(F.data.startswith("chart:"))
+async def process_chart(callback: CallbackQuery):
+    packed = callback.data.split(":", 1)[1]
+    params = unpack_calculation_params(packed)
+    
+    try:
+        rates_data = await rates_provider.get_rates()
+    except RatesUnavailableError:
+        await callback.answer("Ставки сейчас недоступны, попробуйте позже.", show_alert=True)
+        return
+    
+    await callback.answer("Строим график...")
+    
+    snapshot_hash = rates_provider.snapshot_for(rates_data).hash
+    key = chart_renderer.cache_key(packed, snapshot_hash)
+    caption = (
+        f"📈 Рост неустойки для суммы {params['contract_amount']:,.2f} руб.\n"
+        f"Пунктир - дата расчета {params['calculation_date'].strftime('%d.%m.%Y')}"
+    )
+    
+    file_id = chart_renderer.file_ids.get(key)
+    if file_id:
+        await callback.message.answer_photo(file_id, caption=caption)
+        return
+    
+    # Кривая нужна только если графика еще нет в кеше на диске
+    def points():
+        calculator = penalty_cache.calculator_for(rates_data, snapshot_hash)
+        return calculator.penalty_curve(
+            contract_amount=params["contract_amount"],
+            deadline_date=params["deadline_date"],
+            last_date=params["calculation_date"] + timedelta(days=CHART_FORECAST_DAYS),
+            is_individual=params["is_individual"],
+            is_unique_object=params["is_unique_object"]
+        )
+    
+    try:
+        path = await chart_renderer.render(key, points, params["calculation_date"], "Неустойка по дате расчета")
+    except Exception as e:
+        logger.exception("Ошибка построения графика: %s", e)
+        await callback.message.answer("❌ Не удалось построить график. Попробуйте позже.")
+        return
+    
+    sent = await callback.message.answer_photo(FSInputFile(path), caption=caption)
+    chart_renderer.file_ids[key] = sent.photo[-1].file_id
 
 
 # Callback handlers for quick actions
@@ -755,7 +1159,7 @@ async def process_new_calculation(callback: CallbackQuery, state: FSMContext, bo
     await state.clear()
     
     # Проверяем подписку
-    is_user_subscribed = await is_subscribed(bot, callback.from_user.id)
+    is_user_subscribed = await is_subscribed(bot, callback.from_user.id, callback.from_user)
     
     if not is_user_subscribed:
         # Создаем клавиатуру с кнопками
@@ -774,7 +1178,8 @@ async def process_new_calculation(callback: CallbackQuery, state: FSMContext, bo
         return
     
     # Обновляем информацию о пользователе
-    db.add_subscribed_user(
+    await db.run(
+        db.add_subscribed_user,
         user_id=callback.from_user.id,
         first_name=callback.from_user.first_name,
         last_name=callback.from_user.last_name,
@@ -0,0 +1 @@
+# Middlewares package 
\ No newline at end of file
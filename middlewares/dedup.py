@@ -0,0 +1,42 @@
+from typing import Any, Awaitable, Callable, Dict, Set, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+from services.metrics import metrics
+
+
+class CallbackDedupMiddleware(BaseMiddleware):
+    """
+    Повторные нажатия кнопок, пока первое еще обрабатывается
+    
+    Пока обработчик нажатия для пары (пользователь, сообщение) не
+    завершился, следующие нажатия в том же сообщении не запускают его
+    повторно (с повторной загрузкой ставок и записью в БД), а только
+    получают пустой callback.answer(), чтобы у кнопки пропали часики.
+    """
+    
+    def __init__(self):
+        self._inflight: Set[Tuple[int, int]] = set()
+    
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        if event.message is None:
+            # Кнопки под inline-сообщениями: сообщение боту недоступно
+            return await handler(event, data)
+        
+        key = (event.from_user.id, event.message.message_id)
+        if key in self._inflight:
+            metrics.incr("duplicate_callbacks_dropped")
+            await event.answer()
+            return None
+        
+        self._inflight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._inflight.discard(key)
@@ -0,0 +1,137 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from config import IDEMPOTENCY_WINDOW, IDEMPOTENCY_PERSIST_INTERVAL
+from services.database import DatabaseBackend
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ключ в bot_state: update_id, до которого (включительно) обработка всех
+# принятых обновлений завершена
+HIGH_WATER_MARK_KEY = "last_processed_update_id"
+
+
+class RecentUpdateIds:
+    """
+    Последние capacity идентификаторов обновлений
+
+    Кольцевой буфер задает порядок вытеснения, множество дает проверку за
+    O(1); память ограничена capacity независимо от числа обновлений.
+    """
+
+    __slots__ = ("capacity", "_ring", "_position", "_ids")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._ring: List[Optional[int]] = [None] * capacity
+        self._position = 0
+        self._ids: Set[int] = set()
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, update_id: int):
+        evicted = self._ring[self._position]
+        if evicted is not None:
+            self._ids.discard(evicted)
+        self._ring[self._position] = update_id
+        self._position = (self._position + 1) % self.capacity
+        self._ids.add(update_id)
+
+    def discard(self, update_id: int):
+        # Слот в кольце остается: при вытеснении discard отсутствующего id ничего не делает
+        self._ids.discard(update_id)
+
+
+class IdempotencyMiddleware(BaseMiddleware):
+    """
+    Пропуск повторно доставленных обновлений (по update_id)
+
+    Обновление считается повтором, если его update_id есть среди последних
+    window принятых или не больше сохраненной отметки (но не дальше window
+    от нее: после недели простоя Telegram начинает нумерацию со случайного
+    числа). Обновления обрабатываются параллельно, поэтому отметка - не
+    наибольший завершенный update_id, а наибольший, ниже которого не
+    осталось принятых и еще не обработанных: обновление, которое
+    обрабатывалось в момент падения, после перезапуска не потеряется.
+    Отметка пишется в bot_state не чаще раза в persist_interval секунд и
+    при остановке (flush()).
+
+    Обновление отмечается принятым до запуска обработчика, поэтому повтор,
+    пришедший во время обработки (ретрай вебхука), тоже пропускается. Если
+    обработчик упал с исключением, отметка снимается и повтор будет обработан.
+    """
+
+    def __init__(
+        self,
+        database: DatabaseBackend,
+        window: int = IDEMPOTENCY_WINDOW,
+        persist_interval: float = IDEMPOTENCY_PERSIST_INTERVAL
+    ):
+        self.db = database
+        self.persist_interval = persist_interval
+        self.recent = RecentUpdateIds(window)
+        self.persisted_mark = int(database.get_state(HIGH_WATER_MARK_KEY) or 0)
+        # До этой отметки все обновления обработаны до перезапуска
+        self.restart_mark = self.persisted_mark
+        self.high_water_mark = self.persisted_mark
+        self.in_flight: Set[int] = set()
+        self._persisted_at = time.monotonic()
+
+    def is_duplicate(self, update_id: int) -> bool:
+        if self.restart_mark - self.recent.capacity < update_id <= self.restart_mark:
+            return True
+        return update_id in self.recent
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_id = event.update_id
+        if self.is_duplicate(update_id):
+            metrics.incr("duplicate_updates_skipped")
+            logger.info("Skipping redelivered update %s", update_id)
+            return None
+
+        self.recent.add(update_id)
+        self.in_flight.add(update_id)
+        try:
+            result = await handler(event, data)
+        except Exception:
+            self.recent.discard(update_id)
+            raise
+        finally:
+            self.in_flight.discard(update_id)
+
+        if update_id > self.high_water_mark:
+            self.high_water_mark = update_id
+        if time.monotonic() - self._persisted_at >= self.persist_interval:
+            self._persisted_at = time.monotonic()
+            # Отметка считается здесь: in_flight меняется только в цикле событий
+            await self.db.run(self.flush, self.completed_mark())
+        return result
+
+    def completed_mark(self) -> int:
+        """Наибольший update_id, до которого все принятые обновления обработаны"""
+        mark = self.high_water_mark
+        if self.in_flight:
+            mark = min(mark, min(self.in_flight) - 1)
+        return mark
+
+    def flush(self, mark: Optional[int] = None):
+        """Сохраняет отметку обработанных обновлений в bot_state"""
+        self._persisted_at = time.monotonic()
+        if mark is None:
+            mark = self.completed_mark()
+        if mark > self.persisted_mark and self.db.set_state(HIGH_WATER_MARK_KEY, str(mark)):
+            self.persisted_mark = mark
@@ -0,0 +1,32 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from utils.log import log_context
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """
+    Идентификаторы обновления и пользователя во всех записях лога
+    
+    Значение contextvar задается на время обработки обновления и
+    наследуется задачами, созданными из обработчика (например, расчетами
+    в очереди), поэтому их записи тоже несут update_id и user_id.
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        context = {"update_id": event.update_id}
+        if user is not None:
+            context["user_id"] = user.id
+        token = log_context.set(context)
+        try:
+            return await handler(event, data)
+        finally:
+            log_context.reset(token)
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from config import MAX_REQUESTS_PER_MINUTE, RATE_LIMIT_BURST, RATE_LIMIT_MAX_USERS
+from services.metrics import metrics
+
+
+class TokenBucket:
+    """Корзина токенов: до capacity запросов подряд, затем rate запросов в секунду"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated_at")
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = now
+
+    def consume(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты сообщений и нажатий кнопок для каждого пользователя
+    
+    У каждого пользователя своя корзина токенов: burst запросов подряд и
+    дальше per_minute запросов в минуту. Сверх лимита нажатие кнопки сразу
+    получает короткий callback.answer() без запуска обработчика, сообщение
+    просто пропускается. Корзины хранятся в LRU на max_users пользователей
+    (давно неактивный пользователь все равно получил бы полную корзину).
+    Администраторы не ограничиваются.
+    """
+    
+    def __init__(
+        self,
+        per_minute: int = MAX_REQUESTS_PER_MINUTE,
+        burst: int = RATE_LIMIT_BURST,
+        max_users: int = RATE_LIMIT_MAX_USERS,
+        exempt_ids: Iterable[int] = ()
+    ):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_users = max_users
+        self.exempt_ids = frozenset(exempt_ids)
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+    
+    def allow(self, user_id: int) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.burst, self.rate, now)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket.consume(now)
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or user.id in self.exempt_ids or self.allow(user.id):
+            return await handler(event, data)
+        
+        metrics.incr("throttled_updates")
+        # Лишние сообщения пропускаем молча: ответ на каждое только добавил бы нагрузки
+        if isinstance(event, CallbackQuery):
+            await event.answer("⏳ Слишком часто, подождите немного")
+        return None
@@ -1,8 +1,12 @@
+from bisect import bisect_right
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 
 from config import DEFAULT_DIVISOR_FL, DEFAULT_DIVISOR_UL, UNIQUE_OBJECT_DIVISOR, UNIQUE_OBJECT_MAX_PERCENTAGE
 
+# Rates are never looked up before this date (see _get_rate_for_date)
+DATA_LOWER_BOUND = date(2000, 1, 1)
+
 
 class PenaltyCalculator:
     """Service for calculating penalty fees based on user data and rates"""
@@ -12,14 +16,119 @@ class PenaltyCalculator:
         Initialize calculator with data from Google Sheets
         
         Args:
-            sheets_data: List of dictionaries with date, rate, and moratorium info
+            sheets_data: List of dictionaries with date, rate, and moratorium info,
+                or a BinaryRatesTable, which is read through its column views
+        """
+        self._build_intervals(self._table_rows(sheets_data))
+    
+    @staticmethod
+    def _table_rows(sheets_data) -> Iterable[Tuple[int, float, bool]]:
+        """(date ordinal, rate, moratorium) by ascending date; for a repeated date the last row wins"""
+        if hasattr(sheets_data, "ordinals"):
+            # BinaryRatesTable: the columns of the mapped file, already sorted
+            # by date, without decoding a dictionary per row
+            bitmap = sheets_data.moratorium_bitmap
+            return (
+                (ordinal, rate, bool(bitmap[i >> 3] & (1 << (i & 7))))
+                for i, (ordinal, rate) in enumerate(zip(sheets_data.ordinals, sheets_data.rates))
+            )
+        rows = {item["date"].toordinal(): (item["rate"], bool(item["moratorium"])) for item in sheets_data}
+        return ((ordinal, *rows[ordinal]) for ordinal in sorted(rows))
+    
+    def _build_intervals(self, rows: Iterable[Tuple[int, float, bool]]):
+        """
+        Compress the table into run-length intervals of equal (rate, moratorium)
+        
+        A row applies from its date until the next row, so consecutive rows
+        with the same values form one interval; the last interval is
+        open-ended. Rows before DATA_LOWER_BOUND apply to their own day only
+        and are followed by an interval without data (value None), as the
+        lookup never searches back past that bound.
+        
+        Prefix sums of effective (non-moratorium) days, moratorium days and
+        rate × effective days are kept at each interval start.
         """
-        self.data_by_date = {item["date"]: item for item in sheets_data}
+        lower_bound = DATA_LOWER_BOUND.toordinal()
+        self._interval_starts: List[int] = []
+        self._interval_values: List[Optional[Tuple[float, bool]]] = []
+        
+        def add(start: int, value: Optional[Tuple[float, bool]]):
+            if self._interval_values and self._interval_values[-1] == value:
+                return
+            if self._interval_starts and self._interval_starts[-1] == start:
+                self._interval_starts.pop()
+                self._interval_values.pop()
+                if self._interval_values and self._interval_values[-1] == value:
+                    return
+            self._interval_starts.append(start)
+            self._interval_values.append(value)
+        
+        for ordinal, rate, moratorium in rows:
+            add(ordinal, (rate, moratorium))
+            if ordinal < lower_bound:
+                add(ordinal + 1, None)
+        
+        self._prefix_effective_days = [0]
+        self._prefix_moratorium_days = [0]
+        self._prefix_rate_days = [0.0]
+        for i in range(len(self._interval_starts) - 1):
+            length = self._interval_starts[i + 1] - self._interval_starts[i]
+            value = self._interval_values[i]
+            effective = length if value is not None and not value[1] else 0
+            moratorium = length if value is not None and value[1] else 0
+            self._prefix_effective_days.append(self._prefix_effective_days[-1] + effective)
+            self._prefix_moratorium_days.append(self._prefix_moratorium_days[-1] + moratorium)
+            self._prefix_rate_days.append(self._prefix_rate_days[-1] + (value[0] * effective if effective else 0.0))
+    
+    def _interval_index(self, ordinal: int) -> int:
+        """Index of the interval containing the date ordinal, -1 before the first row"""
+        return bisect_right(self._interval_starts, ordinal) - 1
+    
+    def _cumulative(self, ordinal: int) -> Tuple[int, int, float]:
+        """Effective days, moratorium days and rate × effective days before the given date ordinal"""
+        i = self._interval_index(ordinal - 1)
+        if i < 0:
+            return 0, 0, 0.0
+        value = self._interval_values[i]
+        days = ordinal - self._interval_starts[i]
+        if value is None:
+            return self._prefix_effective_days[i], self._prefix_moratorium_days[i], self._prefix_rate_days[i]
+        if value[1]:
+            return self._prefix_effective_days[i], self._prefix_moratorium_days[i] + days, self._prefix_rate_days[i]
+        return self._prefix_effective_days[i] + days, self._prefix_moratorium_days[i], self._prefix_rate_days[i] + value[0] * days
+    
+    def _count_days(self, deadline_date: date, calculation_date: date) -> Tuple[int, int, float]:
+        """Effective days, moratorium days and rate × effective days of the delay after deadline_date"""
+        start = self._cumulative(deadline_date.toordinal() + 1)
+        end = self._cumulative(calculation_date.toordinal() + 1)
+        return end[0] - start[0], end[1] - start[1], end[2] - start[2]
+    
+    def _rate_intervals(self, first_day: date, last_day: date) -> List[Dict[str, Any]]:
+        """Intervals of constant rate and moratorium status between two dates (inclusive)"""
+        first, last = first_day.toordinal(), last_day.toordinal()
+        starts = self._interval_starts
+        i = max(self._interval_index(first), 0)
+        intervals = []
+        while i < len(starts) and starts[i] <= last:
+            value = self._interval_values[i]
+            if value is not None:
+                start = max(starts[i], first)
+                end = min(starts[i + 1] - 1, last) if i + 1 < len(starts) else last
+                intervals.append({
+                    "start": date.fromordinal(start),
+                    "end": date.fromordinal(end),
+                    "days": end - start + 1,
+                    "rate": value[0],
+                    "moratorium": value[1]
+                })
+            i += 1
+        return intervals
     
     def _get_rate_for_date(self, target_date: date) -> float:
         """
         Get the refinancing rate for the given date.
-        If no exact match found, find the closest previous date.
+        If no exact match found, find the closest previous date
+        (not earlier than DATA_LOWER_BOUND).
         
         Args:
             target_date: Date to get the rate for
@@ -27,20 +136,13 @@ class PenaltyCalculator:
         Returns:
             Refinancing rate as a decimal value (e.g., 0.075 for 7.5%)
         """
-        # Check if we have data for this exact date
-        if target_date in self.data_by_date:
-            return self.data_by_date[target_date]["rate"]
-        
-        # If not, find the closest previous date
-        current_date = target_date
-        while current_date not in self.data_by_date and current_date > date(2000, 1, 1):  # Using a safe lower bound
-            current_date -= timedelta(days=1)
-            
-        # If we still don't have data, return a default value or raise an error
-        if current_date not in self.data_by_date:
+        # A row starts (or continues) the interval containing its own date,
+        # so an exact match needs no separate lookup
+        i = self._interval_index(target_date.toordinal())
+        value = self._interval_values[i] if i >= 0 else None
+        if value is None:
             raise ValueError(f"Не удалось найти ставку рефинансирования для даты {target_date}")
-            
-        return self.data_by_date[current_date]["rate"]
+        return value[0]
     
     def calculate_penalty(
         self,
@@ -48,7 +150,8 @@ class PenaltyCalculator:
         deadline_date: date,
         calculation_date: date,
         is_individual: bool,
-        is_unique_object: bool
+        is_unique_object: bool,
+        rate_mode: str = "fixed"
     ) -> Dict[str, Any]:
         """
         Calculate penalty based on input parameters
@@ -59,84 +162,208 @@ class PenaltyCalculator:
             calculation_date: Date for calculation
             is_individual: Whether the participant is an individual (True) or legal entity (False)
             is_unique_object: Whether the object is unique
+            rate_mode: "fixed" - the rate on deadline_date for the whole delay,
+                "variable" - the rate in effect on each day of the delay
             
         Returns:
             Dictionary with calculation results
         """
+        if rate_mode == "variable":
+            return self._calculate_variable_rate_penalty(
+                contract_amount, deadline_date, calculation_date, is_individual, is_unique_object
+            )
+        if rate_mode != "fixed":
+            raise ValueError(f"Unknown rate mode: {rate_mode}")
+        
+        divisor = self._get_divisor(is_individual, is_unique_object)
+        terms = self.penalty_terms(deadline_date, calculation_date, divisor)
+        return self.penalty_from_terms(terms, contract_amount, is_individual, is_unique_object)
+    
+    def penalty_terms(self, deadline_date: date, calculation_date: date, divisor: float) -> Dict[str, Any]:
+        """
+        Amount-independent part of a fixed-rate calculation
+        
+        The penalty is linear in the contract amount (up to the unique
+        object cap), so these terms can be computed once per
+        (deadline_date, calculation_date, divisor) and reused for any amount
+        with penalty_from_terms().
+        
+        Returns:
+            Dictionary with rate_factor (1 / divisor × rate), refinancing_rate
+            and day counts, or with a message if there is nothing to calculate
+        """
         # Calculate date range for the delay
         if calculation_date <= deadline_date:
-            return {
-                "penalty_amount": 0,
-                "delay_days": 0,
-                "moratorium_days": 0,
-                "message": "Просрочка отсутствует. Дата расчета не наступила после крайней даты по ДДУ."
-            }
+            return {"message": "Просрочка отсутствует. Дата расчета не наступила после крайней даты по ДДУ."}
         
         # Получаем ставку рефинансирования на дату deadline_date
         try:
             refinancing_rate = self._get_rate_for_date(deadline_date)
         except ValueError as e:
+            return {"message": str(e)}
+        
+        # Count days of the delay from the interval prefix sums
+        effective_days, moratorium_days, _ = self._count_days(deadline_date, calculation_date)
+        return {
+            "rate_factor": (1 / divisor) * refinancing_rate,
+            "refinancing_rate": refinancing_rate,
+            "delay_days": (calculation_date - deadline_date).days,
+            "effective_days": effective_days,
+            "moratorium_days": moratorium_days
+        }
+    
+    @staticmethod
+    def penalty_from_terms(
+        terms: Dict[str, Any],
+        contract_amount: float,
+        is_individual: bool,
+        is_unique_object: bool
+    ) -> Dict[str, Any]:
+        """Result of calculate_penalty() from the terms returned by penalty_terms()"""
+        if "message" in terms:
             return {
                 "penalty_amount": 0,
                 "delay_days": 0,
                 "moratorium_days": 0,
-                "message": str(e)
+                "message": terms["message"]
             }
-            
-        # Generate all dates in the delay period
-        delay_period = []
-        current_date = deadline_date + timedelta(days=1)  # Start from the day after deadline
         
-        while current_date <= calculation_date:
-            delay_period.append(current_date)
-            current_date += timedelta(days=1)
+        # Calculate penalty using the fixed rate from deadline_date
+        penalty_sum = terms["rate_factor"] * contract_amount * terms["effective_days"]
         
-        # Count days and calculate penalty
-        total_days = len(delay_period)
-        moratorium_days = 0
-        effective_days = 0
+        # For unique objects, check if penalty exceeds the maximum allowed
+        if is_unique_object:
+            max_penalty = contract_amount * UNIQUE_OBJECT_MAX_PERCENTAGE
+            if penalty_sum > max_penalty:
+                penalty_sum = max_penalty
         
-        # Check for moratorium days
-        for day in delay_period:
-            # Get moratorium status for this day
-            current_date = day
+        return {
+            "penalty_amount": round(penalty_sum, 2),
+            "delay_days": terms["delay_days"],
+            "moratorium_days": terms["moratorium_days"],
+            "effective_days": terms["effective_days"],
+            "is_individual": is_individual,
+            "is_unique_object": is_unique_object,
+            "refinancing_rate": terms["refinancing_rate"] * 100  # Convert to percentage for display
+        }
+    
+    def penalty_curve(
+        self,
+        contract_amount: float,
+        deadline_date: date,
+        last_date: date,
+        is_individual: bool,
+        is_unique_object: bool,
+        rate_mode: str = "fixed"
+    ) -> List[Tuple[date, float]]:
+        """
+        Penalty for every calculation date from the day after deadline_date to last_date
+        
+        The points are produced in one pass: the cumulative effective days
+        (and rate × days for the variable mode) are carried from one date
+        to the next, so the whole curve costs O(number of days).
+        
+        Args:
+            contract_amount: Contract amount in rubles
+            deadline_date: Deadline date from the contract
+            last_date: Last calculation date of the curve
+            is_individual: Whether the participant is an individual (True) or legal entity (False)
+            is_unique_object: Whether the object is unique
+            rate_mode: "fixed" or "variable", as in calculate_penalty()
             
-            # Try to get data for this exact date
-            if current_date in self.data_by_date:
-                day_data = self.data_by_date[current_date]
-            else:
-                # Find the closest previous date with data
-                temp_date = current_date
-                while temp_date not in self.data_by_date and temp_date > date(2000, 1, 1):
-                    temp_date -= timedelta(days=1)
-                
-                # If we still don't have data, skip this day
-                if temp_date not in self.data_by_date:
-                    continue
-                    
-                day_data = self.data_by_date[temp_date]
+        Returns:
+            List of (calculation date, penalty amount)
             
-            # Skip days with moratorium
-            if day_data["moratorium"]:
-                moratorium_days += 1
-            else:
-                effective_days += 1
+        Raises:
+            ValueError: If there is no rate for deadline_date
+        """
+        refinancing_rate = self._get_rate_for_date(deadline_date)
+        divisor = self._get_divisor(is_individual, is_unique_object)
+        factor = contract_amount / divisor
+        max_penalty = contract_amount * UNIQUE_OBJECT_MAX_PERCENTAGE if is_unique_object else None
         
-        # Determine divisor based on client type and object uniqueness
+        starts = self._interval_starts
+        first = deadline_date.toordinal() + 1
+        i = self._interval_index(first)
+        effective_days = 0
+        rate_days = 0.0
+        curve = []
+        for ordinal in range(first, last_date.toordinal() + 1):
+            while i + 1 < len(starts) and starts[i + 1] <= ordinal:
+                i += 1
+            value = self._interval_values[i] if i >= 0 else None
+            if value is not None and not value[1]:
+                effective_days += 1
+                rate_days += value[0]
+            
+            if rate_mode == "variable":
+                penalty_sum = factor * rate_days
+            else:
+                # Same expression as calculate_penalty, so the results match exactly
+                penalty_sum = (1 / divisor) * refinancing_rate * contract_amount * effective_days
+            if max_penalty is not None and penalty_sum > max_penalty:
+                penalty_sum = max_penalty
+            curve.append((date.fromordinal(ordinal), round(penalty_sum, 2)))
+        return curve
+    
+    @staticmethod
+    def _get_divisor(is_individual: bool, is_unique_object: bool) -> float:
+        """Determine divisor based on client type and object uniqueness"""
         if is_unique_object:
-            divisor = UNIQUE_OBJECT_DIVISOR
-        else:
-            divisor = DEFAULT_DIVISOR_FL if is_individual else DEFAULT_DIVISOR_UL
+            return UNIQUE_OBJECT_DIVISOR
+        return DEFAULT_DIVISOR_FL if is_individual else DEFAULT_DIVISOR_UL
+    
+    def _calculate_variable_rate_penalty(
+        self,
+        contract_amount: float,
+        deadline_date: date,
+        calculation_date: date,
+        is_individual: bool,
+        is_unique_object: bool
+    ) -> Dict[str, Any]:
+        """
+        Penalty with the rate in effect on each day of the delay
         
-        # Calculate penalty using the fixed rate from deadline_date
-        penalty_sum = (1 / divisor) * refinancing_rate * contract_amount * effective_days
+        The sum of rate × effective days is taken from the interval prefix
+        sums, so the cost depends on the number of rate changes in the
+        delay rather than on its length. The result also lists the
+        intervals of the delay with their rate, days and penalty.
+        """
+        if calculation_date <= deadline_date:
+            return {
+                "penalty_amount": 0,
+                "delay_days": 0,
+                "moratorium_days": 0,
+                "message": "Просрочка отсутствует. Дата расчета не наступила после крайней даты по ДДУ."
+            }
+        
+        try:
+            refinancing_rate = self._get_rate_for_date(deadline_date)
+        except ValueError as e:
+            return {
+                "penalty_amount": 0,
+                "delay_days": 0,
+                "moratorium_days": 0,
+                "message": str(e)
+            }
+        
+        total_days = (calculation_date - deadline_date).days
+        effective_days, moratorium_days, rate_days = self._count_days(deadline_date, calculation_date)
+        
+        factor = contract_amount / self._get_divisor(is_individual, is_unique_object)
+        penalty_sum = factor * rate_days
         
-        # For unique objects, check if penalty exceeds the maximum allowed
         if is_unique_object:
             max_penalty = contract_amount * UNIQUE_OBJECT_MAX_PERCENTAGE
             if penalty_sum > max_penalty:
                 penalty_sum = max_penalty
         
+        intervals = self._rate_intervals(deadline_date + timedelta(days=1), calculation_date)
+        for interval in intervals:
+            effective = 0 if interval["moratorium"] else interval["days"]
+            interval["penalty_amount"] = round(factor * interval["rate"] * effective, 2)
+            interval["rate"] *= 100  # Convert to percentage for display
+        
         return {
             "penalty_amount": round(penalty_sum, 2),
             "delay_days": total_days,
@@ -144,5 +371,7 @@ class PenaltyCalculator:
             "effective_days": effective_days,
             "is_individual": is_individual,
             "is_unique_object": is_unique_object,
-            "refinancing_rate": refinancing_rate * 100  # Convert to percentage for display
-        } 
\ No newline at end of file
+            "refinancing_rate": refinancing_rate * 100,
+            "rate_mode": "variable",
+            "intervals": intervals
+        }
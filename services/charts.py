@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import CHART_CACHE_DIR, CHART_CACHE_MAX_FILES, CHART_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+def charts_available() -> bool:
+    """Whether the optional matplotlib dependency is installed"""
+    try:
+        import matplotlib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def render_penalty_chart(points: List[Tuple[date, float]], marker_date: Optional[date] = None, title: str = "") -> bytes:
+    """
+    Render a penalty curve as PNG
+
+    Runs in a worker process: matplotlib is imported there, so the bot
+    process does not load it at all.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+    from matplotlib.dates import DateFormatter
+
+    dates = [point[0] for point in points]
+    amounts = [point[1] for point in points]
+
+    fig, ax = plt.subplots(figsize=(8, 4.5), dpi=100)
+    try:
+        ax.plot(dates, amounts, color="#1f77b4", linewidth=2)
+        ax.fill_between(dates, amounts, color="#1f77b4", alpha=0.1)
+        if marker_date is not None and dates and dates[0] <= marker_date <= dates[-1]:
+            ax.axvline(marker_date, color="#d62728", linestyle="--", linewidth=1)
+        ax.set_title(title)
+        ax.set_ylabel("руб.")
+        ax.xaxis.set_major_formatter(DateFormatter("%m.%Y"))
+        ax.yaxis.set_major_formatter(lambda value, _: f"{value:,.0f}".replace(",", " "))
+        ax.grid(True, alpha=0.3)
+        fig.autofmt_xdate()
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class ChartRenderer:
+    """
+    Penalty charts rendered in a process pool and cached on disk
+
+    A chart is identified by its calculation parameters and the hash of
+    the rates snapshot it was computed with, so a repeated request is
+    served from the cached file (or the Telegram file_id of an earlier
+    upload) and concurrent requests for the same chart share one render.
+    """
+
+    def __init__(self, cache_dir: str = CHART_CACHE_DIR, workers: int = CHART_WORKERS, max_files: int = CHART_CACHE_MAX_FILES):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.max_files = max_files
+        self.file_ids: Dict[str, str] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pruning: Optional[asyncio.Future] = None
+
+    @staticmethod
+    def cache_key(params: str, snapshot_hash: str) -> str:
+        return hashlib.sha256(f"{params}|{snapshot_hash}".encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    async def render(
+        self,
+        key: str,
+        points: Callable[[], List[Tuple[date, float]]],
+        marker_date: Optional[date] = None,
+        title: str = ""
+    ) -> str:
+        """
+        Path to the PNG for this key, rendering it if it is not cached yet
+
+        ``points`` builds the curve and is called only on a cache miss, once
+        per key even for concurrent requests.
+        """
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return path
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._render_to_file(path, points, marker_date, title))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(inflight)
+
+    async def _render_to_file(self, path: str, points, marker_date, title) -> str:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(self._executor, render_penalty_chart, points(), marker_date, title)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+
+        # Listing and stat-ing the cache directory happens in a thread, one pass at a time
+        if self._pruning is None or self._pruning.done():
+            self._pruning = asyncio.ensure_future(self._prune_in_thread())
+        return path
+
+    async def _prune_in_thread(self):
+        loop = asyncio.get_running_loop()
+        try:
+            removed = await loop.run_in_executor(None, self._prune)
+        except OSError as e:
+            logger.warning("Chart cache cleanup failed: %s", e)
+            return
+        for key in removed:
+            self.file_ids.pop(key, None)
+
+    def _prune(self) -> List[str]:
+        """Remove the oldest cached charts above max_files; returns their keys"""
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".png")]
+        if len(files) <= self.max_files:
+            return []
+        files.sort(key=os.path.getmtime)
+        removed = []
+        for path in files[:len(files) - self.max_files]:
+            os.remove(path)
+            removed.append(os.path.basename(path)[:-len(".png")])
+        return removed
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Chart renderer used by the handlers
+chart_renderer = ChartRenderer()
@@ -0,0 +1,58 @@
+import time
+from typing import Callable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for calls to an unreliable dependency
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are refused. Once ``reset_timeout`` seconds have passed, one probe
+    call is let through (half-open): success closes the circuit, failure
+    opens it again. ``on_state_change(old_state, new_state)`` is called once
+    per transition.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        on_state_change: Optional[Callable[[str, str], None]] = None
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        old_state, self.state = self.state, state
+        if self.on_state_change:
+            self.on_state_change(old_state, state)
+
+    def allow_request(self) -> bool:
+        """Whether a call may be made now; moves an expired open circuit to half-open"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+            return True
+        # Open, or half-open with the probe already in flight
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from config import CALC_WORKERS, CALC_QUEUE_SIZE
+from services.metrics import metrics
+
+
+class QueueFullError(Exception):
+    """The job queue is saturated and the job was not accepted"""
+
+
+class JobQueue:
+    """
+    Bounded queue of asynchronous jobs run by a fixed number of workers
+
+    At most ``workers`` jobs run at a time and at most ``maxsize`` wait
+    for a worker; submitting beyond that raises QueueFullError right away
+    instead of letting the caller wait indefinitely. Workers are started
+    on the first submit, inside the running event loop.
+    """
+
+    def __init__(self, workers: int = CALC_WORKERS, maxsize: int = CALC_QUEUE_SIZE, name: str = "calc"):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.name = name
+        self.active = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, job: Callable[[], Awaitable]) -> int:
+        """
+        Queue a job
+
+        Args:
+            job: Callable returning the coroutine to run
+
+        Returns:
+            Number of jobs that will start before this one (0 - starts immediately)
+
+        Raises:
+            QueueFullError: If maxsize jobs are already waiting
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        try:
+            self._queue.put_nowait((job, time.monotonic()))
+        except asyncio.QueueFull:
+            metrics.incr(f"{self.name}_jobs_rejected")
+            raise QueueFullError(f"{self.name} queue is full ({self.maxsize} jobs waiting)")
+
+        metrics.incr(f"{self.name}_jobs_submitted")
+        metrics.set_gauge(f"{self.name}_queue_depth", self._queue.qsize())
+        # Свободные воркеры разберут первые задачи очереди сразу
+        return max(0, self._queue.qsize() - (self.workers - self.active))
+
+    async def _worker(self):
+        while True:
+            job, submitted_at = await self._queue.get()
+            self.active += 1
+            metrics.set_gauge(f"{self.name}_queue_depth", self._queue.qsize())
+            metrics.set_gauge(f"{self.name}_queue_wait_ms", round((time.monotonic() - submitted_at) * 1000))
+            try:
+                await job()
+                metrics.incr(f"{self.name}_jobs_done")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                metrics.incr(f"{self.name}_jobs_failed")
+                logging.exception("Job in %s queue failed", self.name)
+            finally:
+                self.active -= 1
+                self._queue.task_done()
+
+    def shutdown(self):
+        """Cancel the workers; jobs still waiting are dropped"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+
+
+# Queue of penalty calculations started from the handlers
+calculation_queue = JobQueue()
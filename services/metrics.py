@@ -0,0 +1,42 @@
+import threading
+from typing import Dict, Union
+
+
+class Metrics:
+    """
+    In-process counters and gauges
+
+    Values are shown to admins in /stats; updates may come from worker
+    threads, so access is guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, Union[int, float]] = {}
+
+    def incr(self, name: str, value: int = 1):
+        """Increase a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: Union[int, float]):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name: str, default: Union[int, float] = 0) -> Union[int, float]:
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            return self._gauges.get(name, default)
+
+    def snapshot(self) -> Dict[str, Union[int, float]]:
+        """Copy of all counters and gauges, sorted by name"""
+        with self._lock:
+            values = {**self._counters, **self._gauges}
+        return dict(sorted(values.items()))
+
+
+# Global metrics registry
+metrics = Metrics()
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import PENALTY_CACHE_SIZE
+from services.calculator import PenaltyCalculator
+from services.metrics import metrics
+
+
+class PenaltyCache:
+    """
+    Bounded LRU cache of fixed-rate calculation terms
+
+    Entries are keyed by (rates snapshot hash, deadline date, calculation
+    date, divisor) and hold the amount-independent terms from
+    PenaltyCalculator.penalty_terms(), so a hit only multiplies by the
+    contract amount. The calculator for the current snapshot is kept as
+    well; when the snapshot changes, the calculator is rebuilt and all
+    entries are dropped.
+    """
+
+    def __init__(self, maxsize: int = PENALTY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.snapshot_hash: Optional[str] = None
+        self.calculator: Optional[PenaltyCalculator] = None
+        self._entries: "OrderedDict[Tuple[str, date, date, float], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def calculator_for(self, rates_table: Sequence, snapshot_hash: str) -> PenaltyCalculator:
+        """Calculator for the given snapshot, invalidating the cache if the snapshot changed"""
+        with self._lock:
+            if snapshot_hash != self.snapshot_hash:
+                self.calculator = PenaltyCalculator(rates_table)
+                self.snapshot_hash = snapshot_hash
+                if self._entries:
+                    metrics.incr("penalty_cache_invalidations")
+                self._entries.clear()
+            return self.calculator
+
+    def calculate(
+        self,
+        rates_table: Sequence,
+        snapshot_hash: str,
+        contract_amount: float,
+        deadline_date: date,
+        calculation_date: date,
+        is_individual: bool,
+        is_unique_object: bool
+    ) -> Dict[str, Any]:
+        """Same result as PenaltyCalculator(rates_table).calculate_penalty(...)"""
+        calculator = self.calculator_for(rates_table, snapshot_hash)
+        divisor = calculator._get_divisor(is_individual, is_unique_object)
+        terms = self._terms(calculator, snapshot_hash, deadline_date, calculation_date, divisor)
+        self._update_hit_rate()
+        return calculator.penalty_from_terms(terms, contract_amount, is_individual, is_unique_object)
+
+    def calculate_many(self, rates_table: Sequence, snapshot_hash: str, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Results for many calculations, each as calculate(**item) would return
+
+        Items are dictionaries with the keyword arguments of calculate().
+        Items that share the dates and divisor look up (or compute) their
+        terms once for the whole batch.
+        """
+        calculator = self.calculator_for(rates_table, snapshot_hash)
+        get_divisor = calculator._get_divisor
+        from_terms = calculator.penalty_from_terms
+        batch_terms: Dict[Tuple[date, date, float], Dict[str, Any]] = {}
+        results = []
+        for item in items:
+            is_individual = item["is_individual"]
+            is_unique_object = item["is_unique_object"]
+            key = (item["deadline_date"], item["calculation_date"], get_divisor(is_individual, is_unique_object))
+            terms = batch_terms.get(key)
+            if terms is None:
+                terms = batch_terms[key] = self._terms(calculator, snapshot_hash, *key)
+            results.append(from_terms(terms, item["contract_amount"], is_individual, is_unique_object))
+        self._update_hit_rate()
+        return results
+
+    def _terms(
+        self,
+        calculator: PenaltyCalculator,
+        snapshot_hash: str,
+        deadline_date: date,
+        calculation_date: date,
+        divisor: float
+    ) -> Dict[str, Any]:
+        key = (snapshot_hash, deadline_date, calculation_date, divisor)
+        with self._lock:
+            terms = self._entries.get(key)
+            if terms is not None:
+                self._entries.move_to_end(key)
+
+        if terms is None:
+            metrics.incr("penalty_cache_misses")
+            terms = calculator.penalty_terms(deadline_date, calculation_date, divisor)
+            with self._lock:
+                if snapshot_hash == self.snapshot_hash:
+                    self._entries[key] = terms
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                metrics.set_gauge("penalty_cache_size", len(self._entries))
+        else:
+            metrics.incr("penalty_cache_hits")
+        return terms
+
+    @staticmethod
+    def _update_hit_rate():
+        hits = metrics.get("penalty_cache_hits")
+        metrics.set_gauge("penalty_cache_hit_rate", round(hits / (hits + metrics.get("penalty_cache_misses")), 3))
+
+
+# Result cache shared by the handlers
+penalty_cache = PenaltyCache()
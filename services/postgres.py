@@ -0,0 +1,402 @@
+import asyncio
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import asyncpg
+
+from services.database import DatabaseBackend, date_ordinal
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresDatabase(DatabaseBackend):
+    """
+    Хранилище на PostgreSQL (asyncpg) для нескольких экземпляров бота.
+
+    asyncpg асинхронный, а интерфейс хранилища синхронный, поэтому пул
+    соединений живет в отдельном потоке со своим event loop, а методы
+    отправляют в него корутины и ждут результат. asyncpg подготавливает
+    каждый запрос один раз на соединение и кеширует prepared statement,
+    так что повторные вызовы не разбирают SQL заново.
+
+    run() выполняет методы в нескольких потоках (по числу соединений
+    пула), так что запросы из обработчиков идут параллельно.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        self.executor_workers = max_size
+        super().__init__()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="postgres-db", daemon=True)
+        self._thread.start()
+
+        try:
+            self.pool = self._run(self._create_pool(dsn, min_size, max_size))
+        except Exception:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            raise
+        self.create_tables()
+
+    @staticmethod
+    async def _create_pool(dsn: str, min_size: int, max_size: int) -> asyncpg.Pool:
+        return await asyncpg.create_pool(dsn, min_size=min_size, max_size=max_size)
+
+    def _run(self, coro):
+        """Выполняет корутину в потоке пула и возвращает результат"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _execute(self, query: str, *args) -> str:
+        return self._run(self.pool.execute(query, *args))
+
+    def _fetchval(self, query: str, *args):
+        return self._run(self.pool.fetchval(query, *args))
+
+    def _fetch(self, query: str, *args) -> List[asyncpg.Record]:
+        return self._run(self.pool.fetch(query, *args))
+
+    def create_tables(self):
+        """Создает необходимые таблицы в базе данных"""
+        self._execute('''
+        CREATE TABLE IF NOT EXISTS subscribed_users (
+            user_id BIGINT PRIMARY KEY,
+            is_subscribed INTEGER DEFAULT 1,  -- 1 = подписан, 0 = не подписан
+            first_name TEXT,
+            last_name TEXT,
+            username TEXT,
+            subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        self._execute('''
+        CREATE TABLE IF NOT EXISTS calculations (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT REFERENCES subscribed_users (user_id),
+            contract_amount DOUBLE PRECISION,
+            deadline_date TEXT,
+            calculation_date TEXT,
+            is_individual INTEGER,  -- 1 = физлицо, 0 = юрлицо
+            is_unique INTEGER,      -- 1 = уникальный, 0 = не уникальный
+            penalty_amount DOUBLE PRECISION,
+            delay_days INTEGER,
+            moratorium_days INTEGER,
+            calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        self._execute('''
+        CREATE TABLE IF NOT EXISTS rates_snapshots (
+            id BIGSERIAL PRIMARY KEY,
+            hash TEXT UNIQUE NOT NULL,
+            data BYTEA NOT NULL,
+            rows INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        self._execute(
+            "ALTER TABLE calculations ADD COLUMN IF NOT EXISTS snapshot_id BIGINT REFERENCES rates_snapshots (id)"
+        )
+
+        # Даты расчета в виде date.toordinal() для выборки по диапазону дат
+        for column, source in (("deadline_ordinal", "deadline_date"), ("calculation_ordinal", "calculation_date")):
+            self._execute(f"ALTER TABLE calculations ADD COLUMN IF NOT EXISTS {column} INTEGER")
+            self._execute(f'''
+            UPDATE calculations SET {column} = (to_date({source}, 'DD.MM.YYYY') - DATE '0001-01-01') + 1
+            WHERE {column} IS NULL AND {source} ~ '^\\d{{2}}\\.\\d{{2}}\\.\\d{{4}}$'
+            ''')
+        # Диапазон по дате расчета и постраничный обход по ключу индекса (см. SQLiteDatabase)
+        self._execute("DROP INDEX IF EXISTS idx_calculations_window")
+        self._execute(
+            "CREATE INDEX IF NOT EXISTS idx_calculations_by_calculation_date "
+            "ON calculations (calculation_ordinal, deadline_ordinal, id)"
+        )
+
+        self._execute('''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''')
+
+    def _upsert_user(self, user_id: int, first_name: Optional[str], last_name: Optional[str], username: Optional[str], is_subscribed: bool):
+        self._execute(
+            """
+            INSERT INTO subscribed_users (user_id, first_name, last_name, username, is_subscribed)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (user_id) DO UPDATE SET
+                first_name = COALESCE(EXCLUDED.first_name, subscribed_users.first_name),
+                last_name = COALESCE(EXCLUDED.last_name, subscribed_users.last_name),
+                username = COALESCE(EXCLUDED.username, subscribed_users.username),
+                is_subscribed = EXCLUDED.is_subscribed
+            """,
+            user_id, first_name, last_name, username, 1 if is_subscribed else 0
+        )
+
+    def _get_user_profile(self, user_id: int) -> Optional[Tuple]:
+        row = self._run(self.pool.fetchrow(
+            "SELECT first_name, last_name, username, is_subscribed FROM subscribed_users WHERE user_id = $1",
+            user_id
+        ))
+        if row is None:
+            return None
+        return (row["first_name"], row["last_name"], row["username"], bool(row["is_subscribed"]))
+
+    def _upsert_users_chunk(self, users: List[Tuple[int, Optional[str], Optional[str], Optional[str]]]) -> int:
+        return self._run(self._upsert_users_chunk_async(users))
+
+    async def _upsert_users_chunk_async(self, users: List[Tuple[int, Optional[str], Optional[str], Optional[str]]]) -> int:
+        user_ids = [user[0] for user in users]
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                existing = await conn.fetchval(
+                    "SELECT COUNT(*) FROM subscribed_users WHERE user_id = ANY($1::bigint[])",
+                    user_ids
+                )
+                await conn.executemany(
+                    """
+                    INSERT INTO subscribed_users (user_id, first_name, last_name, username, is_subscribed)
+                    VALUES ($1, $2, $3, $4, 1)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        first_name = COALESCE(EXCLUDED.first_name, subscribed_users.first_name),
+                        last_name = COALESCE(EXCLUDED.last_name, subscribed_users.last_name),
+                        username = COALESCE(EXCLUDED.username, subscribed_users.username),
+                        is_subscribed = 1
+                    """,
+                    users
+                )
+        return len(user_ids) - existing
+
+    def _mark_unsubscribed(self, user_id: int):
+        self._execute("UPDATE subscribed_users SET is_subscribed = 0 WHERE user_id = $1", user_id)
+
+    def is_user_subscribed(self, user_id: int) -> bool:
+        """
+        Проверяет, подписан ли пользователь
+
+        Args:
+            user_id: ID пользователя Telegram
+
+        Returns:
+            True, если пользователь подписан, иначе False
+        """
+        try:
+            result = self._fetchval("SELECT is_subscribed FROM subscribed_users WHERE user_id = $1", user_id)
+            return bool(result)
+        except Exception as e:
+            logger.error("Ошибка при проверке подписки пользователя %s: %s", user_id, e)
+            return False
+
+    def save_calculation(self, user_id: int, data: Dict[str, Any]) -> bool:
+        """
+        Сохраняет результаты расчета в базу данных
+
+        Args:
+            user_id: ID пользователя Telegram
+            data: Данные расчета
+
+        Returns:
+            True, если расчет успешно сохранен, иначе False
+        """
+        try:
+            self._execute(
+                """
+                INSERT INTO calculations (
+                    user_id, contract_amount, deadline_date, calculation_date,
+                    is_individual, is_unique, penalty_amount, delay_days, moratorium_days,
+                    snapshot_id, deadline_ordinal, calculation_ordinal
+                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+                """,
+                user_id,
+                float(data.get("contract_amount", 0)),
+                data.get("deadline_date_str", ""),
+                data.get("calculation_date_str", ""),
+                1 if data.get("is_individual", True) else 0,
+                1 if data.get("is_unique", False) else 0,
+                float(data.get("penalty_amount", 0)),
+                data.get("delay_days", 0),
+                data.get("moratorium_days", 0),
+                data.get("snapshot_id"),
+                date_ordinal(data, "deadline_date"),
+                date_ordinal(data, "calculation_date")
+            )
+            return True
+        except Exception as e:
+            logger.error("Ошибка при сохранении расчета для пользователя %s: %s", user_id, e)
+            return False
+
+    def get_total_users_count(self) -> int:
+        """Получает общее количество пользователей в базе данных"""
+        try:
+            return self._fetchval("SELECT COUNT(*) FROM subscribed_users") or 0
+        except Exception as e:
+            logger.error("Ошибка при получении количества пользователей: %s", e)
+            return 0
+
+    def get_subscribed_users_count(self) -> int:
+        """Получает количество подписанных пользователей"""
+        try:
+            return self._fetchval("SELECT COUNT(*) FROM subscribed_users WHERE is_subscribed = 1") or 0
+        except Exception as e:
+            logger.error("Ошибка при получении количества подписанных пользователей: %s", e)
+            return 0
+
+    def get_total_calculations_count(self) -> int:
+        """Получает общее количество расчетов в базе данных"""
+        try:
+            return self._fetchval("SELECT COUNT(*) FROM calculations") or 0
+        except Exception as e:
+            logger.error("Ошибка при получении количества расчетов: %s", e)
+            return 0
+
+    def get_calculations_by_user(self, user_id: int) -> List[Dict[str, Any]]:
+        """
+        Получает историю расчетов для конкретного пользователя
+
+        Args:
+            user_id: ID пользователя Telegram
+
+        Returns:
+            Список расчетов пользователя
+        """
+        try:
+            rows = self._fetch(
+                "SELECT * FROM calculations WHERE user_id = $1 ORDER BY calculated_at DESC",
+                user_id
+            )
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error("Ошибка при получении расчетов пользователя %s: %s", user_id, e)
+            return []
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """
+        Получает общую статистику использования бота
+
+        Returns:
+            Словарь с различными статистическими данными
+        """
+        stats = {
+            "total_users": self.get_total_users_count(),
+            "subscribed_users": self.get_subscribed_users_count(),
+            "total_calculations": self.get_total_calculations_count(),
+        }
+
+        try:
+            # Все агрегаты по расчетам одним запросом
+            rows = self._fetch(
+                """
+                SELECT
+                    AVG(penalty_amount) AS avg_penalty,
+                    AVG(contract_amount) AS avg_contract_amount,
+                    COUNT(*) FILTER (WHERE is_individual = 1) AS individual_calculations,
+                    COUNT(*) FILTER (WHERE is_individual = 0) AS legal_calculations,
+                    COUNT(*) FILTER (WHERE is_unique = 1) AS unique_objects_calculations
+                FROM calculations
+                """
+            )
+            for key, value in dict(rows[0]).items():
+                stats[key] = value or 0
+
+            return stats
+        except Exception as e:
+            logger.error("Ошибка при получении статистики: %s", e)
+            return stats
+
+    def get_calculation(self, calculation_id: int) -> Optional[Dict[str, Any]]:
+        """Получает один расчет по ID"""
+        try:
+            row = self._run(self.pool.fetchrow("SELECT * FROM calculations WHERE id = $1", calculation_id))
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error("Ошибка при получении расчета %s: %s", calculation_id, e)
+            return None
+
+    def get_calculations_in_window(self, start_ordinal: int, end_ordinal: int, after: Tuple[int, int, int], limit: int) -> List[Dict[str, Any]]:
+        """Возвращает очередную пачку расчетов, затронутых изменением ставок"""
+        try:
+            rows = self._fetch(
+                """
+                SELECT id, contract_amount, deadline_ordinal, calculation_ordinal,
+                       is_individual, is_unique, penalty_amount
+                FROM calculations
+                WHERE calculation_ordinal >= $1 AND deadline_ordinal <= $2
+                  AND (calculation_ordinal, deadline_ordinal, id) > ($3, $4, $5)
+                ORDER BY calculation_ordinal, deadline_ordinal, id
+                LIMIT $6
+                """,
+                start_ordinal, end_ordinal, *after, limit
+            )
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error("Ошибка при выборке расчетов по диапазону дат: %s", e)
+            return []
+
+    def save_rates_snapshot(self, snapshot_hash: str, data: bytes, rows: int) -> Optional[int]:
+        """Сохраняет снимок таблицы ставок и возвращает его ID"""
+        try:
+            self._execute(
+                "INSERT INTO rates_snapshots (hash, data, rows) VALUES ($1, $2, $3) ON CONFLICT (hash) DO NOTHING",
+                snapshot_hash, data, rows
+            )
+            return self._fetchval("SELECT id FROM rates_snapshots WHERE hash = $1", snapshot_hash)
+        except Exception as e:
+            logger.error("Ошибка при сохранении снимка ставок: %s", e)
+            return None
+
+    def get_rates_snapshot(self, snapshot_id: int) -> Optional[bytes]:
+        """Возвращает сжатые данные снимка таблицы ставок"""
+        try:
+            return self._fetchval("SELECT data FROM rates_snapshots WHERE id = $1", snapshot_id)
+        except Exception as e:
+            logger.error("Ошибка при получении снимка ставок %s: %s", snapshot_id, e)
+            return None
+
+    def get_subscribed_user_ids(self, after_user_id: int, limit: int) -> List[int]:
+        """Возвращает очередную пачку ID подписанных пользователей"""
+        try:
+            rows = self._fetch(
+                """
+                SELECT user_id FROM subscribed_users
+                WHERE is_subscribed = 1 AND user_id > $1
+                ORDER BY user_id
+                LIMIT $2
+                """,
+                after_user_id, limit
+            )
+            return [row["user_id"] for row in rows]
+        except Exception as e:
+            logger.error("Ошибка при получении списка подписанных пользователей: %s", e)
+            return []
+
+    def get_state(self, key: str) -> Optional[str]:
+        """Читает служебное значение"""
+        try:
+            return self._fetchval("SELECT value FROM bot_state WHERE key = $1", key)
+        except Exception as e:
+            logger.error("Ошибка при чтении служебного значения %s: %s", key, e)
+            return None
+
+    def set_state(self, key: str, value: str) -> bool:
+        """Сохраняет служебное значение"""
+        try:
+            self._execute(
+                """
+                INSERT INTO bot_state (key, value) VALUES ($1, $2)
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+                """,
+                key, value
+            )
+            return True
+        except Exception as e:
+            logger.error("Ошибка при сохранении служебного значения %s: %s", key, e)
+            return False
+
+    def close(self):
+        """Закрывает пул соединений и останавливает поток"""
+        self._shutdown_executor()
+        if self.pool:
+            self._run(self.pool.close())
+            self.pool = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
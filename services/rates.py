@@ -0,0 +1,344 @@
+import asyncio
+import csv
+import mmap
+import os
+import struct
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from datetime import date
+from typing import List, Dict, Any, Optional, Iterable, Union
+
+from config import (
+    RATES_SOURCE, RATES_FILE, RATES_FETCH_TIMEOUT, RATES_BREAKER_FAILURE_THRESHOLD, RATES_BREAKER_RESET_TIMEOUT
+)
+from services.circuit import CircuitBreaker
+from services.metrics import metrics
+from services.sheets import IncrementalRatesSync, MultiRangeRatesSync, parse_rate_row, rates_sync
+from services.snapshots import RatesSnapshot, make_snapshot
+
+
+class RatesSource(ABC):
+    """Source of the rates table consumed by PenaltyCalculator"""
+
+    @abstractmethod
+    def load(self, deadline: Optional[float] = None) -> Sequence:
+        """
+        Load the current rates table
+
+        Args:
+            deadline: time.monotonic() value by which a source that waits on
+                the network must give up; local files ignore it
+
+        Returns:
+            Sequence of dictionaries with date, rate (as decimal) and moratorium
+        """
+
+
+class SheetsRatesSource(RatesSource):
+    """Rates from Google Sheets, kept in memory by the configured sheet sync"""
+
+    def __init__(self, sync: Union[IncrementalRatesSync, MultiRangeRatesSync] = rates_sync):
+        self.sync = sync
+
+    def load(self, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        return self.sync.refresh(deadline)
+
+
+class CsvRatesSource(RatesSource):
+    """
+    Rates from a CSV file in the sheet layout (see data/example_data.csv)
+
+    The file is streamed row by row and parsed again only when its
+    modification time changes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._data: List[Dict[str, Any]] = []
+
+    def load(self, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        mtime = os.stat(self.path).st_mtime
+        if mtime != self._mtime:
+            with open(self.path, newline="", encoding="utf-8-sig") as f:
+                reader = csv.reader(f)
+                next(reader, None)  # header row
+                self._data = [item for item in map(parse_rate_row, reader) if item is not None]
+            self._mtime = mtime
+        return self._data
+
+
+# Binary layout (little-endian):
+#   header   16 bytes: magic, version, reserved, row count
+#   rates    float64[count]
+#   ordinals int32[count]   date.toordinal(), strictly ascending
+#   bitmap   ceil(count / 8) bytes, bit i set = moratorium on row i
+BINARY_MAGIC = b"PBRT"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHHQ")
+
+
+class BinaryRatesTable(Sequence):
+    """
+    Read-only view of a memory-mapped rates file
+
+    Rows are decoded on access, so processes mapping the same file share
+    its pages instead of each holding a parsed copy.
+    """
+
+    def __init__(self, buffer):
+        magic, version, _, count = BINARY_HEADER.unpack_from(buffer, 0)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError("Unsupported rates file format")
+
+        view = memoryview(buffer)
+        rates_start = BINARY_HEADER.size
+        ordinals_start = rates_start + 8 * count
+        bitmap_start = ordinals_start + 4 * count
+
+        self._count = count
+        self.rates = view[rates_start:ordinals_start].cast("d")
+        self.ordinals = view[ordinals_start:bitmap_start].cast("i")
+        self.moratorium_bitmap = view[bitmap_start:bitmap_start + (count + 7) // 8]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("rates table index out of range")
+        return {
+            "date": date.fromordinal(self.ordinals[index]),
+            "rate": self.rates[index],
+            "moratorium": bool(self.moratorium_bitmap[index >> 3] & (1 << (index & 7)))
+        }
+
+    def release(self):
+        self.rates.release()
+        self.ordinals.release()
+        self.moratorium_bitmap.release()
+
+
+def write_binary_rates(path: str, data: Iterable[Dict[str, Any]]):
+    """
+    Write a rates table in the memory-mapped binary format
+
+    The file is written next to the target and renamed over it, so readers
+    that already mapped the old file keep a consistent view.
+    """
+    # Одна строка на дату (побеждает последняя), как в PenaltyCalculator
+    rows = sorted({item["date"]: item for item in data}.values(), key=lambda item: item["date"])
+    count = len(rows)
+
+    bitmap = bytearray((count + 7) // 8)
+    for i, item in enumerate(rows):
+        if item["moratorium"]:
+            bitmap[i >> 3] |= 1 << (i & 7)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, count))
+        f.write(struct.pack(f"<{count}d", *(item["rate"] for item in rows)))
+        f.write(struct.pack(f"<{count}i", *(item["date"].toordinal() for item in rows)))
+        f.write(bitmap)
+    os.replace(tmp_path, path)
+
+
+class BinaryRatesSource(RatesSource):
+    """Rates from a memory-mapped binary file produced by write_binary_rates()"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file_id = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._table: Optional[BinaryRatesTable] = None
+
+    def load(self, deadline: Optional[float] = None) -> BinaryRatesTable:
+        stat = os.stat(self.path)
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id != self._file_id:
+            # Файл заменили: отображаем новую версию
+            with open(self.path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            table = BinaryRatesTable(mapped)
+            # Предыдущая версия остается отображенной, пока на ее таблицу есть
+            # ссылки (last_good провайдера, текущие расчеты), и закрывается,
+            # когда таблицу соберет сборщик мусора
+            weakref.finalize(table, _close_mapping, (table.rates, table.ordinals, table.moratorium_bitmap), mapped)
+            self._table = table
+            self._mmap = mapped
+            self._file_id = file_id
+        return self._table
+
+
+def _close_mapping(views, mapped: mmap.mmap):
+    # Колонки таблицы держат экспортированный буфер: без release() close() упадет с BufferError
+    for view in views:
+        view.release()
+    mapped.close()
+
+
+def create_rates_source(kind: str = RATES_SOURCE, path: Optional[str] = RATES_FILE) -> RatesSource:
+    """
+    Create the configured rates source
+
+    Args:
+        kind: "sheets", "csv" or "binary"
+        path: File for the csv and binary sources
+    """
+    if kind == "sheets":
+        return SheetsRatesSource()
+    if kind == "csv":
+        return CsvRatesSource(path or "data/example_data.csv")
+    if kind == "binary":
+        return BinaryRatesSource(path or "data/rates.bin")
+    raise ValueError(f"Unknown RATES_SOURCE: {kind}")
+
+
+class RatesUnavailableError(Exception):
+    """Rates could not be loaded and there is no previously loaded table to fall back to"""
+
+
+class RatesProvider:
+    """
+    Single-flight access to a rates source
+
+    Concurrent callers share one in-progress load instead of each starting
+    their own download. The load runs in a worker thread as a separate
+    task, so a cancelled caller does not cancel it for the others. If the
+    load fails, every waiter gets the last successfully loaded table; the
+    error is raised only if nothing has been loaded yet.
+
+    Each load is limited to ``timeout`` seconds, and repeated failures open
+    a circuit breaker: while it is open the last loaded table is returned
+    immediately without touching the source, and a single half-open probe
+    checks whether the source has recovered.
+
+    The source gets the same ``timeout`` as a deadline, but a thread cannot
+    be interrupted, so one that overruns it is only abandoned by the
+    waiters: it is tracked until it really finishes, later loads wait for
+    it instead of starting a second thread over the same source, and a
+    late result still becomes ``last_good``.
+
+    ``snapshot`` is the content-addressed snapshot of ``last_good``; it is
+    rebuilt in the worker thread only when the source returns a new table.
+    """
+
+    def __init__(
+        self,
+        source: RatesSource,
+        timeout: float = RATES_FETCH_TIMEOUT,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.source = source
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(RATES_BREAKER_FAILURE_THRESHOLD, RATES_BREAKER_RESET_TIMEOUT)
+        self.last_good: Optional[Sequence] = None
+        self.snapshot: Optional[RatesSnapshot] = None
+        self.fetch_started_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._worker: Optional[asyncio.Future] = None
+
+    def _load_with_snapshot(self, deadline: float):
+        data = self.source.load(deadline)
+        if data is self.last_good and self.snapshot is not None:
+            return data, self.snapshot
+        return data, make_snapshot(data)
+
+    def _start_worker(self) -> asyncio.Future:
+        if self._worker is None:
+            deadline = time.monotonic() + self.timeout
+            self._worker = asyncio.ensure_future(asyncio.to_thread(self._load_with_snapshot, deadline))
+            self._worker.add_done_callback(self._worker_done)
+        else:
+            # The previous thread overran the timeout and is still running
+            metrics.incr("rates_fetch_joined_overrun")
+        return self._worker
+
+    def _worker_done(self, worker: asyncio.Future):
+        self._worker = None
+        if self._inflight is None and not worker.cancelled() and worker.exception() is None:
+            # Nobody waited for this result any more: it came after the timeout
+            self.last_good, self.snapshot = worker.result()
+
+    async def _load(self) -> Sequence:
+        try:
+            # shield(): the timeout abandons the wait, not the thread
+            data, snapshot = await asyncio.wait_for(asyncio.shield(self._start_worker()), self.timeout)
+        except Exception as e:
+            self.breaker.record_failure()
+            metrics.incr("rates_fetch_failed")
+            if self.last_good is None:
+                raise RatesUnavailableError(str(e) or type(e).__name__) from e
+            metrics.incr("rates_served_last_good")
+            return self.last_good
+        finally:
+            self._inflight = None
+
+        self.breaker.record_success()
+        self.last_good = data
+        self.snapshot = snapshot
+        return data
+
+    def snapshot_for(self, table: Sequence) -> RatesSnapshot:
+        """Snapshot of a table returned by get_rates()"""
+        if table is self.last_good and self.snapshot is not None:
+            return self.snapshot
+        return make_snapshot(table)
+
+    async def get_rates(self) -> Sequence:
+        """Current rates table, loading it at most once per concurrent burst"""
+        if self._inflight is None:
+            if not self.breaker.allow_request():
+                metrics.incr("rates_served_breaker_open")
+                if self.last_good is None:
+                    raise RatesUnavailableError("rates source is unavailable (circuit open)")
+                return self.last_good
+            metrics.incr("rates_fetch_started")
+            self.fetch_started_at = time.monotonic()
+            self._inflight = asyncio.create_task(self._load())
+        else:
+            metrics.incr("rates_fetch_coalesced")
+        return await asyncio.shield(self._inflight)
+
+    async def get_cached_rates(self, max_age: float) -> Sequence:
+        """
+        Last loaded table without waiting for the source
+
+        For callers on a hot path (inline queries, the HTTP API). Waits
+        only if nothing has been loaded yet; otherwise, if the last fetch
+        started more than ``max_age`` seconds ago, a refresh is started in
+        the background and the current table is returned immediately.
+        """
+        if self.last_good is None:
+            return await self.get_rates()
+        if self._inflight is None and time.monotonic() - self.fetch_started_at > max_age:
+            task = asyncio.create_task(self.get_rates())
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self.last_good
+
+
+# Source and single-flight provider used by the handlers
+rates_source = create_rates_source()
+rates_provider = RatesProvider(rates_source)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the rates table to the binary format")
+    parser.add_argument("output", help="Target .bin file")
+    parser.add_argument("--source", choices=["sheets", "csv"], default="sheets")
+    parser.add_argument("--input", help="CSV file for --source csv", default="data/example_data.csv")
+    args = parser.parse_args()
+
+    source = create_rates_source(args.source, args.input)
+    table = source.load()
+    write_binary_rates(args.output, table)
+    print(f"Exported {len(table)} rows to {args.output}")
@@ -0,0 +1,242 @@
+"""
+Recompute stored calculations affected by a change of the rates table.
+
+    python -m services.recompute OLD_SNAPSHOT_ID [NEW_SNAPSHOT_ID] --output deltas.csv
+
+The old and new tables are diffed into ranges of days whose effective rate
+or moratorium flag changed; only calculations whose period
+[deadline date, calculation date] overlaps one of those ranges are read
+(through the date index on calculations) and recomputed in a process pool.
+Without NEW_SNAPSHOT_ID the current rates source is used. Deltas are
+written to --output as the chunks complete.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from services.calculator import PenaltyCalculator
+
+# Upper bound of the last changed range: a change in the last row holds until further notice
+OPEN_END = date.max.toordinal()
+
+
+class PenaltyDelta(NamedTuple):
+    calculation_id: int
+    old_amount: float
+    new_amount: float
+
+
+class RecomputeReport(NamedTuple):
+    changed_ranges: List[Tuple[int, int]]
+    checked: int
+    deltas: List[PenaltyDelta]
+
+
+def _values_by_ordinal(table: Iterable[Dict[str, Any]]) -> Dict[int, Tuple[float, bool]]:
+    return {item["date"].toordinal(): (float(item["rate"]), bool(item["moratorium"])) for item in table}
+
+
+def changed_date_ranges(old_table: Iterable[Dict[str, Any]], new_table: Iterable[Dict[str, Any]]) -> List[Tuple[int, int]]:
+    """
+    Ranges of days (inclusive date ordinals) whose effective row differs
+
+    A row applies from its date until the next row, as in PenaltyCalculator,
+    so a changed, added or removed row changes every day up to the next row
+    of either table. Adjacent ranges are merged.
+    """
+    old = _values_by_ordinal(old_table)
+    new = _values_by_ordinal(new_table)
+    ordinals = sorted(old.keys() | new.keys())
+
+    ranges: List[Tuple[int, int]] = []
+    old_value = new_value = None
+    for i, ordinal in enumerate(ordinals):
+        old_value = old.get(ordinal, old_value)
+        new_value = new.get(ordinal, new_value)
+        if old_value == new_value:
+            continue
+        end = ordinals[i + 1] - 1 if i + 1 < len(ordinals) else OPEN_END
+        if ranges and ranges[-1][1] == ordinal - 1:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((ordinal, end))
+    return ranges
+
+
+# Calculator of the worker process, built once from the new table
+_calculator: Optional[PenaltyCalculator] = None
+
+
+def _init_worker(table: List[Dict[str, Any]]):
+    global _calculator
+    _calculator = PenaltyCalculator(table)
+
+
+def _recompute_chunk(rows: List[Dict[str, Any]]) -> Tuple[int, List[PenaltyDelta]]:
+    deltas = []
+    for row in rows:
+        result = _calculator.calculate_penalty(
+            contract_amount=row["contract_amount"],
+            deadline_date=date.fromordinal(row["deadline_ordinal"]),
+            calculation_date=date.fromordinal(row["calculation_ordinal"]),
+            is_individual=bool(row["is_individual"]),
+            is_unique_object=bool(row["is_unique"])
+        )
+        new_amount = result["penalty_amount"]
+        if round(new_amount - row["penalty_amount"], 2) != 0:
+            deltas.append(PenaltyDelta(row["id"], row["penalty_amount"], new_amount))
+    return len(rows), deltas
+
+
+def _affected_chunks(database, changed_ranges: List[Tuple[int, int]], chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Calculations overlapping the changed ranges, chunk_size rows at a time
+
+    Each range is paged by the key of the calculation date index (keyset),
+    so the database scans only calculations made on or after the range
+    start. A calculation overlapping several ranges is read with the first
+    of them only: the ranges are sorted and disjoint, so it overlaps an
+    earlier range exactly when its deadline is not after the end of the
+    previous one.
+    """
+    previous_end = None
+    for start, end in changed_ranges:
+        after = (0, 0, 0)
+        while True:
+            rows = database.get_calculations_in_window(start, end, after, chunk_size)
+            if not rows:
+                break
+            last = rows[-1]
+            after = (last["calculation_ordinal"], last["deadline_ordinal"], last["id"])
+            if previous_end is not None:
+                rows = [row for row in rows if row["deadline_ordinal"] > previous_end]
+            if rows:
+                yield rows
+        previous_end = end
+
+
+def iter_deltas(
+    database,
+    new_table: List[Dict[str, Any]],
+    changed_ranges: List[Tuple[int, int]],
+    workers: Optional[int] = None,
+    chunk_size: int = 1000,
+    max_in_flight: Optional[int] = None
+) -> Iterator[Tuple[int, List[PenaltyDelta]]]:
+    """
+    Recompute the affected calculations in a process pool, streaming the results
+
+    At most max_in_flight chunks (twice the pool size by default) are
+    submitted at a time, so memory does not grow with the number of
+    affected calculations. Results come in completion order.
+
+    Yields:
+        (number of recomputed calculations, results that differ) per chunk
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(new_table,)) as executor:
+        pending = set()
+        for rows in _affected_chunks(database, changed_ranges, chunk_size):
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(_recompute_chunk, rows))
+
+        for future in as_completed(pending):
+            yield future.result()
+
+
+def recompute_changed(
+    database,
+    old_table: Iterable[Dict[str, Any]],
+    new_table: Iterable[Dict[str, Any]],
+    workers: Optional[int] = None,
+    chunk_size: int = 1000,
+    max_in_flight: Optional[int] = None
+) -> RecomputeReport:
+    """
+    Recompute the calculations affected by the change from old_table to new_table
+
+    Args:
+        database: Storage backend (services.database.DatabaseBackend)
+        old_table: Rates table the stored results were computed with
+        new_table: Corrected rates table
+        workers: Size of the process pool (CPU count by default)
+        chunk_size: Calculations read from the database and sent to a worker at once
+        max_in_flight: Chunks submitted to the pool at a time (see iter_deltas)
+
+    Returns:
+        Changed ranges, number of recomputed calculations and the results that differ
+    """
+    new_table = list(new_table)
+    changed_ranges = changed_date_ranges(old_table, new_table)
+
+    checked = 0
+    deltas: List[PenaltyDelta] = []
+    for recomputed, chunk_deltas in iter_deltas(database, new_table, changed_ranges, workers, chunk_size, max_in_flight):
+        checked += recomputed
+        deltas.extend(chunk_deltas)
+
+    deltas.sort(key=lambda delta: delta.calculation_id)
+    return RecomputeReport(changed_ranges, checked, deltas)
+
+
+def main():
+    import argparse
+    import csv
+    from contextlib import nullcontext
+
+    from services.database import db
+    from services.snapshots import SnapshotStore
+
+    parser = argparse.ArgumentParser(description="Recompute calculations affected by a rates table change")
+    parser.add_argument("old_snapshot", type=int, help="Snapshot id the stored results were computed with")
+    parser.add_argument("new_snapshot", type=int, nargs="?", help="Snapshot id to compare with (current rates by default)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--max-in-flight", type=int, help="Chunks submitted to the pool at a time (2 x workers by default)")
+    parser.add_argument("--output", help="Write the deltas to this CSV file")
+    args = parser.parse_args()
+
+    snapshot_store = SnapshotStore(db)
+    old_table = snapshot_store.load_table(args.old_snapshot)
+    if old_table is None:
+        parser.error(f"snapshot {args.old_snapshot} not found")
+    if args.new_snapshot is None:
+        from services.rates import rates_source
+        new_table = rates_source.load()
+    else:
+        new_table = snapshot_store.load_table(args.new_snapshot)
+        if new_table is None:
+            parser.error(f"snapshot {args.new_snapshot} not found")
+
+    new_table = list(new_table)
+    changed_ranges = changed_date_ranges(old_table, new_table)
+    for start, end in changed_ranges:
+        until = "…" if end == OPEN_END else date.fromordinal(end).strftime("%d.%m.%Y")
+        print(f"Changed: {date.fromordinal(start).strftime('%d.%m.%Y')} – {until}")
+
+    # Deltas are written as chunks complete (in completion order), not collected in memory
+    checked = changed = 0
+    total = 0.0
+    with open(args.output, "w", newline="", encoding="utf-8") if args.output else nullcontext() as output:
+        writer = csv.writer(output) if output else None
+        if writer:
+            writer.writerow(["calculation_id", "old_amount", "new_amount", "delta"])
+        for recomputed, deltas in iter_deltas(db, new_table, changed_ranges, args.workers, args.chunk_size, args.max_in_flight):
+            checked += recomputed
+            changed += len(deltas)
+            for delta in deltas:
+                total += delta.new_amount - delta.old_amount
+                if writer:
+                    writer.writerow([*delta, round(delta.new_amount - delta.old_amount, 2)])
+
+    print(f"Recomputed {checked} calculations, {changed} changed, total delta {total:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,281 @@
 import os
-from datetime import datetime
-from typing import List, Dict, Any, Tuple
+import time
+import logging
+import random
+import hashlib
+import threading
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime, date as date_type, timedelta
+from typing import List, Dict, Any, Tuple, Optional
 
+import httplib2
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
 import json
 
-from config import GOOGLE_CREDS_FILE, SPREADSHEET_ID, SHEET_NAME
+from config import (
+    GOOGLE_CREDS_FILE, SPREADSHEET_ID, SHEET_NAME, SHEETS_SYNC_OVERLAP, SHEETS_FULL_SYNC_INTERVAL,
+    SHEETS_API_ENDPOINT, SHEETS_HTTP_TIMEOUT, SHEETS_QUOTA_PER_MINUTE, SHEETS_QUOTA_RESERVE,
+    SHEETS_MAX_RETRIES, SHEETS_BACKOFF_BASE, SHEETS_BACKOFF_MAX, SHEETS_RATE_RANGES, SHEETS_MORATORIUM_RANGES
+)
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Row 1 holds the headers
+FIRST_DATA_ROW = 2
+
+
+# HTTP statuses worth retrying: quota exceeded and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SheetsDeadlineExceeded(TimeoutError):
+    """The next request, retry or quota wait would not finish before the caller's deadline"""
+
+
+class QuotaScheduler:
+    """
+    Client-side request budget for the Sheets read quota
+    
+    Tracks request timestamps in a sliding window. When the budget is used
+    up, the next request waits until the oldest one leaves the window.
+    Requests rejected with 429 or a 5xx status are retried with jittered
+    exponential backoff. The budget is per process, so it should be set
+    below the project quota if several processes share it.
+    
+    With a deadline (a time.monotonic() value) a request, retry or quota
+    wait is started only if it can finish by then, counting a request as
+    ``request_timeout`` seconds; otherwise SheetsDeadlineExceeded is raised
+    (or the last HttpError, if retries run out of time).
+    """
+    
+    def __init__(
+        self,
+        max_requests: int = SHEETS_QUOTA_PER_MINUTE,
+        window: float = 60.0,
+        max_retries: int = SHEETS_MAX_RETRIES,
+        backoff_base: float = SHEETS_BACKOFF_BASE,
+        backoff_max: float = SHEETS_BACKOFF_MAX,
+        request_timeout: float = SHEETS_HTTP_TIMEOUT,
+        sleep=time.sleep,
+        clock=time.monotonic
+    ):
+        self.max_requests = max_requests
+        self.window = window
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self._sleep = sleep
+        self._clock = clock
+        self._sent = deque()
+        self._lock = threading.Lock()
+    
+    def _expire(self, now: float):
+        while self._sent and now - self._sent[0] >= self.window:
+            self._sent.popleft()
+    
+    def remaining(self) -> int:
+        """Requests left in the current window"""
+        with self._lock:
+            self._expire(time.monotonic())
+            remaining = self.max_requests - len(self._sent)
+        metrics.set_gauge("sheets_quota_remaining", remaining)
+        return remaining
+    
+    def _fits(self, wait: float, deadline: Optional[float]) -> bool:
+        """Whether waiting ``wait`` seconds still leaves time for a request"""
+        return deadline is None or self._clock() + wait + self.request_timeout <= deadline
+    
+    def acquire(self, deadline: Optional[float] = None):
+        """Take one request from the budget, waiting for the window to free up if needed"""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._expire(now)
+                if len(self._sent) < self.max_requests:
+                    if not self._fits(0, deadline):
+                        metrics.incr("sheets_deadline_exceeded")
+                        raise SheetsDeadlineExceeded("no time left for a Sheets request")
+                    self._sent.append(now)
+                    metrics.set_gauge("sheets_quota_remaining", self.max_requests - len(self._sent))
+                    return
+                wait = self.window - (now - self._sent[0])
+            if not self._fits(wait, deadline):
+                metrics.incr("sheets_deadline_exceeded")
+                raise SheetsDeadlineExceeded(f"Sheets quota frees up in {wait:.1f}s, after the deadline")
+            metrics.incr("sheets_quota_waits")
+            self._sleep(wait)
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """Delay before retry number ``attempt`` (0-based), with jitter"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+    
+    def execute(self, request, deadline: Optional[float] = None):
+        """Execute a googleapiclient request within the budget, retrying 429/5xx until the deadline"""
+        attempt = 0
+        while True:
+            self.acquire(deadline)
+            metrics.incr("sheets_requests")
+            try:
+                return request.execute()
+            except HttpError as e:
+                if e.resp.status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                if not self._fits(delay, deadline):
+                    metrics.incr("sheets_deadline_exceeded")
+                    raise
+                metrics.incr("sheets_retries")
+                if e.resp.status == 429:
+                    metrics.incr("sheets_quota_errors")
+                self._sleep(delay)
+                attempt += 1
+
+
+# Budget shared by all Sheets clients in the process
+sheets_quota = QuotaScheduler()
+
+
+# Parsed Sheets v4 discovery document, shared by every client in the process
+_discovery_document: Optional[str] = None
+
+
+def _get_discovery_document() -> str:
+    """
+    Sheets v4 discovery document from the copy bundled with googleapiclient
+    
+    Reading it from disk instead of the discovery endpoint means building a
+    client never needs network access.
+    """
+    global _discovery_document
+    if _discovery_document is None:
+        _discovery_document = get_static_doc("sheets", "v4")
+    return _discovery_document
 
 
 class GoogleSheetsService:
-    """Service to interact with Google Sheets API"""
+    """Service to interact with Google Sheets API
     
-    def __init__(self):
-        self.creds = None
+    The instance keeps its credentials and one keep-alive HTTP connection, so
+    it is meant to be created once and reused (see get_sheets_service()).
+    Access tokens are minted on first use and refreshed only after they
+    expire.
+    """
+    
+    def __init__(
+        self,
+        credentials=None,
+        api_endpoint: Optional[str] = SHEETS_API_ENDPOINT,
+        spreadsheet_id: Optional[str] = None,
+        scheduler: Optional[QuotaScheduler] = None
+    ):
+        """
+        Args:
+            credentials: google-auth credentials; loaded from GOOGLE_CREDS_FILE if omitted
+            api_endpoint: Override of the API root URL (e.g. a local mock server)
+            spreadsheet_id: Spreadsheet to read; defaults to SPREADSHEET_ID
+            scheduler: Request budget; defaults to the process-wide sheets_quota
+        """
+        self.creds = credentials
+        self.scheduler = scheduler or sheets_quota
         self.service = None
+        self.api_endpoint = api_endpoint
+        self.spreadsheet_id = spreadsheet_id or SPREADSHEET_ID
+        # httplib2.Http is not thread-safe, requests through it are serialized
+        self._lock = threading.Lock()
         self._initialize_service()
         
     def _initialize_service(self):
         """Initialize the Google Sheets API service"""
         try:
-            # Проверка существования файла
-            if not os.path.exists(GOOGLE_CREDS_FILE):
-                raise FileNotFoundError(f"Service account file not found: {GOOGLE_CREDS_FILE}. "
-                                       f"Please create a service account and download the JSON key file.")
-            
-            # Проверка содержимого файла
-            try:
-                with open(GOOGLE_CREDS_FILE, 'r') as f:
-                    creds_data = json.load(f)
-                    
-                # Проверяем наличие обязательных полей
-                required_fields = ['type', 'project_id', 'private_key_id', 'private_key', 'client_email', 'token_uri']
-                missing_fields = [field for field in required_fields if field not in creds_data]
-                
-                if missing_fields:
-                    raise ValueError(f"Service account file is missing required fields: {', '.join(missing_fields)}")
-                    
-            except json.JSONDecodeError:
-                raise ValueError(f"Service account file is not a valid JSON file: {GOOGLE_CREDS_FILE}")
+            if self.creds is None:
+                self.creds = self._load_credentials()
             
-            # Инициализация сервиса
-            self.creds = service_account.Credentials.from_service_account_file(
-                GOOGLE_CREDS_FILE, 
-                scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"]
-            )
-            self.service = build("sheets", "v4", credentials=self.creds)
+            http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=SHEETS_HTTP_TIMEOUT))
+            client_options = {"api_endpoint": self.api_endpoint} if self.api_endpoint else None
+            self.service = build_from_document(_get_discovery_document(), http=http, client_options=client_options)
             
         except Exception as e:
-            print(f"Error initializing Google Sheets service: {e}")
+            logger.error("Error initializing Google Sheets service: %s", e)
             
             # Добавляем инструкции по исправлению
             if isinstance(e, FileNotFoundError):
-                print("\nРешение: Создайте сервисный аккаунт в Google Cloud Console и загрузите JSON файл в data/service_account.json")
-                print("Подробные инструкции находятся в файле data/README.md")
+                logger.error(
+                    "Решение: Создайте сервисный аккаунт в Google Cloud Console и загрузите JSON файл в data/service_account.json. "
+                    "Подробные инструкции находятся в файле data/README.md"
+                )
             elif isinstance(e, ValueError) and "missing fields" in str(e):
-                print("\nРешение: Файл сервисного аккаунта некорректен. Скачайте новый файл ключа сервисного аккаунта.")
-                print("Подробные инструкции находятся в файле data/README.md")
+                logger.error(
+                    "Решение: Файл сервисного аккаунта некорректен. Скачайте новый файл ключа сервисного аккаунта. "
+                    "Подробные инструкции находятся в файле data/README.md"
+                )
             
             raise
     
+    @staticmethod
+    def _load_credentials() -> service_account.Credentials:
+        """Validate GOOGLE_CREDS_FILE and load service account credentials from it"""
+        # Проверка существования файла
+        if not os.path.exists(GOOGLE_CREDS_FILE):
+            raise FileNotFoundError(f"Service account file not found: {GOOGLE_CREDS_FILE}. "
+                                   f"Please create a service account and download the JSON key file.")
+        
+        # Проверка содержимого файла
+        try:
+            with open(GOOGLE_CREDS_FILE, 'r') as f:
+                creds_data = json.load(f)
+                
+            # Проверяем наличие обязательных полей
+            required_fields = ['type', 'project_id', 'private_key_id', 'private_key', 'client_email', 'token_uri']
+            missing_fields = [field for field in required_fields if field not in creds_data]
+            
+            if missing_fields:
+                raise ValueError(f"Service account file is missing required fields: {', '.join(missing_fields)}")
+                
+        except json.JSONDecodeError:
+            raise ValueError(f"Service account file is not a valid JSON file: {GOOGLE_CREDS_FILE}")
+        
+        return service_account.Credentials.from_service_account_file(
+            GOOGLE_CREDS_FILE, 
+            scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"]
+        )
+    
+    def get_values(self, cell_range: str, deadline: Optional[float] = None) -> List[List[str]]:
+        """Fetch raw cell values for an A1 range (e.g. "Лист1!A2:C"), retrying until the deadline"""
+        if not self.spreadsheet_id:
+            raise ValueError("SPREADSHEET_ID not set. Please check your .env file.")
+            
+        with self._lock:
+            sheet = self.service.spreadsheets()
+            result = self.scheduler.execute(sheet.values().get(
+                spreadsheetId=self.spreadsheet_id,
+                range=cell_range
+            ), deadline)
+        
+        return result.get("values", [])
+    
+    def batch_get_values(self, cell_ranges: List[str], deadline: Optional[float] = None) -> List[List[List[str]]]:
+        """Fetch raw cell values for several A1 ranges in one values.batchGet round-trip"""
+        if not self.spreadsheet_id:
+            raise ValueError("SPREADSHEET_ID not set. Please check your .env file.")
+        
+        with self._lock:
+            sheet = self.service.spreadsheets()
+            result = self.scheduler.execute(sheet.values().batchGet(
+                spreadsheetId=self.spreadsheet_id,
+                ranges=cell_ranges
+            ), deadline)
+        
+        # valueRanges come back in request order
+        return [value_range.get("values", []) for value_range in result.get("valueRanges", [])]
+    
     def get_rates_and_moratoriums(self) -> List[Dict[str, Any]]:
         """Get rates and moratorium data from the Google Sheet
         
@@ -70,52 +286,327 @@ class GoogleSheetsService:
             - moratorium (bool): Whether there's a moratorium that day
         """
         try:
-            if not SPREADSHEET_ID:
-                raise ValueError("SPREADSHEET_ID not set. Please check your .env file.")
-                
-            sheet = self.service.spreadsheets()
-            result = sheet.values().get(
-                spreadsheetId=SPREADSHEET_ID,
-                range=f"{SHEET_NAME}!A2:C"  # Assuming headers are in row 1
-            ).execute()
-            
-            values = result.get("values", [])
+            values = self.get_values(f"{SHEET_NAME}!A{FIRST_DATA_ROW}:C")  # Assuming headers are in row 1
             
             if not values:
-                print(f"No data found in spreadsheet. Make sure the spreadsheet contains data and your service account has access.")
+                logger.warning("No data found in spreadsheet. Make sure the spreadsheet contains data and your service account has access.")
                 return []
             
             data = []
             for row in values:
-                if len(row) >= 3:  # Ensure the row has all required data
-                    try:
-                        # Parse date from string (DD.MM.YYYY)
-                        date_str = row[0]
-                        date = datetime.strptime(date_str, "%d.%m.%Y").date()
-                        
-                        # Parse rate from percentage (e.g., "10%")
-                        rate_str = row[1].replace('%', '').replace(',', '.').strip()
-                        rate = float(rate_str) / 100
-                        
-                        # Parse moratorium (0 or 1)
-                        moratorium = bool(int(row[2]))
-                        
-                        data.append({
-                            "date": date,
-                            "rate": rate,
-                            "moratorium": moratorium
-                        })
-                    except (ValueError, IndexError) as e:
-                        print(f"Error parsing row {row}: {e}")
-                        continue
+                item = parse_rate_row(row)
+                if item is not None:
+                    data.append(item)
             
             return data
         
         except Exception as e:
-            print(f"Error fetching data from Google Sheets: {e}")
+            _report_fetch_error(e)
+            return []
+
+
+_shared_service: Optional[GoogleSheetsService] = None
+_shared_service_lock = threading.Lock()
+
+
+def get_sheets_service() -> GoogleSheetsService:
+    """Process-wide GoogleSheetsService, created on first use"""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = GoogleSheetsService()
+    return _shared_service
+
+
+def parse_sheet_date(date_str: str) -> date_type:
+    """Parse a DD.MM.YYYY cell; several times faster than datetime.strptime"""
+    day, month, year = date_str.split(".")
+    return date_type(int(year), int(month), int(day))
+
+
+def parse_rate_row(row: List[str], require_moratorium: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Parse one sheet row ``[DD.MM.YYYY, "7,5%", 0|1]``
+    
+    Args:
+        row: Raw cell values
+        require_moratorium: If False, a missing third column means no moratorium
+            (rates tabs whose moratorium periods live on a separate tab)
+    
+    Returns:
+        Dictionary with date, rate and moratorium, or None for incomplete/invalid rows
+    """
+    if len(row) < (3 if require_moratorium else 2):  # Ensure the row has all required data
+        return None
+    
+    try:
+        # Parse date from string (DD.MM.YYYY)
+        date = parse_sheet_date(row[0])
+        
+        # Parse rate from percentage (e.g., "10%")
+        rate_str = row[1].replace('%', '').replace(',', '.').strip()
+        rate = float(rate_str) / 100
+        
+        # Parse moratorium (0 or 1)
+        moratorium = bool(int(row[2])) if len(row) >= 3 and row[2].strip() else False
+        
+        return {
+            "date": date,
+            "rate": rate,
+            "moratorium": moratorium
+        }
+    except (ValueError, IndexError) as e:
+        logger.warning("Error parsing row %s: %s", row, e)
+        return None
+
+
+def _report_fetch_error(e: Exception):
+    logger.error("Error fetching data from Google Sheets: %s", e)
+    
+    if "access" in str(e).lower():
+        logger.error(
+            "Решение: Убедитесь, что вы предоставили доступ к таблице для сервисного аккаунта. "
+            "Email сервисного аккаунта можно найти в файле %s в поле 'client_email'.",
+            GOOGLE_CREDS_FILE
+        )
+
+
+class IncrementalRatesSync:
+    """
+    In-memory rates table refreshed from the tail of the sheet
+    
+    The sheet only grows at the bottom (one row per day), so a refresh
+    downloads rows starting a few rows before the last synced one. The
+    overlapping rows must match what we already have; if they don't (a row
+    was edited, inserted or deleted above the tail) or the periodic
+    reconciliation is due, the whole range is downloaded again.
+    """
+    
+    def __init__(self, overlap: int = SHEETS_SYNC_OVERLAP, full_sync_interval: int = SHEETS_FULL_SYNC_INTERVAL):
+        self.overlap = overlap
+        self.full_sync_interval = full_sync_interval
+        self._service: Optional[GoogleSheetsService] = None
+        self._raw_rows: List[List[str]] = []
+        self._hasher = hashlib.sha256()
+        self.data: List[Dict[str, Any]] = []
+        self.last_row = FIRST_DATA_ROW - 1  # last synced sheet row (1 = header)
+        self.data_hash: Optional[str] = None
+        self.last_full_sync = 0.0
+    
+    @property
+    def service(self) -> GoogleSheetsService:
+        if self._service is None:
+            self._service = get_sheets_service()
+        return self._service
+    
+    def _append_rows(self, rows: List[List[str]]):
+        new_items = []
+        for row in rows:
+            self._raw_rows.append(row)
+            self._hasher.update(json.dumps(row, ensure_ascii=False).encode("utf-8"))
+            item = parse_rate_row(row)
+            if item is not None:
+                new_items.append(item)
+        
+        if new_items:
+            # Новый список, а не append: уже выданные таблицы не меняются
+            self.data = self.data + new_items
+        self.last_row = FIRST_DATA_ROW + len(self._raw_rows) - 1
+        self.data_hash = self._hasher.hexdigest()
+    
+    def full_sync(self, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Download the whole range and rebuild the table"""
+        values = self.service.get_values(f"{SHEET_NAME}!A{FIRST_DATA_ROW}:C", deadline)
+        
+        self._raw_rows = []
+        self._hasher = hashlib.sha256()
+        self.data = []
+        self._append_rows(values)
+        self.last_full_sync = time.monotonic()
+        return self.data
+    
+    def incremental_sync(self, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Download only the tail (plus overlap) and append new rows"""
+        start_index = max(0, len(self._raw_rows) - self.overlap)
+        values = self.service.get_values(f"{SHEET_NAME}!A{FIRST_DATA_ROW + start_index}:C", deadline)
+        
+        known_tail = self._raw_rows[start_index:]
+        if values[:len(known_tail)] != known_tail:
+            # Строки выше хвоста изменились - сверяем таблицу целиком
+            return self.full_sync(deadline)
+        
+        self._append_rows(values[len(known_tail):])
+        return self.data
+    
+    def refresh(self, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Bring the cached table up to date and return it
+        
+        Fetch errors are reported and re-raised; the previously synced
+        table stays intact, and RatesProvider falls back to it. When the
+        request budget is down to its reserve, the refresh is skipped and
+        the cached table is returned, leaving room for reconciliations.
+        Requests and retries stop at ``deadline`` (see QuotaScheduler).
+        """
+        try:
+            if self.data_hash is not None and self.service.scheduler.remaining() <= SHEETS_QUOTA_RESERVE:
+                metrics.incr("sheets_refresh_deferred")
+                return self.data
             
-            if "access" in str(e).lower():
-                print("\nРешение: Убедитесь, что вы предоставили доступ к таблице для сервисного аккаунта.")
-                print(f"Email сервисного аккаунта можно найти в файле {GOOGLE_CREDS_FILE} в поле 'client_email'.")
+            reconciliation_due = time.monotonic() - self.last_full_sync >= self.full_sync_interval
+            if self.data_hash is None or reconciliation_due:
+                return self.full_sync(deadline)
+            return self.incremental_sync(deadline)
+        except Exception as e:
+            _report_fetch_error(e)
+            raise
+
+
+def parse_moratorium_row(row: List[str]) -> Optional[Tuple[date_type, date_type]]:
+    """
+    Parse a moratorium period row ``[start DD.MM.YYYY, end DD.MM.YYYY]``
+    
+    The end date is inclusive; an empty end means a single-day period.
+    
+    Returns:
+        (start, end) tuple, or None for empty/invalid rows
+    """
+    if not row or not row[0].strip():
+        return None
+    
+    try:
+        start = parse_sheet_date(row[0])
+        end = parse_sheet_date(row[1]) if len(row) > 1 and row[1].strip() else start
+    except (ValueError, IndexError) as e:
+        logger.warning("Error parsing moratorium row %s: %s", row, e)
+        return None
+    
+    if end < start:
+        logger.warning("Error parsing moratorium row %s: end date is before start date", row)
+        return None
+    return start, end
+
+
+def merge_rates_and_moratoriums(
+    rate_rows: List[Dict[str, Any]],
+    periods: List[Tuple[date_type, date_type]]
+) -> List[Dict[str, Any]]:
+    """
+    Combine rate rows and moratorium periods into one rates table
+    
+    PenaltyCalculator looks up the closest previous row for any date, so a
+    period only needs boundary rows: one at its start and one the day after
+    its end, each carrying the rate and moratorium flag in effect on that
+    date. Rate rows that fall inside a period are flagged as moratorium days
+    as well, so the flags of both layouts combine.
+    """
+    rates_by_date = {item["date"]: item for item in rate_rows}
+    rate_dates = sorted(rates_by_date)
+    if not rate_dates:
+        return []
+    
+    breakpoints = set(rate_dates)
+    for start, end in periods:
+        breakpoints.add(start)
+        breakpoints.add(end + timedelta(days=1))
+    
+    # Moratorium coverage as sorted, merged (start, end) intervals
+    merged_periods = []
+    for start, end in sorted(periods):
+        if merged_periods and start <= merged_periods[-1][1] + timedelta(days=1):
+            merged_periods[-1] = (merged_periods[-1][0], max(merged_periods[-1][1], end))
+        else:
+            merged_periods.append((start, end))
+    period_starts = [start for start, _ in merged_periods]
+    
+    data = []
+    for day in sorted(breakpoints):
+        rate_index = bisect_right(rate_dates, day) - 1
+        if rate_index < 0:
+            # Ставка до первой строки неизвестна
+            continue
+        rate_row = rates_by_date[rate_dates[rate_index]]
+        
+        period_index = bisect_right(period_starts, day) - 1
+        in_period = period_index >= 0 and day <= merged_periods[period_index][1]
+        
+        data.append({
+            "date": day,
+            "rate": rate_row["rate"],
+            # Вне периодов действует флаг строки ставки (старая раскладка A:C),
+            # в том числе на границах периодов между строками ставок
+            "moratorium": in_period or rate_row["moratorium"]
+        })
+    
+    return data
+
+
+class MultiRangeRatesSync:
+    """
+    Rates table assembled from several sheet ranges in one batchGet call
+    
+    Rate ranges hold ``date, rate[, moratorium]`` rows (e.g. one tab per
+    archived year plus the current tab); moratorium ranges hold
+    ``start, end`` period rows. Every range is parsed on its own and the
+    results are merged. If the downloaded values did not change, the
+    previous table is returned without parsing.
+    """
+    
+    def __init__(self, rate_ranges: List[str], moratorium_ranges: List[str]):
+        self.rate_ranges = rate_ranges
+        self.moratorium_ranges = moratorium_ranges
+        self._service: Optional[GoogleSheetsService] = None
+        self.data: List[Dict[str, Any]] = []
+        self.data_hash: Optional[str] = None
+    
+    @property
+    def service(self) -> GoogleSheetsService:
+        if self._service is None:
+            self._service = get_sheets_service()
+        return self._service
+    
+    def refresh(self, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Download all ranges and return the merged table
+        
+        Fetch errors are reported and re-raised and requests stop at
+        ``deadline``, as in IncrementalRatesSync.
+        """
+        try:
+            if self.data_hash is not None and self.service.scheduler.remaining() <= SHEETS_QUOTA_RESERVE:
+                metrics.incr("sheets_refresh_deferred")
+                return self.data
             
-            return [] 
\ No newline at end of file
+            value_ranges = self.service.batch_get_values(self.rate_ranges + self.moratorium_ranges, deadline)
+        except Exception as e:
+            _report_fetch_error(e)
+            raise
+        
+        data_hash = hashlib.sha256(json.dumps(value_ranges, ensure_ascii=False).encode("utf-8")).hexdigest()
+        if data_hash == self.data_hash:
+            return self.data
+        
+        rate_values = value_ranges[:len(self.rate_ranges)]
+        moratorium_values = value_ranges[len(self.rate_ranges):]
+        
+        rate_rows = []
+        for values in rate_values:
+            rate_rows.extend(
+                item for item in (parse_rate_row(row, require_moratorium=False) for row in values) if item is not None
+            )
+        periods = []
+        for values in moratorium_values:
+            periods.extend(period for period in map(parse_moratorium_row, values) if period is not None)
+        
+        self.data = merge_rates_and_moratoriums(rate_rows, periods)
+        self.data_hash = data_hash
+        return self.data
+
+
+# Shared rates table used by the handlers: several ranges if configured,
+# otherwise the single SHEET_NAME!A2:C layout synced incrementally
+if SHEETS_RATE_RANGES:
+    rates_sync = MultiRangeRatesSync(SHEETS_RATE_RANGES, SHEETS_MORATORIUM_RANGES)
+else:
+    rates_sync = IncrementalRatesSync()
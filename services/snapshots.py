@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+
+class RatesSnapshot(NamedTuple):
+    """Canonical, compressed form of one version of the rates table"""
+    hash: str
+    blob: bytes
+    rows: int
+
+
+def _canonical_lines(table: Iterable[Dict[str, Any]]) -> List[str]:
+    rows = sorted(table, key=lambda item: item["date"])
+    return [f"{item['date'].toordinal()}:{float(item['rate'])!r}:{int(bool(item['moratorium']))}\n" for item in rows]
+
+
+def make_snapshot(table: Iterable[Dict[str, Any]]) -> RatesSnapshot:
+    """
+    Build the content-addressed snapshot of a rates table
+
+    Rows are serialized in date order as ``ordinal:rate:moratorium`` lines,
+    so the same table always gives the same hash regardless of its source
+    or row order.
+    """
+    lines = _canonical_lines(table)
+    payload = "".join(lines).encode("ascii")
+    return RatesSnapshot(hashlib.sha256(payload).hexdigest(), zlib.compress(payload, 9), len(lines))
+
+
+def load_snapshot_table(blob: bytes) -> List[Dict[str, Any]]:
+    """Decode a snapshot blob back into the rates table format used by PenaltyCalculator"""
+    table = []
+    for line in zlib.decompress(blob).decode("ascii").splitlines():
+        ordinal, rate, moratorium = line.split(":")
+        table.append({
+            "date": date.fromordinal(int(ordinal)),
+            "rate": float(rate),
+            "moratorium": moratorium == "1"
+        })
+    return table
+
+
+class SnapshotStore:
+    """
+    Rates snapshots persisted in the database
+
+    Each distinct table is stored once, keyed by its hash; ids of known
+    hashes and recently loaded tables are kept in memory so repeated
+    calculations on the same rates do not touch the database.
+
+    The database is passed in by the entry point (handlers, recompute CLI):
+    this module is imported by services.rates, and importing it must not
+    open a database connection.
+    """
+
+    def __init__(self, database, cache_size: int = 8):
+        self.database = database
+        self.cache_size = cache_size
+        self._ids: Dict[str, int] = {}
+        self._tables: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_id(self, snapshot: RatesSnapshot) -> Optional[int]:
+        """ID of the stored snapshot, saving it first if this hash is new"""
+        snapshot_id = self._ids.get(snapshot.hash)
+        if snapshot_id is None:
+            snapshot_id = self.database.save_rates_snapshot(snapshot.hash, snapshot.blob, snapshot.rows)
+            if snapshot_id is not None:
+                self._ids[snapshot.hash] = snapshot_id
+        return snapshot_id
+
+    def load_table(self, snapshot_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Rates table of a stored snapshot, or None if there is no such snapshot"""
+        with self._lock:
+            table = self._tables.get(snapshot_id)
+            if table is not None:
+                self._tables.move_to_end(snapshot_id)
+                return table
+
+        blob = self.database.get_rates_snapshot(snapshot_id)
+        if blob is None:
+            return None
+        table = load_snapshot_table(blob)
+
+        with self._lock:
+            self._tables[snapshot_id] = table
+            while len(self._tables) > self.cache_size:
+                self._tables.popitem(last=False)
+        return table
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+from config import (
+    SUBSCRIPTION_SWEEP_PERIOD, SUBSCRIPTION_SWEEP_MIN_INTERVAL, SUBSCRIPTION_SWEEP_BATCH_SIZE
+)
+from services.database import DatabaseBackend
+
+logger = logging.getLogger(__name__)
+
+# Ключ в bot_state, под которым хранится последний проверенный user_id
+SWEEP_CURSOR_KEY = "subscription_sweep_cursor"
+
+# Пауза, если проверять пока некого
+IDLE_SLEEP = 300
+
+
+class SubscriptionSweeper:
+    """
+    Фоновая перепроверка подписок сохраненных пользователей
+
+    Обходит subscribed_users пачками по возрастанию user_id и вызывает
+    get_chat_member с фиксированным интервалом, подобранным так, чтобы
+    полный проход занимал SUBSCRIPTION_SWEEP_PERIOD, но не быстрее
+    SUBSCRIPTION_SWEEP_MIN_INTERVAL между запросами. Курсор сохраняется
+    в базе после каждой пачки, поэтому после перезапуска обход
+    продолжается с того же места.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        channel_id: int,
+        database: DatabaseBackend,
+        sweep_period: float = SUBSCRIPTION_SWEEP_PERIOD,
+        min_interval: float = SUBSCRIPTION_SWEEP_MIN_INTERVAL,
+        batch_size: int = SUBSCRIPTION_SWEEP_BATCH_SIZE
+    ):
+        self.bot = bot
+        self.channel_id = channel_id
+        self.db = database
+        self.sweep_period = sweep_period
+        self.min_interval = min_interval
+        self.batch_size = batch_size
+
+    async def _interval(self) -> float:
+        """Пауза между проверками, равномерно растягивающая проход на sweep_period"""
+        users_count = max(1, await self.db.run(self.db.get_subscribed_users_count))
+        return max(self.min_interval, self.sweep_period / users_count)
+
+    async def check_user(self, user_id: int) -> bool:
+        """
+        Проверяет одного пользователя и снимает отметку подписки, если он покинул канал
+
+        Returns:
+            False, если пользователь отмечен как неподписанный, иначе True
+        """
+        while True:
+            try:
+                member = await self.bot.get_chat_member(chat_id=self.channel_id, user_id=user_id)
+                break
+            except TelegramRetryAfter as e:
+                # После паузы проверяем того же пользователя, иначе он пропустил бы этот проход
+                logger.warning("Flood control during subscription sweep, sleeping %s s", e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except TelegramAPIError as e:
+                # Ошибка API не означает отписку: оставляем статус как есть
+                logger.warning("Subscription sweep: cannot check user %s: %s", user_id, e)
+                return True
+
+        if member.status in ["left", "kicked"]:
+            logger.info("Subscription sweep: user %s left the channel (%s)", user_id, member.status)
+            await self.db.run(self.db.remove_subscribed_user, user_id)
+            return False
+
+        return True
+
+    async def sweep_batch(self) -> int:
+        """
+        Проверяет очередную пачку пользователей начиная с сохраненного курсора
+
+        Returns:
+            Количество проверенных пользователей (0 - проход завершен)
+        """
+        cursor = int(await self.db.run(self.db.get_state, SWEEP_CURSOR_KEY) or 0)
+        user_ids = await self.db.run(self.db.get_subscribed_user_ids, cursor, self.batch_size)
+
+        if not user_ids:
+            # Проход завершен, следующий начнется сначала
+            await self.db.run(self.db.set_state, SWEEP_CURSOR_KEY, "0")
+            return 0
+
+        interval = await self._interval()
+        for user_id in user_ids:
+            await self.check_user(user_id)
+            await asyncio.sleep(interval)
+
+        await self.db.run(self.db.set_state, SWEEP_CURSOR_KEY, str(user_ids[-1]))
+        return len(user_ids)
+
+    async def run(self):
+        """Бесконечный цикл обхода; останавливается отменой задачи"""
+        logger.info("Subscription sweeper started")
+        while True:
+            try:
+                checked = await self.sweep_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Subscription sweep failed: %s", e, exc_info=True)
+                checked = 0
+
+            if not checked:
+                # Пользователей нет (или проход только что завершился с пустой пачкой)
+                await asyncio.sleep(min(IDLE_SLEEP, await self._interval()))
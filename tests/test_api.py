@@ -0,0 +1,45 @@
+import asyncio
+import os
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from api import PenaltyApi, create_app
+from services.rates import CsvRatesSource, RatesProvider
+
+EXAMPLE_RATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "example_data.csv")
+TOKEN = "secret"
+HEADERS = {"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"}
+
+
+def request(method, path, **kwargs):
+    """Ответ API на один запрос: (статус, JSON)"""
+    async def scenario():
+        provider = RatesProvider(CsvRatesSource(EXAMPLE_RATES))
+        client = TestClient(TestServer(create_app(PenaltyApi(provider, token=TOKEN))))
+        await client.start_server()
+        try:
+            response = await client.request(method, path, **kwargs)
+            return response.status, await response.json()
+        finally:
+            await client.close()
+
+    return asyncio.run(scenario())
+
+
+def test_wrong_token_is_rejected():
+    status, _ = request("POST", "/v1/penalty", data="{}", headers={**HEADERS, "Authorization": "Bearer secreT"})
+    assert status == 401
+    status, _ = request("POST", "/v1/penalty", data="{}")
+    assert status == 401
+
+
+def test_non_finite_amounts_are_rejected():
+    body = '{"contract_amount": 1000000, "deadline_date": "2024-03-01", "calculation_date": "2024-06-01"}'
+    status, _ = request("POST", "/v1/penalty", data=body, headers=HEADERS)
+    assert status == 200
+
+    for amount in ("NaN", "Infinity", "-Infinity", "1e400"):
+        body = '{"contract_amount": %s, "deadline_date": "2024-03-01"}' % amount
+        status, data = request("POST", "/v1/penalty", data=body, headers=HEADERS)
+        assert status == 400, amount
+        assert "error" in data
@@ -0,0 +1,44 @@
+import gc
+import random
+
+from benchmarks.check_equivalence import random_case
+from services.calculator import PenaltyCalculator
+from services.rates import BinaryRatesSource, write_binary_rates
+
+
+def test_calculator_on_mapped_table_matches_dict_table(tmp_path):
+    path = str(tmp_path / "rates.bin")
+    for seed in range(40):
+        case = random_case(seed)
+        # Повторяющаяся дата: побеждает последняя строка, как у словарной таблицы
+        table = case["table"] + [{**random.Random(seed).choice(case["table"]), "rate": 0.5}]
+        write_binary_rates(path, table)
+        mapped = BinaryRatesSource(path).load()
+
+        params = {key: case[key] for key in ("contract_amount", "deadline_date", "calculation_date", "is_individual", "is_unique_object")}
+        expected = PenaltyCalculator(table)
+        calculator = PenaltyCalculator(mapped)
+        assert calculator.calculate_penalty(**params) == expected.calculate_penalty(**params)
+        assert calculator.calculate_penalty(**params, rate_mode="variable") == expected.calculate_penalty(**params, rate_mode="variable")
+
+
+def test_replaced_mapping_is_closed_once_unreferenced(tmp_path):
+    path = str(tmp_path / "rates.bin")
+    table = random_case(1)["table"]
+    source = BinaryRatesSource(path)
+
+    write_binary_rates(path, table)
+    first = source.load()
+    first_mmap = source._mmap
+    write_binary_rates(path, table[:-1] if len(table) > 1 else table * 2)
+    second = source.load()
+    assert second is not first
+
+    # Старая таблица еще используется: отображение открыто и читается
+    assert not first_mmap.closed
+    assert [row["date"] for row in first] == sorted({item["date"] for item in table})
+
+    del first
+    gc.collect()
+    assert first_mmap.closed
+    assert not source._mmap.closed
@@ -0,0 +1,36 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from services import charts
+from services.charts import ChartRenderer
+
+
+def test_curve_is_built_only_on_cache_miss(tmp_path, monkeypatch):
+    monkeypatch.setattr(charts, "render_penalty_chart", lambda points, marker_date, title: b"png")
+    renderer = ChartRenderer(cache_dir=str(tmp_path), max_files=2)
+    renderer._executor = ThreadPoolExecutor(max_workers=1)
+    built = []
+
+    def points():
+        built.append(1)
+        return []
+
+    async def scenario():
+        # Одновременные запросы одного графика строят кривую один раз
+        first, second = await asyncio.gather(renderer.render("a", points), renderer.render("a", points))
+        assert first == second == renderer.path_for("a")
+        # Из кеша на диске - без построения кривой
+        assert await renderer.render("a", points) == renderer.path_for("a")
+        assert len(built) == 1
+
+        renderer.file_ids["a"] = "file-id"
+        os.utime(renderer.path_for("a"), (1, 1))
+        for key in ("b", "c"):
+            await renderer.render(key, points)
+        await renderer._pruning
+
+    asyncio.run(scenario())
+    renderer.shutdown()
+    assert sorted(os.listdir(tmp_path)) == ["b.png", "c.png"]
+    assert "a" not in renderer.file_ids
@@ -0,0 +1,209 @@
+import asyncio
+import threading
+from datetime import date
+
+import pytest
+
+
+def calculation(amount=1_000_000.0, deadline=date(2024, 3, 1), calculated=date(2024, 6, 1), **extra):
+    return {
+        "contract_amount": amount,
+        "deadline_date": deadline,
+        "deadline_date_str": deadline.strftime("%d.%m.%Y"),
+        "calculation_date": calculated,
+        "calculation_date_str": calculated.strftime("%d.%m.%Y"),
+        "is_individual": True,
+        "is_unique": False,
+        "penalty_amount": 12_345.67,
+        "delay_days": (calculated - deadline).days,
+        "moratorium_days": 0,
+        **extra,
+    }
+
+
+@pytest.fixture
+def upserts(backend, monkeypatch):
+    """Счетчик фактических записей профиля в базу"""
+    calls = []
+    original = backend._upsert_user
+
+    def counting(*args):
+        calls.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(backend, "_upsert_user", counting)
+    return calls
+
+
+def test_add_and_check_subscription(backend):
+    assert not backend.is_user_subscribed(1)
+    assert backend.add_subscribed_user(1, "Ivan", "Petrov", "ivan")
+    assert backend.is_user_subscribed(1)
+
+    assert backend.add_subscribed_user(2, "Olga", is_subscribed=False)
+    assert not backend.is_user_subscribed(2)
+    assert backend.get_total_users_count() == 2
+    assert backend.get_subscribed_users_count() == 1
+
+
+def test_unchanged_profile_is_not_written(backend, upserts):
+    backend.add_subscribed_user(1, "Ivan", "Petrov", "ivan")
+    backend.add_subscribed_user(1, "Ivan", "Petrov", "ivan")
+    # Не переданные поля имени не считаются изменением
+    backend.add_subscribed_user(1)
+    assert len(upserts) == 1
+
+    backend.add_subscribed_user(1, username="ivan_p")
+    assert len(upserts) == 2
+
+    # После сброса кеша профиль читается из базы, запись по-прежнему не нужна
+    backend.invalidate_profile()
+    backend.add_subscribed_user(1, "Ivan", "Petrov", "ivan_p")
+    assert len(upserts) == 2
+    assert backend._get_user_profile(1) == ("Ivan", "Petrov", "ivan_p", True)
+
+
+def test_none_fields_keep_stored_names(backend):
+    backend.add_subscribed_user(1, "Ivan", "Petrov", "ivan")
+    backend.invalidate_profile()
+    backend.add_subscribed_user(1, is_subscribed=False)
+    assert backend._get_user_profile(1) == ("Ivan", "Petrov", "ivan", False)
+
+
+def test_bulk_add_counts_inserted_and_updated(backend):
+    backend.add_subscribed_user(1, "Ivan", is_subscribed=False)
+    users = [(user_id, f"User {user_id}", None, None) for user_id in range(1, 8)]
+    # Повторяющийся ID схлопывается, побеждает последняя запись
+    users.append((3, "Renamed", None, None))
+
+    assert backend.bulk_add_subscribed_users(users, chunk_size=3) == (6, 1)
+    assert backend.get_subscribed_users_count() == 7
+    assert backend.is_user_subscribed(1)
+    assert backend._get_user_profile(3)[0] == "Renamed"
+
+
+def test_remove_subscribed_user(backend):
+    backend.add_subscribed_user(1, "Ivan")
+    assert backend.remove_subscribed_user(1)
+    assert not backend.is_user_subscribed(1)
+    # Кеш профиля сброшен: повторная подписка записывается в базу
+    backend.add_subscribed_user(1, "Ivan")
+    assert backend.is_user_subscribed(1)
+
+
+def test_save_and_get_calculation(backend):
+    backend.add_subscribed_user(1)
+    assert backend.save_calculation(1, calculation())
+    assert backend.get_total_calculations_count() == 1
+
+    saved = backend.get_calculations_by_user(1)
+    assert len(saved) == 1
+    row = backend.get_calculation(saved[0]["id"])
+    assert row["deadline_date"] == "01.03.2024"
+    assert row["deadline_ordinal"] == date(2024, 3, 1).toordinal()
+    assert row["calculation_ordinal"] == date(2024, 6, 1).toordinal()
+    assert row["penalty_amount"] == pytest.approx(12_345.67)
+    assert backend.get_calculation(saved[0]["id"] + 1) is None
+
+
+def window_key(row):
+    return row["calculation_ordinal"], row["deadline_ordinal"], row["id"]
+
+
+def test_calculations_in_window_pages_by_index_key(backend):
+    backend.add_subscribed_user(1)
+    backend.save_calculation(1, calculation(deadline=date(2023, 1, 1), calculated=date(2023, 2, 1)))
+    for day in range(1, 6):
+        backend.save_calculation(1, calculation(amount=day * 100_000.0, deadline=date(2024, 3, day)))
+    # Одинаковый ключ (даты) у двух расчетов: порядок внутри определяет id
+    backend.save_calculation(1, calculation(amount=600_000.0, deadline=date(2024, 3, 5)))
+    backend.save_calculation(1, calculation(amount=700_000.0, deadline=date(2024, 3, 2), calculated=date(2024, 4, 15)))
+
+    start, end = date(2024, 4, 1).toordinal(), date(2024, 4, 30).toordinal()
+    first = backend.get_calculations_in_window(start, end, (0, 0, 0), 3)
+    second = backend.get_calculations_in_window(start, end, window_key(first[-1]), 3)
+    third = backend.get_calculations_in_window(start, end, window_key(second[-1]), 3)
+    assert [row["contract_amount"] for row in first + second + third] == [
+        700_000.0, 100_000.0, 200_000.0, 300_000.0, 400_000.0, 500_000.0, 600_000.0,
+    ]
+    assert backend.get_calculations_in_window(start, end, window_key(third[-1]), 3) == []
+
+
+def test_calculations_window_query_uses_index(tmp_path):
+    from services.database import SQLiteDatabase
+
+    database = SQLiteDatabase(str(tmp_path / "bot.sqlite"))
+    statements = []
+    database.conn.set_trace_callback(statements.append)
+    start = date(2024, 4, 1).toordinal()
+    database.get_calculations_in_window(start, start + 29, (0, 0, 0), 10)
+    database.conn.set_trace_callback(None)
+
+    # План того самого запроса, который выполнил бэкенд
+    query = next(statement for statement in statements if "FROM calculations" in statement)
+    details = " ".join(row[-1] for row in database.conn.execute("EXPLAIN QUERY PLAN " + query))
+    assert "USING INDEX idx_calculations_by_calculation_date" in details
+    assert "TEMP B-TREE" not in details
+    database.close()
+
+
+def test_rates_snapshots_are_deduplicated(backend):
+    first = backend.save_rates_snapshot("a" * 64, b"\x00\x01", 2)
+    assert backend.save_rates_snapshot("a" * 64, b"\x00\x01", 2) == first
+    second = backend.save_rates_snapshot("b" * 64, b"\x02", 1)
+    assert second != first
+    assert bytes(backend.get_rates_snapshot(first)) == b"\x00\x01"
+    assert backend.get_rates_snapshot(second + 100) is None
+
+
+def test_subscribed_user_ids_pagination(backend):
+    for user_id in (5, 1, 9, 3, 7):
+        backend.add_subscribed_user(user_id)
+    backend.remove_subscribed_user(3)
+
+    assert backend.get_subscribed_user_ids(0, 2) == [1, 5]
+    assert backend.get_subscribed_user_ids(5, 10) == [7, 9]
+    assert backend.get_subscribed_user_ids(9, 10) == []
+
+
+def test_state(backend):
+    assert backend.get_state("cursor") is None
+    assert backend.set_state("cursor", "10")
+    assert backend.set_state("cursor", "20")
+    assert backend.get_state("cursor") == "20"
+
+
+def test_statistics(backend):
+    backend.add_subscribed_user(1)
+    backend.add_subscribed_user(2, is_subscribed=False)
+    backend.save_calculation(1, calculation(amount=1_000_000.0, penalty_amount=100.0))
+    backend.save_calculation(2, calculation(amount=3_000_000.0, penalty_amount=300.0, is_individual=False, is_unique=True))
+
+    stats = backend.get_statistics()
+    assert stats["total_users"] == 2
+    assert stats["subscribed_users"] == 1
+    assert stats["total_calculations"] == 2
+    assert stats["avg_penalty"] == pytest.approx(200.0)
+    assert stats["avg_contract_amount"] == pytest.approx(2_000_000.0)
+    assert stats["individual_calculations"] == 1
+    assert stats["legal_calculations"] == 1
+    assert stats["unique_objects_calculations"] == 1
+
+
+def test_run_executes_off_the_event_loop(backend):
+    async def scenario():
+        loop_thread = threading.get_ident()
+        threads = []
+
+        def set_and_report(key, value):
+            threads.append(threading.get_ident())
+            return backend.set_state(key, value)
+
+        assert await backend.run(set_and_report, "key", "value")
+        assert await backend.run(backend.get_state, "key") == "value"
+        assert await backend.run(backend.add_subscribed_user, 1, first_name="Ivan")
+        return loop_thread, threads
+
+    loop_thread, threads = asyncio.run(scenario())
+    assert threads and loop_thread not in threads
+    assert backend.is_user_subscribed(1)
@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks.check_equivalence import ENGINES, random_case
+from services.calculator import PenaltyCalculator
+from services.reference_calculator import ReferencePenaltyCalculator
+
+# Полная проверка: python -m benchmarks.check_equivalence --cases 1000 (несколько минут).
+# Здесь - первые случаи того же генератора без замеров скорости и без просрочек
+# длиннее MAX_DELAY_DAYS: эталон считает их поденно, по десятку секунд на случай.
+CASES = 150
+MAX_DELAY_DAYS = 3 * 365
+
+
+def quick_cases():
+    for seed in range(CASES):
+        case = random_case(seed)
+        if (case["calculation_date"] - case["deadline_date"]).days <= MAX_DELAY_DAYS:
+            yield case
+
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+def test_engine_matches_reference(engine):
+    failures = {}
+    for case in quick_cases():
+        errors = ENGINES[engine](PenaltyCalculator(case["table"]), case, ReferencePenaltyCalculator(case["table"]))
+        if errors:
+            failures[case["seed"]] = errors
+    assert not failures, f"failing seeds (re-run with --only SEED): {failures}"
@@ -0,0 +1,38 @@
+import asyncio
+from types import SimpleNamespace
+
+from middlewares.idempotency import HIGH_WATER_MARK_KEY, IdempotencyMiddleware
+from services.database import SQLiteDatabase
+
+
+def test_update_in_flight_at_crash_is_processed_after_restart(tmp_path):
+    database = SQLiteDatabase(str(tmp_path / "bot.sqlite"))
+    middleware = IdempotencyMiddleware(database, window=100, persist_interval=0)
+    processed = []
+
+    async def scenario():
+        slow_started = asyncio.Event()
+        never = asyncio.Event()
+
+        async def handler(event, data):
+            if event.update_id == 10:
+                slow_started.set()
+                await never.wait()
+            processed.append(event.update_id)
+
+        # Обновление 10 еще обрабатывается, а 11 и 12 уже завершились
+        slow = asyncio.create_task(middleware(handler, SimpleNamespace(update_id=10), {}))
+        await slow_started.wait()
+        await middleware(handler, SimpleNamespace(update_id=11), {})
+        await middleware(handler, SimpleNamespace(update_id=12), {})
+        # Падение процесса: обработка 10 так и не завершилась
+        slow.cancel()
+
+    asyncio.run(scenario())
+    assert processed == [11, 12]
+    assert database.get_state(HIGH_WATER_MARK_KEY) == "9"
+
+    restarted = IdempotencyMiddleware(database, window=100, persist_interval=0)
+    assert not restarted.is_duplicate(10)
+    assert restarted.is_duplicate(9)
+    database.close()
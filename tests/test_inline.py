@@ -0,0 +1,20 @@
+from handlers.inline import LatestQueries
+
+
+def test_newer_query_supersedes_the_pending_one():
+    queries = LatestQueries(maxsize=10)
+    queries.start(1, "a")
+    queries.start(1, "b")
+    assert not queries.finish(1, "a")
+    assert queries.finish(1, "b")
+    assert len(queries) == 0
+
+
+def test_pending_queries_are_bounded():
+    queries = LatestQueries(maxsize=3)
+    for user_id in range(5):
+        queries.start(user_id, str(user_id))
+    assert len(queries) == 3
+    # Вытесненный запрос считается отмененным
+    assert not queries.finish(0, "0")
+    assert queries.finish(4, "4")
@@ -0,0 +1,56 @@
+import asyncio
+from datetime import date
+
+from handlers import user
+from services.jobs import JobQueue
+
+USER_DATA = {
+    "contract_amount": 1_000_000.0,
+    "deadline_date": date(2024, 3, 1),
+    "deadline_date_str": "01.03.2024",
+    "calculation_date": date(2024, 6, 1),
+    "calculation_date_str": "01.06.2024",
+    "is_individual": True,
+    "is_unique": False,
+}
+
+
+class SlowMessage:
+    """Сообщение бота, у которого первое редактирование (место в очереди) идет дольше остальных"""
+
+    def __init__(self):
+        self.texts = []
+        self.edits = 0
+
+    async def edit_text(self, text, **kwargs):
+        self.edits += 1
+        await asyncio.sleep(0.05 if self.edits == 1 else 0)
+        self.texts.append(text)
+
+
+def test_queue_position_never_overwrites_the_result(monkeypatch):
+    async def fake_perform_calculation(bot, tg_user, user_data, message):
+        message.texts.append("result")
+
+    monkeypatch.setattr(user, "perform_calculation", fake_perform_calculation)
+
+    async def scenario():
+        queue = JobQueue(workers=1, maxsize=10, name="test")
+        monkeypatch.setattr(user, "calculation_queue", queue)
+        blocker = asyncio.Event()
+        queue.submit(blocker.wait)
+
+        message = SlowMessage()
+        submit = asyncio.create_task(user.submit_calculation(None, None, USER_DATA, message))
+        await asyncio.sleep(0.01)
+        # Воркер освобождается, пока место в очереди еще показывается
+        blocker.set()
+        await submit
+        while queue.pending or queue.active:
+            await asyncio.sleep(0.01)
+        queue.shutdown()
+        return message.texts
+
+    texts = asyncio.run(scenario())
+    assert texts[-1] == "result"
+    assert texts[0] == user.calculation_status_text(USER_DATA, 1)
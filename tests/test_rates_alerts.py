@@ -0,0 +1,33 @@
+import asyncio
+
+from handlers import user
+from services.circuit import CircuitBreaker
+
+
+def test_admins_are_alerted_on_outage_and_recovery_only(monkeypatch):
+    sent = []
+
+    async def fake_notify_admins(bot, text):
+        sent.append(text)
+
+    monkeypatch.setattr(user, "notify_admins", fake_notify_admins)
+
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.on_state_change = lambda old_state, new_state: user.on_rates_state_change(None, old_state, new_state)
+
+        breaker.record_failure()        # CLOSED -> OPEN
+        for _ in range(3):
+            breaker.allow_request()     # OPEN -> HALF_OPEN
+            breaker.record_failure()    # HALF_OPEN -> OPEN
+        breaker.allow_request()
+        breaker.record_success()        # HALF_OPEN -> CLOSED
+
+        assert len(user._notification_tasks) == 2
+        await asyncio.gather(*user._notification_tasks)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert len(sent) == 2
+    assert sent[0].startswith("⚠️") and sent[1].startswith("✅")
+    assert not user._notification_tasks
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from datetime import date
+
+import pytest
+
+from services.circuit import CircuitBreaker
+from services.rates import RatesProvider, RatesSource, RatesUnavailableError
+
+TABLE = [{"date": date(2024, 1, 1), "rate": 0.16, "moratorium": False}]
+
+
+class BlockingSource(RatesSource):
+    """Источник, чья загрузка висит, пока тест не отпустит ее"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.loads = 0
+
+    def load(self, deadline=None):
+        self.loads += 1
+        self.release.wait(5)
+        return list(TABLE)
+
+
+def test_overrunning_load_is_not_started_twice():
+    source = BlockingSource()
+    provider = RatesProvider(source, timeout=0.05, breaker=CircuitBreaker(failure_threshold=100, reset_timeout=0))
+
+    async def scenario():
+        with pytest.raises(RatesUnavailableError):
+            await provider.get_rates()
+        # Поток первой загрузки еще жив: вторая ждет его, а не запускает новый
+        with pytest.raises(RatesUnavailableError):
+            await provider.get_rates()
+        assert source.loads == 1
+
+        source.release.set()
+        while provider._worker is not None:
+            await asyncio.sleep(0.01)
+        # Опоздавший результат все равно сохраняется
+        assert provider.last_good == TABLE
+        assert await provider.get_rates() == TABLE
+        assert source.loads == 2
+
+    asyncio.run(scenario())
+
+
+def test_importing_rates_does_not_open_the_database():
+    code = "import sys, services.rates; print('services.database' in sys.modules)"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,66 @@
+import random
+from datetime import date, timedelta
+
+from services.calculator import PenaltyCalculator
+from services.database import SQLiteDatabase
+from services.recompute import changed_date_ranges, recompute_changed
+
+
+def rates_table(first: date, days: int, rate_for):
+    return [
+        {"date": first + timedelta(days=i), "rate": rate_for(first + timedelta(days=i)), "moratorium": False}
+        for i in range(days)
+    ]
+
+
+def test_recompute_matches_direct_calculation(tmp_path):
+    old_table = rates_table(date(2023, 1, 1), 730, lambda day: 7.5)
+    # Два изменения: март 2023 и октябрь 2024
+    new_table = rates_table(
+        date(2023, 1, 1), 730,
+        lambda day: 9.0 if date(2023, 3, 1) <= day < date(2023, 4, 1) or date(2024, 10, 1) <= day < date(2024, 10, 15) else 7.5
+    )
+    changed_ranges = changed_date_ranges(old_table, new_table)
+    assert len(changed_ranges) == 2
+
+    database = SQLiteDatabase(str(tmp_path / "bot.sqlite"))
+    database.add_subscribed_user(1)
+    old_calculator = PenaltyCalculator(old_table)
+    new_calculator = PenaltyCalculator(new_table)
+    rng = random.Random(7)
+    expected = {}
+    affected = 0
+    for calculation_id in range(1, 301):
+        deadline = date(2023, 1, 1) + timedelta(days=rng.randint(0, 600))
+        calculated = deadline + timedelta(days=rng.randint(1, 700))
+        params = dict(
+            contract_amount=rng.randint(10 ** 6, 10 ** 7),
+            deadline_date=deadline,
+            calculation_date=calculated,
+            is_individual=rng.random() < 0.7,
+            is_unique_object=False
+        )
+        old_amount = old_calculator.calculate_penalty(**params)["penalty_amount"]
+        new_amount = new_calculator.calculate_penalty(**params)["penalty_amount"]
+        database.save_calculation(1, {
+            "contract_amount": params["contract_amount"],
+            "deadline_date": deadline,
+            "calculation_date": calculated,
+            "is_individual": params["is_individual"],
+            "is_unique": False,
+            "penalty_amount": old_amount,
+        })
+        affected += any(
+            deadline.toordinal() <= end and calculated.toordinal() >= start for start, end in changed_ranges
+        )
+        if round(new_amount - old_amount, 2) != 0:
+            expected[calculation_id] = new_amount
+
+    report = recompute_changed(database, old_table, new_table, workers=2, chunk_size=7, max_in_flight=2)
+    database.close()
+
+    assert expected
+    assert {delta.calculation_id: delta.new_amount for delta in report.deltas} == expected
+    # Расчеты, задевающие оба диапазона, пересчитываются один раз
+    assert report.checked == affected
+    assert len({delta.calculation_id for delta in report.deltas}) == len(report.deltas)
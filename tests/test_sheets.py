@@ -0,0 +1,96 @@
+from bisect import bisect_right
+from datetime import date, timedelta
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from services.sheets import QuotaScheduler, SheetsDeadlineExceeded, merge_rates_and_moratoriums
+
+
+def effective(table, day):
+    """Строка, действующая в этот день: ближайшая предыдущая, как в PenaltyCalculator"""
+    dates = [item["date"] for item in table]
+    return table[bisect_right(dates, day) - 1]
+
+
+def test_mixed_layouts_keep_legacy_flags_between_period_boundaries():
+    # Старая раскладка A:C: мораторий задан флагами строк ставок
+    rate_rows = [
+        {"date": date(2022, 1, 1), "rate": 0.085, "moratorium": False},
+        {"date": date(2022, 3, 29), "rate": 0.095, "moratorium": True},
+        {"date": date(2022, 7, 1), "rate": 0.095, "moratorium": False},
+        {"date": date(2023, 1, 1), "rate": 0.075, "moratorium": False},
+    ]
+    # Периоды моратория: первый заканчивается внутри участка с флагом, второй - вне его
+    periods = [
+        (date(2022, 3, 1), date(2022, 4, 15)),
+        (date(2022, 10, 1), date(2022, 10, 31)),
+    ]
+    table = merge_rates_and_moratoriums(rate_rows, periods)
+
+    day = date(2022, 1, 1)
+    while day <= date(2023, 2, 1):
+        rate_row = effective(rate_rows, day)
+        in_period = any(start <= day <= end for start, end in periods)
+        row = effective(table, day)
+        assert (row["rate"], row["moratorium"]) == (rate_row["rate"], in_period or rate_row["moratorium"]), day
+        day += timedelta(days=1)
+
+
+def test_period_boundary_inside_flagged_rows_is_moratorium():
+    rate_rows = [
+        {"date": date(2022, 3, 29), "rate": 0.095, "moratorium": True},
+        {"date": date(2022, 7, 1), "rate": 0.095, "moratorium": False},
+    ]
+    table = merge_rates_and_moratoriums(rate_rows, [(date(2022, 4, 1), date(2022, 4, 15))])
+    boundary = next(item for item in table if item["date"] == date(2022, 4, 16))
+    assert boundary["moratorium"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class UnavailableRequest:
+    """Запрос, на который API каждый раз отвечает 503 за одну секунду"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.attempts = 0
+
+    def execute(self):
+        self.attempts += 1
+        self.clock.now += 1
+        raise HttpError(httplib2.Response({"status": 503}), b"backend error")
+
+
+def test_retries_stop_before_the_deadline():
+    clock = FakeClock()
+    scheduler = QuotaScheduler(
+        max_retries=10, backoff_base=1, backoff_max=1, request_timeout=2, sleep=clock.sleep, clock=clock
+    )
+    request = UnavailableRequest(clock)
+
+    with pytest.raises(HttpError):
+        scheduler.execute(request, deadline=10)
+    # Каждая попытка начиналась, только если успевала закончиться к сроку
+    assert clock.now <= 10
+    assert 1 < request.attempts < 11
+
+
+def test_quota_wait_past_the_deadline_is_not_started():
+    clock = FakeClock()
+    scheduler = QuotaScheduler(max_requests=1, window=60, request_timeout=2, sleep=clock.sleep, clock=clock)
+    scheduler.acquire(deadline=10)
+
+    with pytest.raises(SheetsDeadlineExceeded):
+        scheduler.acquire(deadline=10)
+    assert clock.now == 0
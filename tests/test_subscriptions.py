@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import GetChatMember
+
+from handlers import user
+from services.database import SQLiteDatabase
+from services import subscriptions
+from services.subscriptions import SubscriptionSweeper, SWEEP_CURSOR_KEY
+
+METHOD = GetChatMember(chat_id=-100, user_id=1)
+
+
+class FakeBot:
+    """get_chat_member по заранее заданным ответам: статус или исключение"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls.append(user_id)
+        response = self.responses[user_id].pop(0) if isinstance(self.responses[user_id], list) else self.responses[user_id]
+        if isinstance(response, Exception):
+            raise response
+        return SimpleNamespace(status=response)
+
+
+def test_sweep_retries_the_same_user_after_flood_control(tmp_path):
+    database = SQLiteDatabase(str(tmp_path / "bot.sqlite"))
+    for user_id in (1, 2, 3):
+        database.add_subscribed_user(user_id)
+    bot = FakeBot({
+        1: "member",
+        2: [TelegramRetryAfter(METHOD, "Too Many Requests", retry_after=0), "left"],
+        3: "member",
+    })
+    sweeper = SubscriptionSweeper(bot, -100, database, sweep_period=0, min_interval=0, batch_size=10)
+
+    assert asyncio.run(sweeper.sweep_batch()) == 3
+    assert bot.calls == [1, 2, 2, 3]
+    assert not database.is_user_subscribed(2)
+    assert database.get_state(SWEEP_CURSOR_KEY) == "3"
+    database.close()
+
+
+def test_api_error_does_not_approve_subscription(tmp_path, monkeypatch):
+    database = SQLiteDatabase(str(tmp_path / "bot.sqlite"))
+    monkeypatch.setattr(user, "db", database)
+    bot = FakeBot({1: TelegramBadRequest(METHOD, "member list is inaccessible")})
+
+    assert asyncio.run(user.is_subscribed(bot, 1)) is False
+    assert database._get_user_profile(1) is None
+    database.close()
+
+
+def test_run_keeps_sweeping_after_a_full_pass(tmp_path, monkeypatch):
+    database = SQLiteDatabase(str(tmp_path / "bot.sqlite"))
+    database.add_subscribed_user(1)
+    bot = FakeBot({1: "member"})
+    sweeper = SubscriptionSweeper(bot, -100, database, sweep_period=0, min_interval=0, batch_size=10)
+    monkeypatch.setattr(subscriptions, "IDLE_SLEEP", 0)
+
+    async def scenario():
+        task = asyncio.create_task(sweeper.run())
+        # Несколько проходов подряд: пачка, пустая пачка (конец прохода), снова пачка
+        while len(bot.calls) < 3 and not task.done():
+            await asyncio.sleep(0.01)
+        assert not task.done(), task.exception()
+        task.cancel()
+
+    asyncio.run(scenario())
+    database.close()
+
+
+def test_run_idles_without_subscribed_users(tmp_path, monkeypatch):
+    database = SQLiteDatabase(str(tmp_path / "bot.sqlite"))
+    sweeper = SubscriptionSweeper(FakeBot({}), -100, database, sweep_period=0, min_interval=0.01)
+    monkeypatch.setattr(subscriptions, "IDLE_SLEEP", 0.01)
+
+    async def scenario():
+        task = asyncio.create_task(sweeper.run())
+        await asyncio.sleep(0.1)
+        assert not task.done(), task.exception()
+        task.cancel()
+
+    asyncio.run(scenario())
+    database.close()
+
+
+class FakeState:
+    async def clear(self):
+        pass
+
+    async def set_state(self, state):
+        pass
+
+
+class FakeMessage:
+    def __init__(self, from_user):
+        self.from_user = from_user
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+def test_first_start_confirmed_via_api_writes_the_profile_once(tmp_path, monkeypatch):
+    database = SQLiteDatabase(str(tmp_path / "bot.sqlite"))
+    monkeypatch.setattr(user, "db", database)
+    upserts = []
+    original = database._upsert_user
+    monkeypatch.setattr(database, "_upsert_user", lambda *args: upserts.append(args) or original(*args))
+
+    tg_user = SimpleNamespace(id=1, first_name="Ivan", last_name="Petrov", username="ivan")
+    asyncio.run(user.cmd_start(FakeMessage(tg_user), FakeState(), FakeBot({1: "member"})))
+
+    assert len(upserts) == 1
+    assert database._get_user_profile(1) == ("Ivan", "Petrov", "ivan", True)
+    database.close()
@@ -0,0 +1,27 @@
+from datetime import date
+
+import pytest
+
+from handlers.user import pack_calculation_params
+from utils.validators import MAX_CONTRACT_AMOUNT, parse_calc_args, validate_amount
+
+
+def test_malformed_date_is_reported_as_a_date_error():
+    _, error = parse_calc_args("3500000 1.3.24")
+    assert error.startswith("Дата передачи «1.3.24»")
+
+    _, error = parse_calc_args("3500000 01.03.2024 1.6.24")
+    assert error.startswith("Дата расчета «1.6.24»")
+
+
+@pytest.mark.parametrize("text", ["inf", "nan", "-inf", "1e300", str(MAX_CONTRACT_AMOUNT + 1)])
+def test_non_finite_and_huge_amounts_are_rejected(text):
+    is_valid, amount, error = validate_amount(text)
+    assert not is_valid and amount is None and error
+
+
+def test_largest_amount_fits_callback_data():
+    data, error = parse_calc_args(f"{MAX_CONTRACT_AMOUNT} 01.03.2024 01.06.2024 юл уник")
+    assert error is None
+    assert data["calculation_date"] == date(2024, 6, 1)
+    assert len(("retry_calc:" + pack_calculation_params(data)).encode()) <= 64
@@ -0,0 +1,130 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Tuple
+
+from config import LOG_LEVEL, LOG_FILE, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUPS, LOG_DEBUG_SAMPLE_RATE
+
+# Идентификаторы текущего обновления; задаются LogContextMiddleware и
+# наследуются задачами, созданными при его обработке
+log_context: contextvars.ContextVar[Dict[str, int]] = contextvars.ContextVar("log_context", default={})
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, update/user ids and traceback"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("update_id", "user_id", "sample_rate"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one of every ``rate`` DEBUG records per call site
+
+    Records are grouped by logger and message template (the unformatted
+    ``msg``), so each noisy debug line is thinned out on its own and the
+    first occurrence always passes. Kept records carry ``sample_rate``.
+    Records above DEBUG are never dropped.
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self._counts: Dict[Tuple[str, str], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate <= 1:
+            return True
+        key = (record.name, str(record.msg))
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        if count % self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler that attaches the update context and keeps the traceback separate
+
+    Runs in the calling thread: it only formats the message and puts the
+    record on the queue; JSON formatting and I/O happen in the listener
+    thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.__dict__.update(log_context.get())
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = LOG_LEVEL, log_file: Optional[str] = LOG_FILE, sample_rate: int = LOG_DEBUG_SAMPLE_RATE):
+    """
+    Route all logging through a queue to a listener thread
+
+    The root logger gets a single ContextQueueHandler, so a log call on the
+    event loop never waits for stdout or the disk. The listener writes JSON
+    lines to stdout and, if ``log_file`` is set, to a rotating file.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        handlers.append(RotatingFileHandler(
+            log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush the queue and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,8 +1,18 @@
+import csv
+import logging
+import math
+import re
 from datetime import datetime
-from typing import Union, Tuple, Optional
+from typing import Union, Tuple, Optional, List
 from aiogram import Bot
 from aiogram.exceptions import TelegramAPIError
 
+logger = logging.getLogger(__name__)
+
+# Верхняя граница суммы по ДДУ: сумма в копейках должна оставаться точным
+# целым для pack_calculation_params() и укладываться в callback_data
+MAX_CONTRACT_AMOUNT = 1_000_000_000_000
+
 
 def validate_amount(amount_str: str) -> Tuple[bool, Optional[float], Optional[str]]:
     """
@@ -19,8 +29,12 @@ def validate_amount(amount_str: str) -> Tuple[bool, Optional[float], Optional[st
         cleaned_amount = amount_str.replace(" ", "").replace(",", ".")
         amount = float(cleaned_amount)
         
+        if not math.isfinite(amount):
+            return False, None, "Введите корректное числовое значение"
         if amount <= 0:
             return False, None, "Сумма должна быть положительным числом"
+        if amount > MAX_CONTRACT_AMOUNT:
+            return False, None, f"Сумма не может превышать {MAX_CONTRACT_AMOUNT:,} руб.".replace(",", " ")
             
         return True, amount, None
     except ValueError:
@@ -75,6 +89,136 @@ def validate_calculation_date(calc_date_str: str, deadline_date_str: str) -> Tup
     return True, calc_date, None
 
 
+# Токен, похожий на дату (в том числе с ошибкой в годе, 1.3.24): такие
+# токены проверяются как даты, чтобы ошибка относилась к дате, а не к сумме
+DATE_TOKEN = re.compile(r"^\d{1,2}[.,/-]\d{1,2}[.,/-]\d{2,4}$")
+AMOUNT_TOKEN = re.compile(r"^[\d.,]+$")
+INDIVIDUAL_TOKENS = {"фл", "физ", "физлицо"}
+LEGAL_TOKENS = {"юл", "юр", "юрлицо"}
+UNIQUE_TOKENS = {"уник", "уникальный"}
+
+
+def parse_calc_args(args: str) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Parse arguments of ``/calc <amount> <deadline> [<calc date>] [фл|юл] [уник]``
+    
+    The amount may contain spaces (``3 500 000``). The calculation date
+    defaults to today, the participant to an individual, the object to
+    not unique.
+    
+    Args:
+        args: Text after the command
+        
+    Returns:
+        Tuple of (calculation data in the same form as the FSM state, error_message)
+    """
+    tokens = args.split()
+    
+    # Сумма - все токены до первой даты, похожие на число
+    amount_tokens = []
+    while tokens and not DATE_TOKEN.match(tokens[0]) and AMOUNT_TOKEN.match(tokens[0]):
+        amount_tokens.append(tokens.pop(0))
+    if not amount_tokens:
+        return None, "Сумма по ДДУ: укажите ее первым аргументом, например 3500000"
+    is_valid, amount, error = validate_amount(" ".join(amount_tokens))
+    if not is_valid:
+        return None, f"Сумма по ДДУ: {error}"
+    
+    if not tokens:
+        return None, "Дата передачи: укажите крайнюю дату передачи по ДДУ в формате ДД.ММ.ГГГГ"
+    deadline_str = tokens.pop(0)
+    is_valid, deadline_date, error = validate_date(deadline_str)
+    if not is_valid:
+        return None, f"Дата передачи «{deadline_str}»: {error}"
+    
+    if tokens and DATE_TOKEN.match(tokens[0]):
+        calculation_str = tokens.pop(0)
+        is_valid, calculation_date, error = validate_date(calculation_str)
+        if not is_valid:
+            return None, f"Дата расчета «{calculation_str}»: {error}"
+        if calculation_date <= deadline_date:
+            return None, f"Дата расчета «{calculation_str}»: должна быть позже крайней даты передачи объекта"
+    else:
+        calculation_date = datetime.now().date()
+        calculation_str = calculation_date.strftime("%d.%m.%Y")
+    
+    is_individual = True
+    is_unique = False
+    for token in tokens:
+        flag = token.lower()
+        if flag in INDIVIDUAL_TOKENS:
+            is_individual = True
+        elif flag in LEGAL_TOKENS:
+            is_individual = False
+        elif flag in UNIQUE_TOKENS:
+            is_unique = True
+        else:
+            return None, f"Непонятный аргумент «{token}»: ожидается фл, юл или уник"
+    
+    return {
+        "contract_amount": amount,
+        "deadline_date": deadline_date,
+        "deadline_date_str": deadline_str,
+        "calculation_date": calculation_date,
+        "calculation_date_str": calculation_str,
+        "is_individual": is_individual,
+        "is_unique": is_unique
+    }, None
+
+
+def parse_user_import(text: str) -> Tuple[List[Tuple[int, Optional[str], Optional[str], Optional[str]]], int]:
+    """
+    Parse a text/CSV file with user IDs for bulk import
+    
+    Each line is ``user_id[,first_name[,last_name[,username]]]``; comma,
+    semicolon and tab separators are accepted. A header line and blank
+    lines are skipped.
+    
+    Args:
+        text: Decoded file contents
+        
+    Returns:
+        Tuple of (users, invalid_lines_count), where users are
+        (user_id, first_name, last_name, username) tuples
+    """
+    lines = text.splitlines()
+    
+    try:
+        dialect = csv.Sniffer().sniff("\n".join(lines[:20]), delimiters=",;\t")
+        delimiter = dialect.delimiter
+    except csv.Error:
+        delimiter = ","
+    
+    users = []
+    invalid = 0
+    for line_number, row in enumerate(csv.reader(lines, delimiter=delimiter)):
+        fields = [field.strip() for field in row]
+        if not any(fields):
+            continue
+        
+        try:
+            user_id = int(fields[0])
+        except ValueError:
+            # Первая строка может быть заголовком
+            if line_number > 0:
+                invalid += 1
+            continue
+        
+        if user_id <= 0:
+            invalid += 1
+            continue
+        
+        extra = [field or None for field in fields[1:4]]
+        extra += [None] * (3 - len(extra))
+        first_name, last_name, username = extra
+        if username:
+            username = username.lstrip("@")
+        
+        users.append((user_id, first_name, last_name, username))
+    
+    return users, invalid
+
+
 async def validate_channel(bot: Bot, channel_id: int) -> Tuple[bool, Optional[str]]:
     """
     Проверяет доступность канала и наличие прав у бота
@@ -88,16 +232,16 @@ async def validate_channel(bot: Bot, channel_id: int) -> Tuple[bool, Optional[st
     """
     try:
         chat = await bot.get_chat(chat_id=channel_id)
-        print(f"Channel info: {chat.title}, username: {chat.username}, type: {chat.type}")
+        logger.info("Channel info: %s, username: %s, type: %s", chat.title, chat.username, chat.type)
         
         # Проверяем, является ли бот администратором
         bot_member = await bot.get_chat_member(chat_id=channel_id, user_id=bot.id)
-        print(f"Bot status in channel: {bot_member.status}")
+        logger.info("Bot status in channel: %s", bot_member.status)
         
         if bot_member.status not in ['administrator', 'creator']:
             return False, f"Бот не является администратором канала {chat.title}"
         
         return True, None
     except TelegramAPIError as e:
-        print(f"Error checking channel: {e}")
+        logger.error("Error checking channel: %s", e)
         return False, f"Ошибка при проверке канала: {e}" 
\ No newline at end of file